@@ -0,0 +1,84 @@
+# Compara la ruta de lectura ORM (entidades + model_validate) contra la ruta
+# Core con sentencias cacheadas (filas planas + una sola validación).
+#
+#   python -m benchmarks.read_path --rows 5000 --repeat 20
+#
+# --rows inserta filas sintéticas en la misma transacción y al final se hace
+# rollback, así que no deja datos en la base.
+import argparse
+import asyncio
+import time
+from pydantic import TypeAdapter
+from sqlalchemy import insert, select
+from database.database import engine
+from database.read_queries import cached, select_out, fetch_all
+from models.clientes_model import Cliente, ClienteOut
+
+adapter = TypeAdapter(list[ClienteOut])
+
+
+async def orm_path(session) -> int:
+    result = await session.execute(select(Cliente))
+    clientes = [ClienteOut.model_validate(c) for c in result.scalars().all()]
+    # Se expulsan para no medir el identity map ya poblado
+    session.expunge_all()
+    return len(clientes)
+
+
+async def core_path(session) -> int:
+    query = cached("cliente.all", lambda: select_out(Cliente, ClienteOut))
+    rows = await fetch_all(session, query)
+    return len(adapter.validate_python(rows))
+
+
+async def measure(nombre: str, fn, session, repeat: int):
+    await fn(session)  # calentamiento: compila y prepara la sentencia
+    tiempos = []
+    filas = 0
+    for _ in range(repeat):
+        inicio = time.perf_counter()
+        filas = await fn(session)
+        tiempos.append(time.perf_counter() - inicio)
+
+    tiempos.sort()
+    mediana = tiempos[len(tiempos) // 2]
+    por_fila = mediana / filas * 1e6 if filas else 0
+    print(f"{nombre:>5}: {filas} filas, mediana {mediana * 1000:.2f} ms, {por_fila:.2f} µs/fila")
+    return mediana
+
+
+async def main(rows: int, repeat: int):
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    engine.echo = False
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        session = AsyncSession(bind=conn, expire_on_commit=False)
+
+        if rows:
+            await session.execute(insert(Cliente), [
+                {
+                    "nombres": f"Nombre{i}", "apellidos": f"Apellido{i}", "rfc": f"BENCH{i:010d}",
+                    "calle": "Calle", "numero": str(i), "colonia": "Centro", "ciudad": "Puebla",
+                    "estado": "Puebla", "codigopostal": "72000", "telefono": "2220000000",
+                    "email": f"bench{i}@example.com", "contacto": "Contacto", "tipocliente": None,
+                }
+                for i in range(rows)
+            ])
+
+        orm = await measure("ORM", orm_path, session, repeat)
+        core = await measure("Core", core_path, session, repeat)
+        print(f"Core/ORM: {core / orm:.2f}x del tiempo")
+
+        await session.close()
+        await transaction.rollback()
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=0, help="filas sintéticas a insertar (con rollback)")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.repeat))
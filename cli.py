@@ -0,0 +1,137 @@
+# Tareas de carga masiva fuera del servidor HTTP.
+#
+#   python cli.py import-clientes clientes.csv
+#   python cli.py provision-users usuarios.json
+#   python cli.py create-admin admin admin@empresa.com
+#   python cli.py rebuild-stats
+#   python cli.py dedup-report clientes --limite 50
+#   python cli.py run-jobs --concurrencia 4
+import argparse
+import asyncio
+import json
+from database.database import BulkSessionLocal, engine, engines, settings
+
+
+async def cmd_import_clientes(args):
+    from services.clientes_import import import_clientes, reader_for
+
+    with open(args.archivo, "rb") as archivo:
+        async with BulkSessionLocal() as db:
+            reporte = await import_clientes(db, reader_for(args.archivo, archivo))
+    print(json.dumps(reporte, ensure_ascii=False, indent=2))
+
+
+async def cmd_provision_users(args):
+    from pydantic import TypeAdapter
+    from models.users_model import UserSignUp
+    from services import passwords
+    from services.users_provision import ProvisioningError, provision_users
+
+    with open(args.archivo, "rb") as archivo:
+        users = TypeAdapter(list[UserSignUp]).validate_json(archivo.read())
+
+    try:
+        async with BulkSessionLocal() as db:
+            creados = await provision_users(db, users)
+        print(json.dumps({"creados": len(creados), "ids": [u["id"] for u in creados]}, indent=2))
+    except ProvisioningError as e:
+        print(json.dumps({"errores": e.errores}, ensure_ascii=False, indent=2))
+        raise SystemExit(1)
+    finally:
+        passwords.shutdown()
+
+
+async def cmd_create_admin(args):
+    from getpass import getpass
+    from services import passwords
+    from services.users_provision import ProvisioningError, bootstrap_admin
+
+    password = getpass("Contraseña: ")
+    if not password or password != getpass("Repita la contraseña: "):
+        print("Las contraseñas no coinciden")
+        raise SystemExit(1)
+
+    try:
+        async with BulkSessionLocal() as db:
+            admin = await bootstrap_admin(db, args.nombres, args.usuario, args.email, password, args.sucursal)
+        print(json.dumps(admin, ensure_ascii=False, indent=2))
+        # El catálogo de roles se cachea por proceso
+        print(f"Un servidor ya en marcha reconoce el rol en hasta {settings.catalog_cache_ttl:g} s")
+    except ProvisioningError as e:
+        print(json.dumps({"errores": e.errores}, ensure_ascii=False, indent=2))
+        raise SystemExit(1)
+    finally:
+        passwords.shutdown()
+
+
+async def cmd_rebuild_stats(args):
+    from database.rollups import rebuild_stats
+
+    await rebuild_stats()
+    print("Estadísticas reconstruidas")
+
+
+async def cmd_dedup_report(args):
+    from services.dedup import duplicate_report
+
+    async with BulkSessionLocal() as db:
+        reporte = await duplicate_report(db, args.entidad, umbral=args.umbral, limite=args.limite)
+    print(json.dumps(reporte, ensure_ascii=False, indent=2))
+
+
+async def cmd_run_jobs(args):
+    # Worker dedicado: con jobs_concurrency=0 en la API, solo este proceso
+    # ejecuta la cola
+    from services.jobs import runner
+
+    runner.start(args.concurrencia)
+    print(f"Ejecutando jobs con {args.concurrencia} workers (Ctrl+C para salir)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.stop()
+
+
+async def main(args):
+    engine.echo = False
+    try:
+        await args.func(args)
+    finally:
+        for pool_engine, _ in engines.values():
+            await pool_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(required=True)
+
+    p = sub.add_parser("import-clientes", help="importa clientes desde CSV o Excel (.xlsx)")
+    p.add_argument("archivo")
+    p.set_defaults(func=cmd_import_clientes)
+
+    p = sub.add_parser("provision-users", help="da de alta una lista JSON de usuarios (UserSignUp)")
+    p.add_argument("archivo")
+    p.set_defaults(func=cmd_provision_users)
+
+    p = sub.add_parser("create-admin", help="primer usuario con acceso global (crea rol y sucursal si faltan)")
+    p.add_argument("usuario")
+    p.add_argument("email")
+    p.add_argument("--nombres", default="Administrador")
+    p.add_argument("--sucursal", default="Matriz", help="nombre de la sucursal si aún no hay ninguna")
+    p.set_defaults(func=cmd_create_admin)
+
+    p = sub.add_parser("rebuild-stats", help="recuenta desde cero las tablas de estadísticas")
+    p.set_defaults(func=cmd_rebuild_stats)
+
+    p = sub.add_parser("dedup-report", help="reporte de posibles duplicados ordenado por similitud")
+    p.add_argument("entidad", choices=["clientes", "pacientes"])
+    p.add_argument("--umbral", type=float, default=0.85)
+    p.add_argument("--limite", type=int, default=100)
+    p.set_defaults(func=cmd_dedup_report)
+
+    p = sub.add_parser("run-jobs", help="ejecuta la cola de jobs sin el servidor HTTP")
+    p.add_argument("--concurrencia", type=int, default=2)
+    p.set_defaults(func=cmd_run_jobs)
+
+    args = parser.parse_args()
+    asyncio.run(main(args))
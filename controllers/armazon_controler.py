@@ -1,7 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from database.database import get_db
+from database.database import get_db, ReadSession, get_read_db
+from database.batching import batch_routes
+from database.bulk import bulk_route
+from database.concurrency import reject_nulls
+from database.read_queries import cached, select_out, by_id, fetch_all, fetch_one
 from models.armazon_model import Armazon, ArmazonCreate, ArmazonUpdate, ArmazonOut
 
 router = APIRouter(prefix="/armazones", tags=["Armazones"])
@@ -34,13 +38,14 @@ async def create_armazon(armazon: ArmazonCreate, db: AsyncSession = Depends(get_
             detail="Error interno del servidor"
         )
     
+bulk_route(router, Armazon, ArmazonCreate, "marca", "armazones")
+
 @router.get("/all", response_model=list[ArmazonOut])
-async def get_all_armazones(db: AsyncSession = Depends(get_db)):
+async def get_all_armazones(db: ReadSession = Depends(get_read_db)):
 
     try:
-        query = select(Armazon)
-        result = await db.execute(query)
-        armazones = result.scalars().all()
+        query = cached("armazones.all", lambda: select_out(Armazon, ArmazonOut))
+        armazones = await fetch_all(db, query)
         return armazones
     
     except Exception as e:
@@ -50,13 +55,14 @@ async def get_all_armazones(db: AsyncSession = Depends(get_db)):
             detail="Error interno del servidor"
         )
     
+batch_routes(router, Armazon, ArmazonOut, "armazones")
+
 @router.get("/{armazon_id}", response_model=ArmazonOut)
-async def get_armazon(armazon_id: int, db: AsyncSession = Depends(get_db)):
+async def get_armazon(armazon_id: int, db: ReadSession = Depends(get_read_db)):
 
     try:
-        query = select(Armazon).where(Armazon.id == armazon_id)
-        result = await db.execute(query)
-        armazon = result.scalar_one_or_none()
+        query = cached("armazones.get", lambda: by_id(select_out(Armazon, ArmazonOut), Armazon))
+        armazon = await fetch_one(db, query, {"id": armazon_id})
 
         if not armazon:
             raise HTTPException(
@@ -66,6 +72,8 @@ async def get_armazon(armazon_id: int, db: AsyncSession = Depends(get_db)):
         
         return armazon
     
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error al obtener armazón: {e}")
         raise HTTPException(
@@ -94,6 +102,8 @@ async def update_armazon(armazon_id: int, armazon_update: ArmazonUpdate, db: Asy
                 status_code=400,
                 detail="No se proporcionaron datos para actualizar"
             )
+
+        reject_nulls(Armazon, update_data)
         
         if "marca" in update_data:
             existing_armazon_query = select(Armazon).where(Armazon.marca == update_data.get("marca"), Armazon.id != armazon_id)
@@ -114,6 +124,8 @@ async def update_armazon(armazon_id: int, armazon_update: ArmazonUpdate, db: Asy
         await db.refresh(armazon_result)
         return armazon_result
     
+    except HTTPException:
+        raise
     except Exception as e:
         await db.rollback()
         print(f"Error al actualizar armazón: {e}")
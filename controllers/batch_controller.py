@@ -0,0 +1,156 @@
+import asyncio
+import json
+import posixpath
+from contextlib import AsyncExitStack
+from urllib.parse import unquote
+from fastapi import APIRouter, HTTPException, Request
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from database.database import settings
+from models.batch_model import BatchRequest, BatchResponse, SubRequest
+
+router = APIRouter(tags=["Batch"])
+
+# Llaves del scope de la petición original que necesitan los routers de FastAPI
+# (app, manejadores de excepciones, datos de conexión)
+SCOPE_HEREDADO = (
+    "type", "asgi", "http_version", "scheme", "server", "client",
+    "root_path", "app", "state", "starlette.exception_handlers",
+)
+# Encabezados que se propagan a cada sub-petición si no traen los suyos
+HEADERS_HEREDADOS = ("authorization", "accept-language")
+# Marca en el scope de las sub-peticiones: /batch no se ejecuta dentro de otro lote
+ANIDADO = "batch.anidado"
+
+
+def sub_path(url: str) -> str:
+    # Path tal como lo resuelve el router: decodificado y sin "." ni ".."
+    # (así "/%62atch" o "/x/../batch" también cuentan como /batch)
+    path = posixpath.normpath(unquote(url.partition("?")[0]))
+    return "/" + path.lstrip("/")
+
+
+def validate_batch(peticiones: list[SubRequest]):
+    if not peticiones:
+        raise HTTPException(status_code=400, detail="Debe proporcionar al menos una petición")
+
+    if len(peticiones) > settings.batch_max_requests:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Se permiten hasta {settings.batch_max_requests} peticiones por lote"
+        )
+
+    vistos = set()
+    for i, sub in enumerate(peticiones):
+        sub.id = sub.id or str(i)
+        if sub.id in vistos:
+            raise HTTPException(status_code=400, detail=f"ID de petición repetido: {sub.id}")
+
+        if not sub.url.startswith("/") or sub_path(sub.url) == "/batch":
+            raise HTTPException(status_code=400, detail=f"URL no válida en la petición {sub.id}: {sub.url}")
+
+        # Solo se puede depender de peticiones anteriores: así no hay ciclos
+        for dep in sub.depende_de:
+            if dep not in vistos:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"La petición {sub.id} depende de '{dep}', que no aparece antes en el lote"
+                )
+        vistos.add(sub.id)
+
+
+async def dispatch(request: Request, sub: SubRequest) -> dict:
+    # Ejecuta la sub-petición directo sobre el router de la app: misma
+    # validación, dependencias y manejo de errores que por HTTP, sin socket.
+    # No pasa por los middlewares de la app: la Idempotency-Key aplica al lote
+    # completo (la de cada sub-petición se ignora), y el monitor del loop y
+    # las consultas lentas atribuyen todo a POST /batch
+    path, _, query = sub.url.partition("?")
+    body = b"" if sub.body is None else json.dumps(sub.body).encode()
+
+    headers = {k: request.headers[k] for k in HEADERS_HEREDADOS if k in request.headers}
+    headers.update({k.lower(): v for k, v in sub.headers.items()})
+    if sub.body is not None:
+        headers["content-type"] = "application/json"
+    headers["content-length"] = str(len(body))
+
+    scope = {k: request.scope[k] for k in SCOPE_HEREDADO if k in request.scope}
+    scope.update({
+        "method": sub.method.upper(),
+        "path": sub_path(path),
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "headers": [(k.encode(), v.encode()) for k, v in headers.items()],
+        ANIDADO: True,
+    })
+
+    terminado = asyncio.Event()
+    enviado = False
+    respuesta = {"status": 500, "headers": {}, "body": []}
+
+    async def receive():
+        nonlocal enviado
+        if not enviado:
+            enviado = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await terminado.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            respuesta["status"] = message["status"]
+            respuesta["headers"] = {k.decode(): v.decode() for k, v in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            respuesta["body"].append(message.get("body", b""))
+
+    try:
+        async with AsyncExitStack() as stack:
+            scope["fastapi_middleware_astack"] = stack
+            await request.app.router(scope, receive, send)
+    except StarletteHTTPException as e:
+        # Rutas inexistentes o método no permitido (404/405 del router)
+        return {"id": sub.id, "status": e.status_code, "body": {"detail": e.detail}}
+    except Exception as e:
+        print(f"Error en sub-petición {sub.method} {sub.url}: {e}")
+        return {"id": sub.id, "status": 500, "body": {"detail": "Error interno del servidor"}}
+    finally:
+        terminado.set()
+
+    contenido = b"".join(respuesta["body"])
+    if respuesta["headers"].get("content-type", "").startswith("application/json") and contenido:
+        contenido = json.loads(contenido)
+    else:
+        contenido = contenido.decode(errors="replace") or None
+
+    return {"id": sub.id, "status": respuesta["status"], "body": contenido}
+
+
+@router.post("/batch", response_model=BatchResponse)
+async def batch(peticion: BatchRequest, request: Request):
+    # Varias llamadas en un solo viaje: las independientes corren en paralelo
+    # (acotado por batch_concurrency); las que declaran depende_de esperan
+    if request.scope.get(ANIDADO):
+        # Cualquier forma de escribir la URL que el router resuelva a /batch
+        raise HTTPException(status_code=400, detail="No se permite un lote dentro de otro")
+    validate_batch(peticion.peticiones)
+
+    limite = asyncio.Semaphore(settings.batch_concurrency)
+    tareas: dict[str, asyncio.Task] = {}
+
+    async def run(sub: SubRequest) -> dict:
+        for dep in sub.depende_de:
+            previa = await tareas[dep]
+            if previa["status"] >= 400:
+                return {"id": sub.id, "status": 424, "body": {"detail": f"Falló la petición '{dep}'"}}
+
+        async with limite:
+            return await dispatch(request, sub)
+
+    for sub in peticion.peticiones:
+        tareas[sub.id] = asyncio.ensure_future(run(sub))
+
+    try:
+        return {"respuestas": await asyncio.gather(*tareas.values())}
+    finally:
+        # Si el cliente se desconecta no quedan sub-peticiones huérfanas
+        for tarea in tareas.values():
+            tarea.cancel()
@@ -1,17 +1,147 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Header, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import or_, select
-from database.database import get_db
-from models.clientes_model import Cliente, CreateCliente, ClienteOut, ClienteUpdate
+from sqlalchemy import bindparam, exists, func, insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from database.database import BulkReadSessionLocal, get_db, get_bulk_db, ReadSession
+from database.singleflight import reads
+from database.batching import parse_list_param, load_grouped, batch_routes
+from database.bulk import insert_values, filter_conditions, bulk_update
+from database.concurrency import parse_if_match, reject_nulls, update_versioned
+from database.projection import parse_fields, render
+from services.jobs import enqueue
+from services.dedup import cliente_candidates, sibling_candidates, email_key, rfc_key
+from database.read_queries import cached, hot, select_out, out_columns, by_id, fetch_all
+from database.catalog_cache import catalogs
+from models.clientes_model import Cliente, CreateCliente, CreateClienteConPacientes, ClienteOut, ClienteUpdate, ClienteBulkUpdate
 from models.tipo_cliente_model import Tipo_Cliente
+from models.pacientes_model import Paciente, PacienteOut
+from services.clientes_import import import_clientes, reader_for
+from middleware.auth import Principal, get_principal, require_sucursal, batch_scope, scope_clause, scope_conditions
 
 router = APIRouter(prefix="/cliente", tags=["cliente"])
 
-@router.post("/create", response_model=ClienteOut)
-async def create_cliente(cliente: CreateCliente, db: AsyncSession = Depends(get_db)):
+# expand -> (campo en la respuesta, columna que necesita para resolverse)
+EXPAND_CLIENTE = {
+    "tipocliente": ("tipocliente_detalle", "tipocliente"),
+    "pacientes": ("pacientes", "id"),
+}
+
+async def expand_clientes(db: AsyncSession, rows: list[dict], expand: set[str]):
+    # Una consulta por relación para toda la página, no una por fila
+    if "tipocliente" in expand:
+        tipos = await catalogs.get("tipo_cliente")
+        for r in rows:
+            r["tipocliente_detalle"] = tipos.get(r["tipocliente"])
+
+    if "pacientes" in expand:
+        pacientes = await load_grouped(db, Paciente, PacienteOut, Paciente.cliente_id, (r["id"] for r in rows))
+        for r in rows:
+            r["pacientes"] = pacientes.get(r["id"], [])
+
+def cliente_columns(fields: frozenset[str] | None, expand: set[str]) -> frozenset[str] | None:
+    if fields is None:
+        return None
+    return fields | {EXPAND_CLIENTE[e][1] for e in expand}
+
+# Índices únicos de clientes (email y RFC normalizado) -> mensaje de la violación
+UNICOS = {
+    "ix_clientes_email": "El cliente con este correo ya se encuentra registrado",
+    "ix_clientes_rfc_unico": "El cliente con este RFC ya se encuentra registrado",
+}
+
+# Columnas por las que se puede filtrar /cliente/all y que /cliente/facets cuenta
+FACETAS_CLIENTE = ("estado", "ciudad", "codigopostal", "tipocliente")
+
+def cliente_filters(**valores) -> dict:
+    return {k: v for k, v in valores.items() if v is not None}
+
+def filter_clause(query, filtros):
+    # Igualdad por bindparam: una sentencia cacheada por combinación de filtros
+    tabla = Cliente.__table__
+    for nombre in sorted(filtros):
+        query = query.where(tabla.c[nombre] == bindparam(f"f_{nombre}"))
+    return query
+
+def scoped(query, con_alcance: bool):
+    # Clientes de las sucursales del usuario y los que no tienen sucursal
+    if con_alcance:
+        query = query.where(scope_clause(Cliente.__table__.c.sucursal_id, nulos=True))
+    return query
+
+def read_params(principal: Principal, params: dict) -> dict:
+    if principal.global_:
+        return params
+    return {**params, **principal.scope_params()}
+
+def default_sucursal(principal: Principal, sucursal_id: int | None) -> int | None:
+    # Alta sin sucursal: la principal de quien la hace (salvo acceso global)
+    if sucursal_id is None and not principal.global_:
+        return principal.sucursal
+    require_sucursal(principal, sucursal_id)
+    return sucursal_id
+
+def cliente_all_stmt(columnas: frozenset[str] | None, filtros: frozenset[str] = frozenset(), paginado: bool = False, con_alcance: bool = False):
+    def build():
+        query = scoped(filter_clause(select_out(Cliente, ClienteOut, columnas), filtros), con_alcance)
+        if paginado:
+            query = query.order_by(Cliente.__table__.c.id).limit(bindparam("limit")).offset(bindparam("offset"))
+        return query
+
+    return cached(("cliente.all", columnas, filtros, paginado, con_alcance), build)
+
+def cliente_facets_stmt(filtros: frozenset[str], con_alcance: bool = False):
+    # Un solo GROUP BY GROUPING SETS: un conteo por valor de cada faceta
+    tabla = Cliente.__table__
+    columnas = [tabla.c[f] for f in FACETAS_CLIENTE]
+
+    def build():
+        query = select(
+            *columnas,
+            *[func.grouping(c).label(f"g_{c.key}") for c in columnas],
+            func.count().label("total"),
+        ).select_from(tabla).group_by(func.grouping_sets(*columnas))
+        return scoped(filter_clause(query, filtros), con_alcance)
+
+    return cached(("cliente.facets", filtros, con_alcance), build)
+
+def cliente_search_stmt(columnas: frozenset[str] | None, con_alcance: bool = False):
+    tabla = Cliente.__table__
+    return cached(("cliente.search", columnas, con_alcance), lambda: scoped(select_out(Cliente, ClienteOut, columnas).where(
+        or_(
+            tabla.c.nombres.ilike(bindparam("patron")),
+            tabla.c.apellidos.ilike(bindparam("patron"))
+        )
+    ), con_alcance).limit(10))  # Limitar resultados
+
+def cliente_get_stmt(columnas: frozenset[str] | None, con_alcance: bool = False):
+    return cached(("cliente.get", columnas, con_alcance), lambda: scoped(by_id(select_out(Cliente, ClienteOut, columnas), Cliente), con_alcance))
+
+hot(cliente_search_stmt(None), {"patron": ""})
+hot(cliente_get_stmt(None), {"id": 0})
+
+async def load_clientes(db: AsyncSession, query, params: dict, expand: set[str], fields: frozenset[str] | None, many: bool = True):
+    rows = await fetch_all(db, query, params)
+
+    if not many and not rows:
+        return None
+
+    await expand_clientes(db, rows, expand)
+
+    if fields is None:
+        # FastAPI valida los dicts contra ClienteOut una sola vez
+        return rows if many else rows[0]
+
+    # Con ?fields= se responde con el esquema recortado, ya serializado
+    campos = fields | {EXPAND_CLIENTE[e][0] for e in expand}
+    return render(ClienteOut, campos, rows if many else rows[0], many)
+
+@router.post("/create", response_model=ClienteOut, response_model_exclude_unset=True)
+async def create_cliente(cliente: CreateCliente, response: Response, db: AsyncSession = Depends(get_db), principal: Principal = Depends(get_principal)):
+    sucursal_id = default_sucursal(principal, cliente.sucursal_id)
 
     try:
-        existing_cliente = select(Cliente).where(Cliente.email == cliente.email)
+        # Correo y RFC se comparan normalizados (mayúsculas, espacios, guiones)
+        existing_cliente = select(Cliente).where(Cliente.email_norm == email_key(cliente.email))
         result = await db.execute(existing_cliente)
 
         if result.scalar_one_or_none():
@@ -20,7 +150,7 @@ async def create_cliente(cliente: CreateCliente, db: AsyncSession = Depends(get_
                 detail="El cliente con este correo ya se encuentra registrado"
             )
         
-        existing_rfc = select(Cliente).where(Cliente.rfc == cliente.rfc)
+        existing_rfc = select(Cliente).where(Cliente.rfc_norm == rfc_key(cliente.rfc))
         result_rfc = await db.execute(existing_rfc)
 
         if result_rfc.scalar_one_or_none():
@@ -53,9 +183,15 @@ async def create_cliente(cliente: CreateCliente, db: AsyncSession = Depends(get_
             telefono = cliente.telefono,
             email = cliente.email,
             contacto = cliente.contacto,
-            tipocliente = cliente.tipocliente
+            tipocliente = cliente.tipocliente,
+            sucursal_id = sucursal_id
         )
 
+        # Mismo nombre (fonético) o teléfono: no bloquea el alta, se avisa
+        candidatos = await cliente_candidates(db, cliente.nombres, cliente.apellidos, cliente.telefono)
+        if candidatos:
+            response.headers["X-Posibles-Duplicados"] = ",".join(map(str, candidatos))
+
         db.add(new_cliente)
         await db.commit()
         await db.refresh(new_cliente)
@@ -71,14 +207,163 @@ async def create_cliente(cliente: CreateCliente, db: AsyncSession = Depends(get_
             detail="Error interno del servidor"
         )
 
-@router.get("/all", response_model=list[ClienteOut])
-async def get_all_clientes(db: AsyncSession = Depends(get_db)):
+@router.post("/create/completo", response_model=ClienteOut, response_model_exclude_unset=True)
+async def create_cliente_con_pacientes(cliente: CreateClienteConPacientes, response: Response, db: AsyncSession = Depends(get_db), principal: Principal = Depends(get_principal)):
+    # Alta de mostrador: cliente y sus pacientes en una petición y un solo commit
+    sucursal_id = default_sucursal(principal, cliente.sucursal_id)
 
     try:
-        query = select(Cliente)
-        result = await db.execute(query)
-        clientes = result.scalars().all()
-        return clientes
+        if not cliente.rfc:
+            raise HTTPException(
+                status_code=400,
+                detail="El RFC del cliente es obligatorio"
+            )
+
+        # Las validaciones del cliente van en una sola consulta
+        tabla = Cliente.__table__
+        query = select(
+            exists().where(tabla.c.email_norm == email_key(cliente.email)),
+            exists().where(tabla.c.rfc_norm == rfc_key(cliente.rfc)),
+            exists().where(Tipo_Cliente.__table__.c.id == cliente.tipocliente),
+        )
+        email_usado, rfc_usado, tipo_exists = (await db.execute(query)).one()
+
+        if email_usado:
+            raise HTTPException(
+                status_code=400,
+                detail="El cliente con este correo ya se encuentra registrado"
+            )
+
+        if rfc_usado:
+            raise HTTPException(
+                status_code=400,
+                detail="El cliente con este RFC ya se encuentra registrado"
+            )
+
+        if not tipo_exists:
+            raise HTTPException(
+                status_code=400,
+                detail=f"El tipo de cliente con ID {cliente.tipocliente} no existe"
+            )
+
+        # Nombre y apellidos repetidos dentro de la misma petición: es la
+        # validación de /pacientes/create, pero el cliente es nuevo y solo hay
+        # que comparar a los pacientes entre sí
+        nombres = set()
+        for paciente in cliente.pacientes:
+            nombre = (paciente.nombres, paciente.apellidos)
+            if nombre in nombres:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"El paciente {paciente.nombres} {paciente.apellidos} está repetido"
+                )
+            nombres.add(nombre)
+
+        # Igual que /cliente/create: un cliente parecido no bloquea el alta, se avisa
+        candidatos = await cliente_candidates(db, cliente.nombres, cliente.apellidos, cliente.telefono)
+        if candidatos:
+            response.headers["X-Posibles-Duplicados"] = ",".join(map(str, candidatos))
+
+        datos = cliente.model_dump(exclude={"pacientes"})
+        datos["sucursal_id"] = sucursal_id
+        result = await db.execute(insert(tabla).values(**datos).returning(*out_columns(Cliente, ClienteOut)))
+        nuevo = dict(result.mappings().one())
+
+        nuevo["pacientes"] = []
+        if cliente.pacientes:
+            filas = insert_values(Paciente, cliente.pacientes)
+            for fila in filas:
+                fila["cliente_id"] = nuevo["id"]
+            result = await db.execute(
+                insert(Paciente.__table__).values(filas).returning(*out_columns(Paciente, PacienteOut))
+            )
+            nuevo["pacientes"] = [dict(r) for r in result.mappings().all()]
+
+            # Nombres parecidos entre los pacientes recién insertados (se
+            # compara clave_nombre, calculada por la BD al insertar)
+            if len(filas) > 1:
+                parecidos = await sibling_candidates(db, nuevo["id"])
+                if parecidos:
+                    response.headers["X-Posibles-Duplicados-Pacientes"] = ",".join(map(str, parecidos))
+
+        await db.commit()
+        return nuevo
+
+    except HTTPException:
+        raise
+    except IntegrityError as e:
+        await db.rollback()
+        # Otro cliente con el mismo correo o RFC entró entre la validación y
+        # el insert; cualquier otra restricción es un error del servidor
+        indice = getattr(e.orig.__cause__, "constraint_name", None)
+        if indice in UNICOS:
+            raise HTTPException(
+                status_code=400,
+                detail=UNICOS[indice]
+            )
+        print(f"Error al crear cliente con pacientes: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error interno del servidor"
+        )
+    except Exception as e:
+        await db.rollback()
+        print(f"Error al crear cliente con pacientes: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error interno del servidor"
+        )
+
+@router.post("/import")
+async def import_clientes_archivo(archivo: UploadFile = File(...), db: AsyncSession = Depends(get_bulk_db), principal: Principal = Depends(get_principal)):
+    # CSV o Excel (.xlsx); las filas con errores se reportan y no detienen la carga
+    try:
+        return await import_clientes(db, reader_for(archivo.filename or "", archivo.file), principal)
+
+    except ValueError as e:
+        # Archivo ilegible (codificación, formato) o lector de Excel no disponible
+        await db.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail=f"No se pudo leer el archivo: {e}"
+        )
+    except Exception as e:
+        await db.rollback()
+        print(f"Error al importar clientes: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error interno del servidor"
+        )
+
+@router.get("/all", response_model=list[ClienteOut], response_model_exclude_unset=True)
+async def get_all_clientes(
+    expand: str | None = None,
+    fields: str | None = None,
+    estado: str | None = None,
+    ciudad: str | None = None,
+    codigopostal: str | None = None,
+    tipocliente: int | None = None,
+    limit: int | None = Query(default=None, ge=1, le=1000),
+    offset: int = Query(default=0, ge=0),
+    principal: Principal = Depends(get_principal)
+):
+    expand = parse_list_param(expand, EXPAND_CLIENTE, "expand")
+    fields = parse_fields(fields, Cliente, ClienteOut)
+    columnas = cliente_columns(fields, expand)
+    filtros = cliente_filters(estado=estado, ciudad=ciudad, codigopostal=codigopostal, tipocliente=tipocliente)
+
+    params = {f"f_{k}": v for k, v in filtros.items()}
+    if limit is not None:
+        params.update(limit=limit, offset=offset)
+    query = cliente_all_stmt(columnas, frozenset(filtros), limit is not None, not principal.global_)
+
+    async def loader(session: ReadSession):
+        return await load_clientes(session, query, read_params(principal, params), expand, fields)
+
+    try:
+        # Listado completo: va por el pool bulk para no competir con el mostrador
+        llave = ("cliente.all", frozenset(expand), fields, frozenset(params.items()), principal.scope)
+        return await reads.do(llave, loader, BulkReadSessionLocal)
     
     except Exception as e:
         print(f"Error al obtener clientes: {e}")
@@ -87,24 +372,71 @@ async def get_all_clientes(db: AsyncSession = Depends(get_db)):
             detail="Error interno del servidor"
         )
 
-@router.get("/search")
-async def search_clientes(cliente: str, db: AsyncSession = Depends(get_db)):
-    query = select(Cliente).where(
-        or_(
-            Cliente.nombres.ilike(f"%{cliente}%"),
-            Cliente.apellidos.ilike(f"%{cliente}%")
+@router.get("/facets")
+async def get_cliente_facets(
+    estado: str | None = None,
+    ciudad: str | None = None,
+    codigopostal: str | None = None,
+    tipocliente: int | None = None,
+    top: int = Query(default=20, ge=1, le=500),
+    principal: Principal = Depends(get_principal)
+):
+    # Conteos por valor de cada faceta con los filtros activos aplicados
+    filtros = cliente_filters(estado=estado, ciudad=ciudad, codigopostal=codigopostal, tipocliente=tipocliente)
+    params = {f"f_{k}": v for k, v in filtros.items()}
+
+    async def loader(session: ReadSession):
+        result = await session.execute(cliente_facets_stmt(frozenset(filtros), not principal.global_), read_params(principal, params))
+        facetas = {f: [] for f in FACETAS_CLIENTE}
+        for row in result.mappings().all():
+            for f in FACETAS_CLIENTE:
+                if row[f"g_{f}"] == 0:
+                    facetas[f].append({"valor": row[f], "total": row["total"]})
+
+        respuesta = {"total": sum(v["total"] for v in facetas["estado"]), "filtros": filtros}
+        for f, valores in facetas.items():
+            valores.sort(key=lambda v: v["total"], reverse=True)
+            respuesta[f] = valores[:top]
+        return respuesta
+
+    try:
+        return await reads.do(("cliente.facets", frozenset(params.items()), top, principal.scope), loader)
+
+    except Exception as e:
+        print(f"Error al obtener facetas de clientes: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error interno del servidor"
         )
-    ).limit(10)  # Limitar resultados
-    result = await db.execute(query)
-    return result.scalars().all()
+
+@router.get("/search", response_model=list[ClienteOut], response_model_exclude_unset=True)
+async def search_clientes(cliente: str, expand: str | None = None, fields: str | None = None, principal: Principal = Depends(get_principal)):
+    expand = parse_list_param(expand, EXPAND_CLIENTE, "expand")
+    fields = parse_fields(fields, Cliente, ClienteOut)
+    columnas = cliente_columns(fields, expand)
+    # ilike no distingue mayúsculas, así que la llave se normaliza igual
+    termino = cliente.strip().lower()
+
+    async def loader(session: ReadSession):
+        query = cliente_search_stmt(columnas, not principal.global_)
+        return await load_clientes(session, query, read_params(principal, {"patron": f"%{termino}%"}), expand, fields)
+
+    return await reads.do(("cliente.search", termino, frozenset(expand), fields, principal.scope), loader)
     
-@router.get("/{cliente_id}", response_model=ClienteOut)
-async def get_cliente(cliente_id: int, db: AsyncSession = Depends(get_db)):
+batch_routes(router, Cliente, ClienteOut, "clientes", alcance=batch_scope("sucursal", scope_clause(Cliente.__table__.c.sucursal_id, nulos=True)), response_model_exclude_unset=True)
+
+@router.get("/{cliente_id}", response_model=ClienteOut, response_model_exclude_unset=True)
+async def get_cliente(cliente_id: int, expand: str | None = None, fields: str | None = None, principal: Principal = Depends(get_principal)):
+    expand = parse_list_param(expand, EXPAND_CLIENTE, "expand")
+    fields = parse_fields(fields, Cliente, ClienteOut)
+    columnas = cliente_columns(fields, expand)
+
+    async def loader(session: ReadSession):
+        query = cliente_get_stmt(columnas, not principal.global_)
+        return await load_clientes(session, query, read_params(principal, {"id": cliente_id}), expand, fields, many=False)
 
     try:
-        query = select(Cliente).where(Cliente.id == cliente_id)
-        result = await db.execute(query)
-        cliente = result.scalar_one_or_none()
+        cliente = await reads.do(("cliente.get", cliente_id, frozenset(expand), fields, principal.scope), loader)
 
         if not cliente:
             raise HTTPException(
@@ -113,6 +445,8 @@ async def get_cliente(cliente_id: int, db: AsyncSession = Depends(get_db)):
             )
         
         return cliente
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error al obtener cliente: {e}")
         raise HTTPException(
@@ -120,24 +454,34 @@ async def get_cliente(cliente_id: int, db: AsyncSession = Depends(get_db)):
             detail="Error interno del servidor"
         )
     
-@router.post("/update/{cliente_id}", response_model=ClienteOut)
-async def update_cliente(cliente_id: int, cliente_update: ClienteUpdate, db: AsyncSession = Depends(get_db)):
+@router.post("/update/{cliente_id}", response_model=ClienteOut, response_model_exclude_unset=True)
+async def update_cliente(
+    cliente_id: int,
+    cliente_update: ClienteUpdate,
+    response: Response,
+    if_match: str | None = Header(default=None),
+    db: AsyncSession = Depends(get_db),
+    principal: Principal = Depends(get_principal)
+):
+    version = parse_if_match(if_match)
+    require_sucursal(principal, cliente_update.sucursal_id)
 
     try:
-        query = select(Cliente).where(Cliente.id == cliente_id)
-        result = await db.execute(query)
-        cliente = result.scalar_one_or_none()
+        # Actualizar solo los campos proporcionados
+        update_data = cliente_update.model_dump(exclude_unset=True)
 
-        if not cliente:
+        if not update_data:
             raise HTTPException(
-                status_code=404,
-                detail="Cliente no encontrado o inexistente"
+                status_code=400,
+                detail="No se proporcionaron datos para actualizar"
             )
-        
+
+        reject_nulls(Cliente, update_data)
+
         # Validar email solo si se proporciona y excluir el cliente actual
         if cliente_update.email is not None:
             existing_cliente = select(Cliente).where(
-                Cliente.email == cliente_update.email,
+                Cliente.email_norm == email_key(cliente_update.email),
                 Cliente.id != cliente_id
             )
             result = await db.execute(existing_cliente)
@@ -151,7 +495,7 @@ async def update_cliente(cliente_id: int, cliente_update: ClienteUpdate, db: Asy
         # Validar RFC solo si se proporciona y excluir el cliente actual
         if cliente_update.rfc is not None:
             existing_rfc = select(Cliente).where(
-                Cliente.rfc == cliente_update.rfc,
+                Cliente.rfc_norm == rfc_key(cliente_update.rfc),
                 Cliente.id != cliente_id
             )
             result_rfc = await db.execute(existing_rfc)
@@ -174,8 +518,40 @@ async def update_cliente(cliente_id: int, cliente_update: ClienteUpdate, db: Asy
                     detail=f"El tipo de cliente con ID {cliente_update.tipocliente} no existe"
                 )
 
-        # Actualizar solo los campos proporcionados
-        update_data = cliente_update.dict(exclude_unset=True)
+        # Con If-Match el UPDATE solo aplica si nadie cambió el cliente; 409 si no
+        cliente = await update_versioned(
+            db, Cliente, ClienteOut, cliente_id, update_data, version, "Cliente no encontrado o inexistente",
+            scope_conditions(principal, Cliente.__table__.c.sucursal_id, nulos=True)
+        )
+        response.headers["ETag"] = f'"{cliente["version"]}"'
+        return cliente
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        print(f"Error al actualizar cliente: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error interno del servidor"
+        )
+
+@router.post("/bulk/update")
+async def bulk_update_clientes(
+    peticion: ClienteBulkUpdate,
+    response: Response,
+    dry_run: bool = False,
+    en_segundo_plano: bool = False,
+    db: AsyncSession = Depends(get_bulk_db),
+    principal: Principal = Depends(get_principal)
+):
+    # Reclasificación en bloque: valida una vez y ejecuta un solo UPDATE
+    condiciones = filter_conditions(Cliente, ClienteUpdate, peticion.filtro)
+    condiciones += scope_conditions(principal, Cliente.__table__.c.sucursal_id, nulos=True)
+    require_sucursal(principal, peticion.cambios.sucursal_id)
+
+    try:
+        update_data = peticion.cambios.model_dump(exclude_unset=True)
 
         if not update_data:
             raise HTTPException(
@@ -183,29 +559,51 @@ async def update_cliente(cliente_id: int, cliente_update: ClienteUpdate, db: Asy
                 detail="No se proporcionaron datos para actualizar"
             )
 
-        for key, value in update_data.items():
-            setattr(cliente, key, value)
+        reject_nulls(Cliente, update_data)
+
+        # Correo y RFC son únicos por cliente: no se pueden asignar a varios a la vez
+        unicos = {"email", "rfc"} & set(update_data)
+        if unicos:
+            raise HTTPException(
+                status_code=400,
+                detail=f"No se puede actualizar en bloque: {', '.join(sorted(unicos))}"
+            )
+
+        if update_data.get("tipocliente") is not None:
+            query = select(exists().where(Tipo_Cliente.__table__.c.id == update_data["tipocliente"]))
+            if not (await db.execute(query)).scalar():
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"El tipo de cliente con ID {update_data['tipocliente']} no existe"
+                )
+
+        if en_segundo_plano and not dry_run:
+            # Validado aquí; el UPDATE corre en un job (GET /jobs/{id})
+            response.status_code = 202
+            return await enqueue(db, "bulk_update", {
+                "recurso": "clientes",
+                "filtro": peticion.filtro.model_dump(),
+                "cambios": update_data,
+                "sucursales": None if principal.global_ else sorted(principal.sucursales),
+            }, principal.user_id)
+
+        return await bulk_update(db, Cliente, condiciones, update_data, dry_run)
 
-        db.add(cliente)
-        await db.commit()
-        await db.refresh(cliente)
-        return cliente
-    
     except HTTPException:
         raise
     except Exception as e:
         await db.rollback()
-        print(f"Error al actualizar cliente: {e}")
+        print(f"Error al actualizar clientes en bloque: {e}")
         raise HTTPException(
             status_code=500,
             detail="Error interno del servidor"
         )
-    
+
 @router.delete("/delete/{cliente_id}")
-async def delete_cliente(cliente_id: int, db: AsyncSession = Depends(get_db)):
+async def delete_cliente(cliente_id: int, db: AsyncSession = Depends(get_db), principal: Principal = Depends(get_principal)):
     
     try:
-        query = select(Cliente).where(Cliente.id == cliente_id)
+        query = select(Cliente).where(Cliente.id == cliente_id, *scope_conditions(principal, Cliente.__table__.c.sucursal_id, nulos=True))
         result = await db.execute(query)
         cliente = result.scalar_one_or_none()
 
@@ -1,7 +1,12 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from database.database import get_db
+from database.database import get_db, ReadSession, get_read_db
+from database.batching import batch_routes
+from database.bulk import bulk_route
+from database.catalog_cache import catalogs
+from database.concurrency import reject_nulls
+from database.read_queries import cached, select_out, by_id, fetch_all, fetch_one
 from models.estado_sucursal_model import Estado_Sucursal, EstadoSucursalCreate, EstadoSucursalUpdate, EstadoSucursalOut
 from typing import List
 
@@ -27,6 +32,7 @@ async def create_estado_sucursal(estado_sucursal: EstadoSucursalCreate, db: Asyn
         )
         db.add(new_estado)
         await db.commit()
+        catalogs.invalidate("estado_sucursal")
         await db.refresh(new_estado)
         return new_estado
     
@@ -40,13 +46,15 @@ async def create_estado_sucursal(estado_sucursal: EstadoSucursalCreate, db: Asyn
             detail="Error interno del servidor"
         )
 
+# CREATE - Carga masiva de estados
+bulk_route(router, Estado_Sucursal, EstadoSucursalCreate, "estado", "estados de sucursal", "estado_sucursal")
+
 # READ - Obtener todos los estados
 @router.get("/all", response_model=List[EstadoSucursalOut])
-async def get_all_estados(db: AsyncSession = Depends(get_db)):
+async def get_all_estados(db: ReadSession = Depends(get_read_db)):
     try:
-        query = select(Estado_Sucursal)
-        result = await db.execute(query)
-        estados = result.scalars().all()
+        query = cached("estado_sucursal.all", lambda: select_out(Estado_Sucursal, EstadoSucursalOut))
+        estados = await fetch_all(db, query)
         return estados
     
     except Exception as e:
@@ -56,13 +64,15 @@ async def get_all_estados(db: AsyncSession = Depends(get_db)):
             detail="Error interno del servidor"
         )
 
+# READ - Obtener estados por lote
+batch_routes(router, Estado_Sucursal, EstadoSucursalOut, "estados de sucursal")
+
 # READ - Obtener un estado por ID
 @router.get("/{estado_id}", response_model=EstadoSucursalOut)
-async def get_estado_sucursal(estado_id: int, db: AsyncSession = Depends(get_db)):
+async def get_estado_sucursal(estado_id: int, db: ReadSession = Depends(get_read_db)):
     try:
-        query = select(Estado_Sucursal).where(Estado_Sucursal.id == estado_id)
-        result = await db.execute(query)
-        estado = result.scalar_one_or_none()
+        query = cached("estado_sucursal.get", lambda: by_id(select_out(Estado_Sucursal, EstadoSucursalOut), Estado_Sucursal))
+        estado = await fetch_one(db, query, {"id": estado_id})
 
         if not estado:
             raise HTTPException(
@@ -105,6 +115,8 @@ async def update_estado_sucursal(estado_id: int, updates: EstadoSucursalUpdate,
                 detail="No se han proporcionado datos por actualizar"
             )
 
+        reject_nulls(Estado_Sucursal, update_data)
+
         # Verificar si el nuevo nombre ya existe
         if "estado" in update_data:
             check_query = select(Estado_Sucursal).where(
@@ -123,6 +135,7 @@ async def update_estado_sucursal(estado_id: int, updates: EstadoSucursalUpdate,
             setattr(existing_estado, key, value)
 
         await db.commit()
+        catalogs.invalidate("estado_sucursal")
         await db.refresh(existing_estado)
         return existing_estado
     
@@ -154,6 +167,7 @@ async def delete_estado_sucursal(estado_id: int, db: AsyncSession = Depends(get_
         # Eliminar físicamente (no soft delete)
         await db.delete(existing_estado)
         await db.commit()
+        catalogs.invalidate("estado_sucursal")
 
         return {"message": "Estado de sucursal eliminado correctamente"}
     
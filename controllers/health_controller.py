@@ -0,0 +1,46 @@
+import asyncio
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+from database.database import engine, settings
+from database.catalog_cache import catalogs
+from database.warmup import estado
+
+router = APIRouter(prefix="/health", tags=["Health"])
+
+@router.get("/live")
+async def live():
+    return {"status": "ok"}
+
+@router.get("/ready")
+async def ready():
+    try:
+        async with engine.connect() as conn:
+            await asyncio.wait_for(conn.execute(text("SELECT 1")), timeout=2)
+        db_ok = True
+    except Exception as e:
+        print(f"Error al verificar la base de datos: {e}")
+        db_ok = False
+
+    pool = engine.pool
+    capacidad = settings.pool_size + settings.max_overflow
+    en_uso = pool.checkedout()
+
+    listo = db_ok and estado["listo"] and catalogs.is_warm()
+
+    return JSONResponse(
+        status_code=200 if listo else 503,
+        content={
+            "status": "ready" if listo else "not_ready",
+            "base_de_datos": db_ok,
+            "precalentado": estado,
+            "pool": {
+                "tamano": pool.size(),
+                "en_uso": en_uso,
+                "disponibles": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "saturacion": round(en_uso / capacidad, 3) if capacidad else None,
+            },
+            "catalogos": catalogs.stats(),
+        }
+    )
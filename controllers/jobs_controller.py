@@ -0,0 +1,144 @@
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
+from database.database import get_db, ReadSession, get_read_db
+from database.read_queries import out_columns
+from models.jobs_model import Job, JobCreate, JobOut
+from services.jobs import HANDLERS, enqueue, runner
+from middleware.auth import Principal, get_principal, require_global
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+tabla = Job.__table__
+
+def own_jobs(principal: Principal) -> list:
+    # Sin acceso global solo los jobs propios: parámetros y resultado pueden
+    # traer datos de cualquier sucursal (p. ej. dedup_report)
+    return [] if principal.global_ else [tabla.c.usuario_id == principal.user_id]
+
+@router.post("", response_model=JobOut, status_code=202)
+async def create_job(peticion: JobCreate, db: AsyncSession = Depends(get_db), principal: Principal = Depends(get_principal)):
+    # p. ej. {"tipo": "dedup_report", "parametros": {"entidad": "clientes"}}
+    # Los parámetros llegan tal cual al handler (sin alcance por sucursal)
+    require_global(principal)
+
+    try:
+        return await enqueue(db, peticion.tipo, peticion.parametros, principal.user_id)
+
+    except ValueError as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        await db.rollback()
+        print(f"Error al crear job: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error interno del servidor"
+        )
+
+@router.get("/tipos")
+async def get_job_tipos():
+    return sorted(HANDLERS)
+
+@router.get("/all", response_model=list[JobOut])
+async def get_all_jobs(
+    estado: str | None = None,
+    tipo: str | None = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    db: ReadSession = Depends(get_read_db),
+    principal: Principal = Depends(get_principal)
+):
+    try:
+        query = select(*out_columns(Job, JobOut)).where(*own_jobs(principal)).order_by(tabla.c.id.desc()).limit(limit)
+        if estado is not None:
+            query = query.where(tabla.c.estado == estado)
+        if tipo is not None:
+            query = query.where(tabla.c.tipo == tipo)
+
+        result = await db.execute(query)
+        return result.mappings().all()
+
+    except Exception as e:
+        print(f"Error al obtener jobs: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error interno del servidor"
+        )
+
+@router.get("/{job_id}", response_model=JobOut)
+async def get_job(job_id: int, db: ReadSession = Depends(get_read_db), principal: Principal = Depends(get_principal)):
+    # Estado y progreso; el resultado queda aquí al terminar
+    try:
+        result = await db.execute(select(*out_columns(Job, JobOut)).where(tabla.c.id == job_id, *own_jobs(principal)))
+        job = result.mappings().first()
+
+        if not job:
+            raise HTTPException(
+                status_code=404,
+                detail="Job no encontrado"
+            )
+
+        return job
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error al obtener job: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error interno del servidor"
+        )
+
+@router.post("/{job_id}/cancel", response_model=JobOut)
+async def cancel_job(job_id: int, db: AsyncSession = Depends(get_db), principal: Principal = Depends(get_principal)):
+    # Un pendiente se cancela de inmediato; uno en curso se marca y su worker
+    # lo detiene (al reportar progreso o en el siguiente latido)
+    require_global(principal)
+
+    try:
+        columnas = out_columns(Job, JobOut)
+        result = await db.execute(
+            update(tabla).where(tabla.c.id == job_id, tabla.c.estado == "pendiente")
+            .values(estado="cancelado", cancelar=True, finished_at=datetime.utcnow())
+            .returning(*columnas)
+        )
+        job = result.mappings().first()
+
+        if job is None:
+            result = await db.execute(
+                update(tabla).where(tabla.c.id == job_id, tabla.c.estado == "en_curso")
+                .values(cancelar=True)
+                .returning(*columnas)
+            )
+            job = result.mappings().first()
+
+        await db.commit()
+
+        if job is not None:
+            runner.cancel_local(job_id)
+            return job
+
+        result = await db.execute(select(tabla.c.estado).where(tabla.c.id == job_id))
+        estado = result.scalar_one_or_none()
+
+        if estado is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Job no encontrado"
+            )
+
+        raise HTTPException(
+            status_code=409,
+            detail=f"El job ya no se puede cancelar (estado: {estado})"
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        print(f"Error al cancelar job: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error interno del servidor"
+        )
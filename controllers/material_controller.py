@@ -1,7 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from database.database import get_db
+from database.database import get_db, ReadSession, get_read_db
+from database.batching import batch_routes
+from database.bulk import bulk_route
+from database.concurrency import reject_nulls
+from database.read_queries import cached, select_out, by_id, fetch_all, fetch_one
 from models.material_model import Material, MaterialCreate, MaterialUpdate, MaterialOut
 
 router = APIRouter(prefix="/materiales", tags=["Materiales"])
@@ -34,13 +38,14 @@ async def create_material(material: MaterialCreate, db: AsyncSession = Depends(g
             detail="Error interno del servidor"
         )
     
+bulk_route(router, Material, MaterialCreate, "material", "materiales")
+
 @router.get("/all", response_model=list[MaterialOut])
-async def get_all_materiales(db: AsyncSession = Depends(get_db)):
+async def get_all_materiales(db: ReadSession = Depends(get_read_db)):
 
     try:
-        query = select(Material)
-        result = await db.execute(query)
-        materiales = result.scalars().all()
+        query = cached("materiales.all", lambda: select_out(Material, MaterialOut))
+        materiales = await fetch_all(db, query)
         return materiales
     
     except Exception as e:
@@ -50,13 +55,14 @@ async def get_all_materiales(db: AsyncSession = Depends(get_db)):
             detail="Error interno del servidor"
         )
     
+batch_routes(router, Material, MaterialOut, "materiales")
+
 @router.get("/{material_id}", response_model=MaterialOut)
-async def get_material(material_id: int, db: AsyncSession = Depends(get_db)):
+async def get_material(material_id: int, db: ReadSession = Depends(get_read_db)):
     
     try:
-        query = select(Material).where(Material.id == material_id)
-        result = await db.execute(query)
-        material = result.scalar_one_or_none()
+        query = cached("materiales.get", lambda: by_id(select_out(Material, MaterialOut), Material))
+        material = await fetch_one(db, query, {"id": material_id})
         if not material:
             raise HTTPException(status_code=404, detail="Material no encontrado")
         return material
@@ -80,6 +86,8 @@ async def update_material(material_id: int, material_update: MaterialUpdate, db:
         if not material:
             raise HTTPException(status_code=404, detail="Material no encontrado")
 
+        # El único campo es obligatorio: omitirlo equivale a enviarlo nulo
+        reject_nulls(Material, material_update.model_dump())
         material.material = material_update.material
 
         db.add(material)
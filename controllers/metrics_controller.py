@@ -0,0 +1,37 @@
+from typing import Literal
+from fastapi import APIRouter, Depends
+from database.database import engines
+from database.pools import pool_stats
+from database.singleflight import reads
+from database.slow_queries import slow_queries
+from middleware.loop_monitor import monitor
+from middleware.auth import global_principal
+
+# Estado de todo el proceso (pilas, planes con valores de parámetros, reset):
+# solo para acceso global
+router = APIRouter(prefix="/metrics", tags=["Metrics"], dependencies=[Depends(global_principal)])
+
+@router.get("/coalescing")
+async def get_coalescing_metrics():
+    return reads.stats()
+
+@router.get("/pools")
+async def get_pool_metrics():
+    # Saturación y espera por conexión de cada pool: la espera de
+    # "interactive" no debe moverse cuando "bulk" o "background" se llenan
+    return {nombre: pool_stats(nombre, engine, capacidad) for nombre, (engine, capacidad) in engines.items()}
+
+@router.get("/loop")
+async def get_loop_metrics(top: int = 20):
+    # Retraso del event loop y los sitios que más lo bloquearon, por ruta
+    return monitor.stats(top)
+
+@router.get("/slow-queries")
+async def get_slow_queries(top: int = 20, orden: Literal["total_ms", "max_ms", "veces"] = "total_ms"):
+    # Consultas lentas agrupadas por SQL normalizado, con rutas, formas de
+    # parámetros y el último plan (EXPLAIN ANALYZE) si se obtuvo
+    return slow_queries.stats(top, orden)
+
+@router.delete("/slow-queries", status_code=204)
+async def reset_slow_queries():
+    slow_queries.reset()
@@ -1,26 +1,133 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from database.database import get_db
-from models.pacientes_model import Paciente, PacienteCreate, PacienteUpdate, PacienteOut
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy import ARRAY, Integer, any_, bindparam, exists, func, literal, select
+from database.database import get_db, get_bulk_db, ReadSession, get_bulk_read_db, get_read_db
+from database.batching import batch_routes
+from database.bulk import filter_conditions, bulk_update
+from database.concurrency import parse_if_match, reject_nulls, update_versioned
+from database.projection import parse_fields, render
+from database.read_queries import cached, hot, select_out, by_id, fetch_all, fetch_one
+from models.pacientes_model import Paciente, PacienteCreate, PacienteUpdate, PacienteOut, PacienteBulkUpdate, COHORT_FLAGS, NOTAS_CLINICAS
+from models.clientes_model import Cliente
+from services.jobs import enqueue
+from services.dedup import paciente_candidates
+from middleware.auth import Principal, get_principal, batch_scope, paciente_scope, scope_clause, scope_conditions
 
 router = APIRouter(prefix="/pacientes", tags=["Pacientes"])
+
+# Alcance de lectura: pacientes de clientes en las sucursales del usuario o sin sucursal
+ALCANCE = paciente_scope(scope_clause(Cliente.__table__.c.sucursal_id, nulos=True))
+
+def scoped(query, con_alcance: bool):
+    if con_alcance:
+        query = query.where(ALCANCE)
+    return query
+
+def read_params(principal: Principal, params: dict) -> dict:
+    if principal.global_:
+        return params
+    return {**params, **principal.scope_params()}
+
+def write_scope(principal: Principal) -> list:
+    return [paciente_scope(c) for c in scope_conditions(principal, Cliente.__table__.c.sucursal_id, nulos=True)]
+
+async def require_cliente(db: AsyncSession, principal: Principal, cliente_id: int):
+    # Asignar un paciente a un cliente fuera del alcance equivale a uno inexistente
+    clientes = Cliente.__table__
+    query = select(exists().where(
+        clientes.c.id == cliente_id,
+        *scope_conditions(principal, clientes.c.sucursal_id, nulos=True)
+    ))
+    if not (await db.execute(query)).scalar():
+        raise HTTPException(
+            status_code=400,
+            detail=f"El cliente con ID {cliente_id} no existe"
+        )
+
+def pacientes_cliente_stmt(fields: frozenset[str] | None, con_alcance: bool = False):
+    return cached(("pacientes.cliente", fields, con_alcance), lambda: scoped(select_out(Paciente, PacienteOut, fields).where(
+        Paciente.__table__.c.cliente_id == bindparam("cliente_id")
+    ), con_alcance))
+
+def paciente_get_stmt(fields: frozenset[str] | None, con_alcance: bool = False):
+    return cached(("pacientes.get", fields, con_alcance), lambda: scoped(by_id(select_out(Paciente, PacienteOut, fields), Paciente), con_alcance))
+
+def cohort_values(requeridas: set[str], excluidas: set[str]) -> list[int]:
+    # Todas las combinaciones de banderas (2^6) compatibles con el filtro: con
+    # igualdad sobre la lista el índice (banderas, edad, id) sirve tal cual,
+    # cosa que "banderas & mascara = mascara" no permitiría
+    con = sum(1 << i for i, f in enumerate(COHORT_FLAGS) if f in requeridas)
+    sin = sum(1 << i for i, f in enumerate(COHORT_FLAGS) if f in excluidas)
+    return [v for v in range(1 << len(COHORT_FLAGS)) if v & con == con and not v & sin]
+
+def cohort_stmt(con_edad_min: bool, con_edad_max: bool, contar: bool, con_alcance: bool = False):
+    tabla = Paciente.__table__
+
+    def build():
+        query = select(func.count() if contar else tabla.c.id).where(
+            tabla.c.banderas == any_(bindparam("banderas", type_=ARRAY(Integer)))
+        )
+        if con_edad_min:
+            query = query.where(tabla.c.edad >= bindparam("edad_min"))
+        if con_edad_max:
+            query = query.where(tabla.c.edad <= bindparam("edad_max"))
+        if not contar:
+            # Paginación por llave: ?despues_de=<último id de la página anterior>
+            query = query.where(tabla.c.id > bindparam("despues_de")).order_by(tabla.c.id).limit(bindparam("limit"))
+        return scoped(query, con_alcance)
+
+    return cached(("pacientes.cohort", con_edad_min, con_edad_max, contar, con_alcance), build)
+
+# Fragmentos resaltados: solo se calculan para la página ya ordenada
+HEADLINE_OPCIONES = "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5"
+
+def search_stmt(con_cliente: bool, con_alcance: bool = False):
+    tabla = Paciente.__table__
+
+    def build():
+        consulta = func.websearch_to_tsquery(literal("spanish").cast(REGCONFIG), bindparam("q"))
+        rank = func.ts_rank_cd(tabla.c.notas_tsv, consulta).label("rank")
+        pagina = select(tabla.c.id, rank).where(tabla.c.notas_tsv.op("@@")(consulta))
+        if con_cliente:
+            pagina = pagina.where(tabla.c.cliente_id == bindparam("cliente_id"))
+        pagina = scoped(pagina, con_alcance).order_by(rank.desc(), tabla.c.id).limit(bindparam("limit")).offset(bindparam("offset")).subquery()
+
+        texto = func.concat_ws(" … ", *(tabla.c[f] for f, _ in NOTAS_CLINICAS))
+        return select(
+            tabla.c.id, tabla.c.nombres, tabla.c.apellidos, tabla.c.cliente_id, pagina.c.rank,
+            func.ts_headline(literal("spanish").cast(REGCONFIG), texto, consulta, HEADLINE_OPCIONES).label("resaltado"),
+        ).join(pagina, pagina.c.id == tabla.c.id).order_by(pagina.c.rank.desc(), tabla.c.id)
+
+    return cached(("pacientes.search", con_cliente, con_alcance), build)
+
+hot(pacientes_cliente_stmt(None), {"cliente_id": 0})
+hot(paciente_get_stmt(None), {"id": 0})
+
 @router.post("/create", response_model=PacienteOut)
-async def create_paciente(paciente: PacienteCreate, db: AsyncSession = Depends(get_db)):
+async def create_paciente(paciente: PacienteCreate, response: Response, db: AsyncSession = Depends(get_db), principal: Principal = Depends(get_principal)):
 
     try:
+        if paciente.cliente_id is not None and not principal.global_:
+            await require_cliente(db, principal, paciente.cliente_id)
+
         # Verificar si el paciente ya existe SOLO dentro del mismo cliente
-        query = select(Paciente).where(
+        query = select(Paciente.id).where(
             Paciente.nombres == paciente.nombres,
             Paciente.apellidos == paciente.apellidos,
             Paciente.cliente_id == paciente.cliente_id
-        )
+        ).limit(1)
         result = await db.execute(query)
         if result.scalar_one_or_none():
             raise HTTPException(
                 status_code=400,
                 detail=f"Ya existe un paciente con el mismo nombre y apellidos para este cliente"
             )
+
+        # Nombre parecido (acentos, orden, b/v, s/z...): no bloquea el alta, se avisa
+        candidatos = await paciente_candidates(db, paciente.nombres, paciente.apellidos, paciente.cliente_id)
+        if candidatos:
+            response.headers["X-Posibles-Duplicados"] = ",".join(map(str, candidatos))
         
         new_paciente = Paciente(
             nombres = paciente.nombres,
@@ -55,12 +162,17 @@ async def create_paciente(paciente: PacienteCreate, db: AsyncSession = Depends(g
         )
     
 @router.get("/all", response_model=list[PacienteOut])
-async def get_all_pacientes(db: AsyncSession = Depends(get_db)):
+async def get_all_pacientes(fields: str | None = None, db: ReadSession = Depends(get_bulk_read_db), principal: Principal = Depends(get_principal)):
+    fields = parse_fields(fields, Paciente, PacienteOut)
+    con_alcance = not principal.global_
 
     try:
-        query = select(Paciente)
-        result= await db.execute(query)
-        pacientes = result.scalars().all()
+        query = cached(("pacientes.all", fields, con_alcance), lambda: scoped(select_out(Paciente, PacienteOut, fields), con_alcance))
+        pacientes = await fetch_all(db, query, read_params(principal, {}))
+
+        if fields is not None:
+            return render(PacienteOut, fields, pacientes)
+
         return pacientes
     
     except Exception as e:
@@ -71,11 +183,16 @@ async def get_all_pacientes(db: AsyncSession = Depends(get_db)):
         )
 
 @router.get("/cliente/{cliente_id}", response_model=list[PacienteOut])
-async def get_pacientes_by_cliente(cliente_id: int, db: AsyncSession = Depends(get_db)):
+async def get_pacientes_by_cliente(cliente_id: int, fields: str | None = None, db: ReadSession = Depends(get_read_db), principal: Principal = Depends(get_principal)):
+    fields = parse_fields(fields, Paciente, PacienteOut)
+
     try:
-        query = select(Paciente).where(Paciente.cliente_id == cliente_id)
-        result = await db.execute(query)
-        pacientes = result.scalars().all()
+        query = pacientes_cliente_stmt(fields, not principal.global_)
+        pacientes = await fetch_all(db, query, read_params(principal, {"cliente_id": cliente_id}))
+
+        if fields is not None:
+            return render(PacienteOut, fields, pacientes)
+
         return pacientes
     
     except Exception as e:
@@ -85,13 +202,96 @@ async def get_pacientes_by_cliente(cliente_id: int, db: AsyncSession = Depends(g
             detail="Error interno del servidor"
         )
 
+@router.get("/cohort")
+async def get_cohort(
+    lentes: bool | None = None,
+    antecedentes_familiares_lentes: bool | None = None,
+    hipertension: bool | None = None,
+    diabetico: bool | None = None,
+    util_lentes: bool | None = None,
+    cefaleas: bool | None = None,
+    edad_min: int | None = Query(default=None, ge=0),
+    edad_max: int | None = Query(default=None, ge=0),
+    despues_de: int = 0,
+    limit: int = Query(default=100, ge=1, le=1000),
+    db: ReadSession = Depends(get_read_db),
+    principal: Principal = Depends(get_principal)
+):
+    # p. ej. ?diabetico=true&hipertension=true&cefaleas=true&edad_min=50
+    valores = {
+        "lentes": lentes,
+        "antecedentes_familiares_lentes": antecedentes_familiares_lentes,
+        "hipertension": hipertension,
+        "diabetico": diabetico,
+        "util_lentes": util_lentes,
+        "cefaleas": cefaleas,
+    }
+    requeridas = {f for f, v in valores.items() if v is True}
+    excluidas = {f for f, v in valores.items() if v is False}
+
+    params = read_params(principal, {
+        "banderas": cohort_values(requeridas, excluidas),
+        "edad_min": edad_min,
+        "edad_max": edad_max,
+        "despues_de": despues_de,
+        "limit": limit,
+    })
+
+    try:
+        con_min, con_max, con_alcance = edad_min is not None, edad_max is not None, not principal.global_
+        total = (await db.execute(cohort_stmt(con_min, con_max, True, con_alcance), params)).scalar_one()
+        ids = list((await db.execute(cohort_stmt(con_min, con_max, False, con_alcance), params)).scalars().all())
+
+        return {
+            "total": total,
+            "ids": ids,
+            "siguiente": ids[-1] if len(ids) == limit else None,
+        }
+
+    except Exception as e:
+        print(f"Error al obtener cohorte de pacientes: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error interno del servidor"
+        )
+
+@router.get("/search")
+async def search_pacientes(
+    q: str,
+    cliente_id: int | None = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    offset: int = Query(default=0, ge=0),
+    db: ReadSession = Depends(get_read_db),
+    principal: Principal = Depends(get_principal)
+):
+    # Búsqueda en las notas clínicas, p. ej. ?q=visión borrosa -glaucoma
+    if not q.strip():
+        raise HTTPException(
+            status_code=400,
+            detail="Debe proporcionar un texto de búsqueda"
+        )
+
+    params = read_params(principal, {"q": q, "cliente_id": cliente_id, "limit": limit, "offset": offset})
+
+    try:
+        result = await db.execute(search_stmt(cliente_id is not None, not principal.global_), params)
+        return {"resultados": [dict(r) for r in result.mappings().all()]}
+
+    except Exception as e:
+        print(f"Error al buscar pacientes: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error interno del servidor"
+        )
+
+batch_routes(router, Paciente, PacienteOut, "pacientes", alcance=batch_scope("cliente", ALCANCE))
+
 @router.get("/{paciente_id}", response_model=PacienteOut)
-async def get_paciente(paciente_id: int, db: AsyncSession = Depends(get_db)):
+async def get_paciente(paciente_id: int, fields: str | None = None, db: ReadSession = Depends(get_read_db), principal: Principal = Depends(get_principal)):
+    fields = parse_fields(fields, Paciente, PacienteOut)
 
     try:
-        query = select(Paciente).where(Paciente.id == paciente_id)
-        result = await db.execute(query)
-        paciente = result.scalar_one_or_none()
+        paciente = await fetch_one(db, paciente_get_stmt(fields, not principal.global_), read_params(principal, {"id": paciente_id}))
 
         if not paciente:
             raise HTTPException(
@@ -99,8 +299,13 @@ async def get_paciente(paciente_id: int, db: AsyncSession = Depends(get_db)):
                 detail="Paciente no encontrado"
             )
         
+        if fields is not None:
+            return render(PacienteOut, fields, paciente, many=False)
+
         return paciente
     
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error al obtener paciente: {e}")
         raise HTTPException(
@@ -110,40 +315,40 @@ async def get_paciente(paciente_id: int, db: AsyncSession = Depends(get_db)):
     
 
 @router.post("/update/{paciente_id}", response_model=PacienteOut)
-async def update_paciente(paciente_id: int, paciente_update: PacienteUpdate, db: AsyncSession = Depends(get_db)):
+async def update_paciente(
+    paciente_id: int,
+    paciente_update: PacienteUpdate,
+    response: Response,
+    if_match: str | None = Header(default=None),
+    db: AsyncSession = Depends(get_db),
+    principal: Principal = Depends(get_principal)
+):
+    version = parse_if_match(if_match)
 
     try:
-        query = select(Paciente).where(Paciente.id == paciente_id)
-        result = await db.execute(query)
-        paciente = result.scalar_one_or_none()
+        # Solo los campos enviados: los demás conservan su valor
+        update_data = paciente_update.model_dump(exclude_unset=True)
 
-        if not paciente:
+        if not update_data:
             raise HTTPException(
-                status_code=404,
-                detail="Paciente no encontrado"
+                status_code=400,
+                detail="No se proporcionaron datos para actualizar"
             )
-        
-        # Actualizar los campos del paciente
-        paciente.nombres = paciente_update.nombres
-        paciente.apellidos = paciente_update.apellidos
-        paciente.edad = paciente_update.edad
-        paciente.ocupacion = paciente_update.ocupacion
-        paciente.problema_ocular = paciente_update.problema_ocular
-        paciente.medicamento_actual = paciente_update.medicamento_actual
-        paciente.lentes = paciente_update.lentes
-        paciente.antecedentes_familiares_lentes = paciente_update.antecedentes_familiares_lentes
-        paciente.hipertension = paciente_update.hipertension
-        paciente.diabetico = paciente_update.diabetico
-        paciente.util_lentes = paciente_update.util_lentes
-        paciente.cefaleas = paciente_update.cefaleas
-        paciente.princip_defi_visual = paciente_update.princip_defi_visual
-        paciente.otros = paciente_update.otros
-
-        db.add(paciente)
-        await db.commit()
-        await db.refresh(paciente)
+
+        reject_nulls(Paciente, update_data)
+
+        if update_data.get("cliente_id") is not None:
+            await require_cliente(db, principal, update_data["cliente_id"])
+
+        paciente = await update_versioned(
+            db, Paciente, PacienteOut, paciente_id, update_data, version, "Paciente no encontrado",
+            write_scope(principal)
+        )
+        response.headers["ETag"] = f'"{paciente["version"]}"'
         return paciente
     
+    except HTTPException:
+        raise
     except Exception as e:
         await db.rollback()
         print(f"Error al actualizar paciente: {e}")
@@ -152,10 +357,59 @@ async def update_paciente(paciente_id: int, paciente_update: PacienteUpdate, db:
             detail="Error interno del servidor"
         )
     
+@router.post("/bulk/update")
+async def bulk_update_pacientes(
+    peticion: PacienteBulkUpdate,
+    response: Response,
+    dry_run: bool = False,
+    en_segundo_plano: bool = False,
+    db: AsyncSession = Depends(get_bulk_db),
+    principal: Principal = Depends(get_principal)
+):
+    # Reasignación en bloque: valida una vez y ejecuta un solo UPDATE
+    condiciones = filter_conditions(Paciente, PacienteUpdate, peticion.filtro)
+    condiciones += write_scope(principal)
+
+    try:
+        update_data = peticion.cambios.model_dump(exclude_unset=True)
+
+        if not update_data:
+            raise HTTPException(
+                status_code=400,
+                detail="No se proporcionaron datos para actualizar"
+            )
+
+        reject_nulls(Paciente, update_data)
+
+        if update_data.get("cliente_id") is not None:
+            await require_cliente(db, principal, update_data["cliente_id"])
+
+        if en_segundo_plano and not dry_run:
+            # Validado aquí; el UPDATE corre en un job (GET /jobs/{id})
+            response.status_code = 202
+            return await enqueue(db, "bulk_update", {
+                "recurso": "pacientes",
+                "filtro": peticion.filtro.model_dump(),
+                "cambios": update_data,
+                "sucursales": None if principal.global_ else sorted(principal.sucursales),
+            }, principal.user_id)
+
+        return await bulk_update(db, Paciente, condiciones, update_data, dry_run)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        print(f"Error al actualizar pacientes en bloque: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error interno del servidor"
+        )
+
 @router.delete("/delete/{paciente_id}")
-async def delete_paciente(paciente_id: int, db: AsyncSession = Depends(get_db)):
+async def delete_paciente(paciente_id: int, db: AsyncSession = Depends(get_db), principal: Principal = Depends(get_principal)):
     try:
-        query = select(Paciente).where(Paciente.id == paciente_id)
+        query = select(Paciente).where(Paciente.id == paciente_id, *write_scope(principal))
         result = await db.execute(query)
         paciente = result.scalar_one_or_none()
 
@@ -1,7 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from database.database import get_db
+from database.database import get_db, ReadSession, get_read_db
+from database.batching import batch_routes
+from database.bulk import bulk_route
+from database.concurrency import reject_nulls
+from database.read_queries import cached, select_out, by_id, fetch_all, fetch_one
 from models.servico_model import Servicio, ServicioCreate, ServicioUpdate, ServicioOut
 
 router = APIRouter(prefix="/servicios", tags=["Servicios"])
@@ -34,13 +38,14 @@ async def create_servicio(servicio: ServicioCreate, db: AsyncSession = Depends(g
             detail="Error interno del servidor"
         )
     
+bulk_route(router, Servicio, ServicioCreate, "servicio", "servicios")
+
 @router.get("/all", response_model=list[ServicioOut])
-async def get_all_servicios(db: AsyncSession = Depends(get_db)):
+async def get_all_servicios(db: ReadSession = Depends(get_read_db)):
 
     try:
-        query = select(Servicio)
-        result = await db.execute(query)
-        servicios = result.scalars().all()
+        query = cached("servicios.all", lambda: select_out(Servicio, ServicioOut))
+        servicios = await fetch_all(db, query)
         return servicios
     
     except Exception as e:
@@ -50,13 +55,14 @@ async def get_all_servicios(db: AsyncSession = Depends(get_db)):
             detail="Error interno del servidor"
         )
     
+batch_routes(router, Servicio, ServicioOut, "servicios")
+
 @router.get("/{servicio_id}", response_model=ServicioOut)
-async def get_servicio(servicio_id: int, db: AsyncSession = Depends(get_db)):
+async def get_servicio(servicio_id: int, db: ReadSession = Depends(get_read_db)):
 
     try:
-        query = select(Servicio).where(Servicio.id == servicio_id)
-        result = await db.execute(query)
-        servicio = result.scalar_one_or_none()
+        query = cached("servicios.get", lambda: by_id(select_out(Servicio, ServicioOut), Servicio))
+        servicio = await fetch_one(db, query, {"id": servicio_id})
 
         if not servicio:
             raise HTTPException(
@@ -66,6 +72,8 @@ async def get_servicio(servicio_id: int, db: AsyncSession = Depends(get_db)):
         
         return servicio
     
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error al obtener servicio: {e}")
         raise HTTPException(
@@ -94,6 +102,8 @@ async def update_servicio(servicio_id: int, servicio_update: ServicioUpdate, db:
                 status_code=400,
                 detail="No se proporcionaron datos para actualizar"
             )
+
+        reject_nulls(Servicio, update_data)
         
         existing_servicio_query = select(Servicio).where(Servicio.servicio == update_data.get("servicio"), Servicio.id != servicio_id)
         existing_servicio_result = await db.execute(existing_servicio_query)
@@ -113,6 +123,8 @@ async def update_servicio(servicio_id: int, servicio_update: ServicioUpdate, db:
         await db.refresh(servicio_result)
         return servicio_result
     
+    except HTTPException:
+        raise
     except Exception as e:
         await db.rollback()
         print(f"Error al actualizar servicio: {e}")
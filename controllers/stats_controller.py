@@ -0,0 +1,178 @@
+from datetime import date, timedelta
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import bindparam, func, select, union_all
+from database.read_queries import cached
+from database.singleflight import reads
+from models.stats_model import StatsConteo, StatsDelta
+from middleware.auth import global_principal
+
+# Los conteos vienen de stats_conteos (mantenido por triggers) más los deltas
+# que la compactación aún no sumó: la respuesta es exacta y el costo depende
+# del número de valores de la dimensión, no del tamaño de las tablas. Son
+# totales de todas las sucursales (las tablas no se separan por sucursal):
+# solo para acceso global
+router = APIRouter(prefix="/stats", tags=["Estadísticas"], dependencies=[Depends(global_principal)])
+
+
+def conteos_stmt(con_desde: bool, con_hasta: bool, con_valor: bool):
+    conteos, deltas = StatsConteo.__table__, StatsDelta.__table__
+
+    def build():
+        partes = []
+        for tabla, cantidad in ((conteos, conteos.c.total), (deltas, deltas.c.delta)):
+            query = select(tabla.c.valor, cantidad.label("total")).where(tabla.c.dimension == bindparam("dimension"))
+            if con_desde:
+                query = query.where(tabla.c.valor >= bindparam("desde"))
+            if con_hasta:
+                query = query.where(tabla.c.valor <= bindparam("hasta"))
+            if con_valor:
+                query = query.where(tabla.c.valor == bindparam("valor"))
+            partes.append(query)
+
+        union = union_all(*partes).subquery()
+        total = func.sum(union.c.total)
+        return select(union.c.valor, total.label("total")).group_by(union.c.valor).having(total != 0).order_by(union.c.valor)
+
+    return cached(("stats.conteos", con_desde, con_hasta, con_valor), build)
+
+
+def top_stmt():
+    # Ranking sobre lo ya compactado (ix_stats_conteos_dimension_total): puede
+    # ir hasta un intervalo de compactación detrás de los conteos exactos
+    conteos = StatsConteo.__table__
+    return cached(("stats.top",), lambda: (
+        select(conteos.c.valor, conteos.c.total)
+        .where(conteos.c.dimension == bindparam("dimension"))
+        .order_by(conteos.c.total.desc())
+        .limit(bindparam("top"))
+    ))
+
+
+def _id(valor: str) -> int | None:
+    return int(valor) if valor else None
+
+
+async def load_conteos(dimension: str, desde: str | None = None, hasta: str | None = None, valor: str | None = None) -> list:
+    params = {"dimension": dimension, "desde": desde, "hasta": hasta, "valor": valor}
+
+    async def loader(session):
+        query = conteos_stmt(desde is not None, hasta is not None, valor is not None)
+        result = await session.execute(query, params)
+        return [(r.valor, r.total) for r in result.all()]
+
+    return await reads.do(("stats", frozenset(params.items())), loader)
+
+
+@router.get("/clientes/nuevos")
+async def get_clientes_nuevos(
+    periodo: Literal["dia", "semana"] = "dia",
+    desde: date | None = None,
+    hasta: date | None = None
+):
+    if desde is not None and hasta is not None and desde > hasta:
+        raise HTTPException(
+            status_code=400,
+            detail="La fecha 'desde' no puede ser posterior a 'hasta'"
+        )
+
+    if periodo == "semana" and desde is not None:
+        # La semana (lunes) que contiene 'desde' se cuenta completa
+        desde -= timedelta(days=desde.weekday())
+
+    try:
+        dias = await load_conteos(
+            "clientes.dia",
+            desde=desde.isoformat() if desde else None,
+            hasta=hasta.isoformat() if hasta else None,
+        )
+
+        series: dict[str, int] = {}
+        for dia, total in dias:
+            if periodo == "semana":
+                fecha = date.fromisoformat(dia)
+                dia = (fecha - timedelta(days=fecha.weekday())).isoformat()
+            series[dia] = series.get(dia, 0) + total
+
+        return {
+            "periodo": periodo,
+            "total": sum(series.values()),
+            "series": [{"fecha": f, "total": t} for f, t in series.items()],
+        }
+
+    except Exception as e:
+        print(f"Error al obtener clientes nuevos: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error interno del servidor"
+        )
+
+
+@router.get("/clientes/tipocliente")
+async def get_clientes_por_tipo():
+    try:
+        conteos = await load_conteos("clientes.tipocliente")
+        return [{"tipocliente": _id(v), "total": t} for v, t in conteos]
+
+    except Exception as e:
+        print(f"Error al obtener clientes por tipo: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error interno del servidor"
+        )
+
+
+@router.get("/clientes/estado")
+async def get_clientes_por_estado():
+    try:
+        conteos = await load_conteos("clientes.estado")
+        return [{"estado": v, "total": t} for v, t in conteos]
+
+    except Exception as e:
+        print(f"Error al obtener clientes por estado: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error interno del servidor"
+        )
+
+
+@router.get("/pacientes/cliente")
+async def get_pacientes_por_cliente(
+    cliente_id: int | None = None,
+    top: int = Query(default=20, ge=1, le=500)
+):
+    # ?cliente_id= devuelve el conteo de ese cliente; sin él, los clientes con
+    # más pacientes
+    try:
+        if cliente_id is not None:
+            conteos = await load_conteos("pacientes.cliente", valor=str(cliente_id))
+            return [{"cliente_id": cliente_id, "total": conteos[0][1] if conteos else 0}]
+
+        params = {"dimension": "pacientes.cliente", "top": top}
+
+        async def loader(session):
+            result = await session.execute(top_stmt(), params)
+            return [{"cliente_id": _id(r.valor), "total": r.total} for r in result.all()]
+
+        return await reads.do(("stats.top", frozenset(params.items())), loader)
+
+    except Exception as e:
+        print(f"Error al obtener pacientes por cliente: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error interno del servidor"
+        )
+
+
+@router.get("/users/sucursal")
+async def get_users_por_sucursal():
+    try:
+        conteos = await load_conteos("users.sucursal")
+        return [{"sucursal": _id(v), "total": t} for v, t in conteos]
+
+    except Exception as e:
+        print(f"Error al obtener usuarios por sucursal: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error interno del servidor"
+        )
@@ -1,15 +1,40 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from database.database import get_db
+from database.database import get_db, ReadSession
+from database.singleflight import reads
+from database.batching import parse_list_param, batch_routes
+from database.read_queries import cached, hot, select_out, by_id, fetch_all
+from database.catalog_cache import catalogs
+from database.concurrency import parse_if_match, reject_nulls, update_versioned
 from models.sucursales_model import Sucursal, SucursalCreate, SucursalUpdate, SucursalOut
 from models.tipo_sucursal_model import tipoSucursal
 from models.estado_sucursal_model import Estado_Sucursal
+from middleware.auth import Principal, get_principal, require_global, batch_scope, scope_clause
 
 router = APIRouter(prefix="/sucursales", tags=["Sucursales"])
 
-@router.post("/create", response_model=SucursalOut)
-async def create_sucursal(sucursal: SucursalCreate, db: AsyncSession = Depends(get_db)):
+EXPAND_SUCURSAL = {"tipo_sucursal", "estado_sucursal"}
+
+SUCURSAL_ALL = hot(cached("sucursal.all", lambda: select_out(Sucursal, SucursalOut).order_by(Sucursal.__table__.c.sucursal)))
+SUCURSAL_GET = hot(cached("sucursal.get", lambda: by_id(select_out(Sucursal, SucursalOut), Sucursal)), {"id": 0})
+
+async def expand_sucursales(db: AsyncSession, rows: list[dict], expand: set[str]) -> list[dict]:
+    if "tipo_sucursal" in expand:
+        tipos = await catalogs.get("tipo_sucursal")
+        for r in rows:
+            r["tipo_sucursal"] = tipos.get(r["tipo_sucursal_id"])
+
+    if "estado_sucursal" in expand:
+        estados = await catalogs.get("estado_sucursal")
+        for r in rows:
+            r["estado_sucursal"] = estados.get(r["estado_sucursal_id"])
+
+    return rows
+
+@router.post("/create", response_model=SucursalOut, response_model_exclude_unset=True)
+async def create_sucursal(sucursal: SucursalCreate, db: AsyncSession = Depends(get_db), principal: Principal = Depends(get_principal)):
+    require_global(principal)
 
     try:
         # Validar que tipo_sucursal_id existe
@@ -69,14 +94,20 @@ async def create_sucursal(sucursal: SucursalCreate, db: AsyncSession = Depends(g
             detail="Error interno del servidor"
         )
     
-@router.get("/all", response_model=list[SucursalOut])
-async def get_all_sucursales(db: AsyncSession = Depends(get_db)):
+@router.get("/all", response_model=list[SucursalOut], response_model_exclude_unset=True)
+async def get_all_sucursales(expand: str | None = None, principal: Principal = Depends(get_principal)):
+    expand = parse_list_param(expand, EXPAND_SUCURSAL, "expand")
+
+    async def loader(session: ReadSession):
+        return await expand_sucursales(session, await fetch_all(session, SUCURSAL_ALL), expand)
 
     try:
-        query = select(Sucursal).order_by(Sucursal.sucursal)
-        result = await db.execute(query)
-        sucursales = result.scalars().all()
-        return sucursales
+        # El catálogo es pequeño: una sola lectura compartida por todos los
+        # usuarios y el alcance se aplica al resultado
+        sucursales = await reads.do(("sucursal.all", frozenset(expand)), loader)
+        if principal.global_:
+            return sucursales
+        return [s for s in sucursales if s["id"] in principal.sucursales]
     
     except Exception as e:
         print(f"Error al obtener sucursales: {e}")
@@ -85,13 +116,24 @@ async def get_all_sucursales(db: AsyncSession = Depends(get_db)):
             detail="Error interno del servidor"
         )
     
-@router.get("/{sucursal_id}", response_model=SucursalOut)
-async def get_sucursal(sucursal_id: int, db: AsyncSession = Depends(get_db)):
+batch_routes(router, Sucursal, SucursalOut, "sucursales", alcance=batch_scope("sucursal", scope_clause(Sucursal.__table__.c.id)), response_model_exclude_unset=True)
+
+@router.get("/{sucursal_id}", response_model=SucursalOut, response_model_exclude_unset=True)
+async def get_sucursal(sucursal_id: int, expand: str | None = None, principal: Principal = Depends(get_principal)):
+    expand = parse_list_param(expand, EXPAND_SUCURSAL, "expand")
+
+    if not principal.can_access(sucursal_id):
+        raise HTTPException(
+            status_code=404,
+            detail="Sucursal no encontrada"
+        )
+
+    async def loader(session: ReadSession):
+        rows = await fetch_all(session, SUCURSAL_GET, {"id": sucursal_id})
+        return (await expand_sucursales(session, rows, expand))[0] if rows else None
 
     try:
-        query = select(Sucursal).where(Sucursal.id == sucursal_id)
-        result = await db.execute(query)
-        sucursal = result.scalar_one_or_none()
+        sucursal = await reads.do(("sucursal.get", sucursal_id, frozenset(expand)), loader)
         
         if not sucursal:
             raise HTTPException(
@@ -101,6 +143,8 @@ async def get_sucursal(sucursal_id: int, db: AsyncSession = Depends(get_db)):
 
         return sucursal
     
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error al obtener sucursal: {e}")
         raise HTTPException(
@@ -108,20 +152,25 @@ async def get_sucursal(sucursal_id: int, db: AsyncSession = Depends(get_db)):
             detail="Error interno del servidor"
         )
     
-@router.post("/update/{sucursal_id}", response_model=SucursalOut)
-async def update_sucursal(sucursal_id: int, sucursal_update: SucursalUpdate, db: AsyncSession = Depends(get_db)):
+@router.post("/update/{sucursal_id}", response_model=SucursalOut, response_model_exclude_unset=True)
+async def update_sucursal(
+    sucursal_id: int,
+    sucursal_update: SucursalUpdate,
+    response: Response,
+    if_match: str | None = Header(default=None),
+    db: AsyncSession = Depends(get_db),
+    principal: Principal = Depends(get_principal)
+):
+    version = parse_if_match(if_match)
 
-    try: 
-        query = select(Sucursal).where(Sucursal.id == sucursal_id)
-        result = await db.execute(query)
+    if not principal.can_access(sucursal_id):
+        raise HTTPException(
+            status_code=404,
+            detail="Sucursal no encontrada"
+        )
 
-        if not result.scalar_one_or_none():
-            raise HTTPException(
-                status_code=404,
-                detail="Sucursal no encontrada"
-            )
-        
-        update_data = sucursal_update.dict(exclude_unset=True) 
+    try: 
+        update_data = sucursal_update.model_dump(exclude_unset=True)
 
         if not update_data:
             raise HTTPException(
@@ -129,6 +178,8 @@ async def update_sucursal(sucursal_id: int, sucursal_update: SucursalUpdate, db:
                 detail="No se han proporcionado datos por actualizar"
             )
 
+        reject_nulls(Sucursal, update_data)
+
         tipo_query = select(tipoSucursal).where(tipoSucursal.id == update_data.get("tipo_sucursal_id", 0))
         tipo_result = await db.execute(tipo_query)
 
@@ -160,18 +211,11 @@ async def update_sucursal(sucursal_id: int, sucursal_update: SucursalUpdate, db:
                     detail="Ya existe una sucursal con ese nombre"
                 )
         
-        # Obtener la sucursal nuevamente para actualizar
-        query = select(Sucursal).where(Sucursal.id == sucursal_id)
-        result = await db.execute(query)
-        existing_sucursal = result.scalar_one_or_none()
-        
-        # Actualizar campos
-        for key, value in update_data.items():
-            setattr(existing_sucursal, key, value)
-        
-        await db.commit()
-        await db.refresh(existing_sucursal)
-        return existing_sucursal
+        sucursal = await update_versioned(
+            db, Sucursal, SucursalOut, sucursal_id, update_data, version, "Sucursal no encontrada"
+        )
+        response.headers["ETag"] = f'"{sucursal["version"]}"'
+        return sucursal
     
     except HTTPException:
         raise
@@ -184,7 +228,9 @@ async def update_sucursal(sucursal_id: int, sucursal_update: SucursalUpdate, db:
         )
 
 @router.delete("/delete/{sucursal_id}")
-async def delete_sucursal(sucursal_id: int, db: AsyncSession = Depends(get_db)):
+async def delete_sucursal(sucursal_id: int, db: AsyncSession = Depends(get_db), principal: Principal = Depends(get_principal)):
+    require_global(principal)
+
     try:
         query = select(Sucursal).where(Sucursal.id == sucursal_id)
         result = await db.execute(query)
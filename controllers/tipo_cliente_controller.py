@@ -1,7 +1,11 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from database.database import get_db
+from database.database import get_db, ReadSession, get_read_db
+from database.batching import batch_routes
+from database.bulk import bulk_route
+from database.catalog_cache import catalogs
+from database.read_queries import cached, select_out, by_id, fetch_all, fetch_one
 from models.tipo_cliente_model import Tipo_Cliente, TipoClienteCreate, TipoClienteUpdate, TipoClienteOut
 
 router = APIRouter(prefix="/tipo_cliente", tags=["Tipo_Cliente"])
@@ -25,6 +29,7 @@ async def create_tipo_cliente(tipo_cliente: TipoClienteCreate, db: AsyncSession
 
         db.add(new_tipo_cliente)
         await db.commit()
+        catalogs.invalidate("tipo_cliente")
         await db.refresh(new_tipo_cliente)
         return new_tipo_cliente
     except HTTPException:
@@ -37,14 +42,15 @@ async def create_tipo_cliente(tipo_cliente: TipoClienteCreate, db: AsyncSession
             detail="Error interno del servidor"
         )
     
+bulk_route(router, Tipo_Cliente, TipoClienteCreate, "cliente", "tipos de cliente", "tipo_cliente")
+
 @router.get("/all", response_model=list[TipoClienteOut])
-async def get_all_tipo_clientes(db: AsyncSession = Depends(get_db)):
+async def get_all_tipo_clientes(db: ReadSession = Depends(get_read_db)):
 
     try:
-        query = select(Tipo_Cliente)
-        result = await db.execute(query)
+        query = cached("tipo_cliente.all", lambda: select_out(Tipo_Cliente, TipoClienteOut))
 
-        tipos_clientes = result.scalars().all()
+        tipos_clientes = await fetch_all(db, query)
         return tipos_clientes
     except Exception as e:
         print(f"Error al obtener tipos de clientes: {e}")
@@ -53,13 +59,14 @@ async def get_all_tipo_clientes(db: AsyncSession = Depends(get_db)):
             detail="Error interno del servidor"
         )
     
+batch_routes(router, Tipo_Cliente, TipoClienteOut, "tipos de cliente")
+
 @router.get("/{tipo_cliente_id}", response_model=TipoClienteOut)
-async def get_tipo_cliente(tipo_cliente_id: int, db: AsyncSession = Depends(get_db)):
+async def get_tipo_cliente(tipo_cliente_id: int, db: ReadSession = Depends(get_read_db)):
 
     try:
-        query = select(Tipo_Cliente).where(Tipo_Cliente.id == tipo_cliente_id)
-        result = await db.execute(query)
-        tipo_cliente = result.scalar_one_or_none()
+        query = cached("tipo_cliente.get", lambda: by_id(select_out(Tipo_Cliente, TipoClienteOut), Tipo_Cliente))
+        tipo_cliente = await fetch_one(db, query, {"id": tipo_cliente_id})
 
         if not tipo_cliente:
             raise HTTPException(
@@ -68,6 +75,8 @@ async def get_tipo_cliente(tipo_cliente_id: int, db: AsyncSession = Depends(get_
             )
         
         return tipo_cliente
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error al obtener tipo de cliente: {e}")
         raise HTTPException(
@@ -112,6 +121,7 @@ async def update_tipo_cliente(tipo_cliente_id: int, tipo_cliente_update: TipoCli
 
         db.add(tipo_cliente)
         await db.commit()
+        catalogs.invalidate("tipo_cliente")
         await db.refresh(tipo_cliente)
         return tipo_cliente
     
@@ -141,6 +151,7 @@ async def delete_tipo_cliente(tipo_cliente_id: int, db: AsyncSession = Depends(g
         
         await db.delete(tipo_cliente)
         await db.commit()
+        catalogs.invalidate("tipo_cliente")
         return {"detail": "Tipo de cliente eliminado exitosamente"}
     
     except HTTPException:
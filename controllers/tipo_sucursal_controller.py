@@ -1,7 +1,12 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from database.database import get_db
+from database.database import get_db, ReadSession, get_read_db
+from database.batching import batch_routes
+from database.bulk import bulk_route
+from database.catalog_cache import catalogs
+from database.concurrency import reject_nulls
+from database.read_queries import cached, select_out, by_id, fetch_all, fetch_one
 from models.tipo_sucursal_model import TipoSucursalOut, tipoSucursal, tipoSucursalCreate, tipoSucursalUpdate
 
 router = APIRouter(prefix="/tipo_sucursal", tags=["Tipo_Sucursal"])
@@ -25,6 +30,7 @@ async def create_tipo_sucursal(tipo_sucursal: tipoSucursalCreate, db: AsyncSessi
 
         db.add(new_tipo)
         await db.commit()
+        catalogs.invalidate("tipo_sucursal")
         await db.refresh(new_tipo)
         return new_tipo
     
@@ -38,13 +44,14 @@ async def create_tipo_sucursal(tipo_sucursal: tipoSucursalCreate, db: AsyncSessi
             detail="Error interno del servidor"
         )
     
+bulk_route(router, tipoSucursal, tipoSucursalCreate, "tipo", "tipos de sucursal", "tipo_sucursal")
+
 @router.get("/all", response_model=list[TipoSucursalOut])
-async def get_all_tipos(db: AsyncSession = Depends(get_db)):
+async def get_all_tipos(db: ReadSession = Depends(get_read_db)):
 
     try:
-        query = select(tipoSucursal)
-        result = await db.execute(query)
-        tipos = result.scalars().all()
+        query = cached("tipo_sucursal.all", lambda: select_out(tipoSucursal, TipoSucursalOut))
+        tipos = await fetch_all(db, query)
         return tipos
     
     except Exception as e:
@@ -54,13 +61,14 @@ async def get_all_tipos(db: AsyncSession = Depends(get_db)):
             detail="Error interno del servidor"
         )
     
+batch_routes(router, tipoSucursal, TipoSucursalOut, "tipos de sucursal")
+
 @router.get("/{tipo_id}", response_model=TipoSucursalOut)
-async def get_tipo_sucursal(tipo_id: int, db: AsyncSession = Depends(get_db)):
+async def get_tipo_sucursal(tipo_id: int, db: ReadSession = Depends(get_read_db)):
 
     try:
-        query = select(tipoSucursal).where(tipoSucursal.id == tipo_id)
-        result = await db.execute(query)
-        tipo = result.scalar_one_or_none()
+        query = cached("tipo_sucursal.get", lambda: by_id(select_out(tipoSucursal, TipoSucursalOut), tipoSucursal))
+        tipo = await fetch_one(db, query, {"id": tipo_id})
 
         if not tipo:
             raise HTTPException(
@@ -100,6 +108,8 @@ async def update_tipo_sucursal(tipo_id: int, updates: tipoSucursalUpdate, db: As
                 status_code=400,
                 detail="No se han proporcionado datos por actualizar"
             )
+
+        reject_nulls(tipoSucursal, update_data)
         
         if "tipo" in update_data:
             tipo_query = select(tipoSucursal).where(
@@ -117,6 +127,7 @@ async def update_tipo_sucursal(tipo_id: int, updates: tipoSucursalUpdate, db: As
             setattr(existing_tipo, key, value)
 
         await db.commit()
+        catalogs.invalidate("tipo_sucursal")
         await db.refresh(existing_tipo)
         return existing_tipo
     
@@ -146,6 +157,7 @@ async def delete_tipo_sucursal(tipo_id: int, db: AsyncSession = Depends(get_db))
         
         await db.delete(existing_tipo)
         await db.commit()
+        catalogs.invalidate("tipo_sucursal")
         return {"detail": "Tipo de sucursal eliminado correctamente"}
     
     except HTTPException:
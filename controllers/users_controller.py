@@ -1,23 +1,98 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from database.database import get_db
-from passlib.context import CryptContext
-from models.users_model import User, UserSignUp, UserUpdate, UserOut
+from sqlalchemy import bindparam, select
+from database.database import get_db, get_bulk_db, ReadSession, get_bulk_read_db, get_read_db
+from database.batching import parse_list_param, load_by_ids, batch_routes
+from database.read_queries import cached, hot, select_out, by_id, fetch_all
+from database.catalog_cache import catalogs
+from database.concurrency import parse_if_match, reject_nulls, update_versioned
+from models.users_model import User, UserSignUp, UserLogin, UserUpdate, UserOut
 from sqlalchemy import any_
 from models.sucursales_model import Sucursal, SucursalCreate, SucursalUpdate, SucursalOut
 from models.user_roles_model import UserRole, UserRoleCreate, UserRoleOut
+from services.passwords import hash_many, verify
+from middleware.auth import Principal, acces_token, get_principal, grants_global, require_global, require_sucursal, batch_scope, scope_clause, scope_conditions, token_claims
+from services.users_provision import ProvisioningError, provision_users
 
 router = APIRouter(prefix="/users", tags=["Users"])
+# Rutas sin token (login); main.py protege router y deja este abierto
+auth_router = APIRouter(prefix="/users", tags=["Users"])
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+EXPAND_USER = {"sucursal", "sucursales", "roles"}
 
-def hash_password(password: str) -> str:
-    password = password[:72]  # bcrypt tiene límite de 72 bytes
-    return pwd_context.hash(password)
+USER_GET = hot(cached("users.get", lambda: by_id(select_out(User, UserOut), User)), {"id": 0})
 
-@router.post("/signup", response_model=UserOut)
-async def user_signup(user: UserSignUp, db: AsyncSession = Depends(get_db)):
+async def check_assignment(principal: Principal, user: UserSignUp | UserUpdate):
+    # Solo se asignan sucursales dentro del alcance de quien hace el cambio, y
+    # un rol con acceso global solo lo asigna quien ya lo tiene
+    require_sucursal(principal, user.Sucursal)
+    for suc in user.sucursal_acces or []:
+        require_sucursal(principal, suc)
+
+    if user.roles and not principal.global_:
+        if grants_global(await catalogs.get_stale("user_roles"), user.roles):
+            require_global(principal)
+
+@auth_router.post("/login")
+async def user_login(credenciales: UserLogin, db: AsyncSession = Depends(get_db)):
+    tabla = User.__table__
+
+    try:
+        query = select(
+            tabla.c.id, tabla.c.usuario, tabla.c.email, tabla.c.Sucursal,
+            tabla.c.sucursal_acces, tabla.c.roles, tabla.c.hashed_password
+        ).where(tabla.c.usuario == credenciales.usuario)
+        user = (await db.execute(query)).first()
+
+        valido = (
+            user is not None
+            and user.email.lower() == credenciales.email.lower()
+            and await verify(credenciales.password, user.hashed_password)
+        )
+
+        if not valido:
+            raise HTTPException(
+                status_code=401,
+                detail="Usuario o contraseña incorrectos"
+            )
+
+        return {"access_token": acces_token(token_claims(user)), "token_type": "bearer"}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error al iniciar sesión: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error interno del servidor"
+        )
+
+async def expand_users(db: AsyncSession, rows: list[dict], expand: set[str]) -> list[dict]:
+    # sucursal principal y sucursales de acceso comparten una sola consulta
+    if "sucursal" in expand or "sucursales" in expand:
+        ids = set()
+        for r in rows:
+            ids.add(r["Sucursal"])
+            if "sucursales" in expand:
+                ids.update(r["sucursal_acces"] or [])
+        sucursales = await load_by_ids(db, Sucursal, SucursalOut, ids)
+
+        for r in rows:
+            if "sucursal" in expand:
+                r["sucursal_detalle"] = sucursales.get(r["Sucursal"])
+            if "sucursales" in expand:
+                r["sucursales"] = [sucursales[i] for i in r["sucursal_acces"] or [] if i in sucursales]
+
+    if "roles" in expand:
+        roles = await catalogs.get("user_roles")
+        for r in rows:
+            r["roles_detalle"] = [roles[i] for i in r["roles"] or [] if i in roles]
+
+    return rows
+
+@router.post("/signup", response_model=UserOut, response_model_exclude_unset=True)
+async def user_signup(user: UserSignUp, db: AsyncSession = Depends(get_db), principal: Principal = Depends(get_principal)):
+    await check_assignment(principal, user)
 
     try:
         # Verificar si el usuario ya existe
@@ -94,7 +169,7 @@ async def user_signup(user: UserSignUp, db: AsyncSession = Depends(get_db)):
             Sucursal = user.Sucursal,
             sucursal_acces = user.sucursal_acces,
             roles = user.roles,
-            hashed_password = hash_password(user.password)
+            hashed_password = (await hash_many([user.password]))[0]
         )
 
         db.add(new_user)
@@ -112,39 +187,85 @@ async def user_signup(user: UserSignUp, db: AsyncSession = Depends(get_db)):
             detail="Error interno del servidor"
         )
     
-@router.get("/all", response_model=list[UserOut])
+@router.post("/signup/bulk", response_model=list[UserOut], response_model_exclude_unset=True)
+async def user_signup_bulk(users: list[UserSignUp], db: AsyncSession = Depends(get_bulk_db), principal: Principal = Depends(get_principal)):
+
+    if not users:
+        raise HTTPException(
+            status_code=400,
+            detail="Debe proporcionar al menos un usuario"
+        )
+
+    for user in users:
+        await check_assignment(principal, user)
+
+    try:
+        return await provision_users(db, users)
+
+    except ProvisioningError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=e.errores
+        )
+    except Exception as e:
+        await db.rollback()
+        print(f"Error al crear usuarios: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Error interno del servidor"
+        )
+    
+def select_users(por_usuario: bool, por_sucursal: bool, por_rol: bool, con_alcance: bool):
+    tabla = User.__table__
+    query = select_out(User, UserOut)
+
+    if con_alcance:
+        # Usuarios cuya sucursal principal está en el alcance de quien consulta
+        query = query.where(scope_clause(tabla.c.Sucursal))
+    
+    # Aplicar filtros opcionales
+    if por_usuario:
+        query = query.where(
+            (tabla.c.usuario.ilike(bindparam("patron"))) | 
+            (tabla.c.nombres.ilike(bindparam("patron"))) |
+            (tabla.c.apellidos.ilike(bindparam("patron")))
+        )
+    
+    if por_sucursal:
+        # Filtrar usuarios que tengan acceso a esta sucursal
+        query = query.where(bindparam("sucursal_id") == any_(tabla.c.sucursal_acces))
+    
+    if por_rol:
+        # Filtrar usuarios que tengan este rol
+        query = query.where(bindparam("rol_id") == any_(tabla.c.roles))
+
+    return query
+
+@router.get("/all", response_model=list[UserOut], response_model_exclude_unset=True)
 async def get_all_users(
     usuario: str | None = None,
     sucursal_id: int | None = None,
     rol_id: int | None = None,
     activos: bool | None = None,
-    db: AsyncSession = Depends(get_db)
+    expand: str | None = None,
+    db: ReadSession = Depends(get_bulk_read_db),
+    principal: Principal = Depends(get_principal)
 ):
+    expand = parse_list_param(expand, EXPAND_USER, "expand")
+    con_alcance = not principal.global_
+
     try:
-        query = select(User)
-        
-        # Aplicar filtros opcionales
-        if usuario:
-            query = query.where(
-                (User.usuario.ilike(f"%{usuario}%")) | 
-                (User.nombres.ilike(f"%{usuario}%")) |
-                (User.apellidos.ilike(f"%{usuario}%"))
-            )
-        
-        if sucursal_id:
-            # Filtrar usuarios que tengan acceso a esta sucursal
-            query = query.where(sucursal_id == any_(User.sucursal_acces))
-        
-        if rol_id:
-            # Filtrar usuarios que tengan este rol
-            query = query.where(rol_id == any_(User.roles))
+        query = cached(("users.all", bool(usuario), bool(sucursal_id), bool(rol_id), con_alcance),
+                       lambda: select_users(bool(usuario), bool(sucursal_id), bool(rol_id), con_alcance))
+        params = {"patron": f"%{usuario}%", "sucursal_id": sucursal_id, "rol_id": rol_id}
+        if con_alcance:
+            params.update(principal.scope_params())
         
         # Para filtrar activos necesitarías un campo is_active en el modelo
         # o hacer join con user_roles para verificar si tienen roles activos
         
-        result = await db.execute(query)
-        users = result.scalars().all()
-        return users
+        rows = await fetch_all(db, query, params)
+        return await expand_users(db, rows, expand)
     
     except Exception as e:
         print(f"Error al obtener usuarios: {e}")
@@ -153,22 +274,25 @@ async def get_all_users(
             detail="Error interno del servidor"
         )
     
-@router.get("/{user_id}", response_model=UserOut)
-async def get_user(user_id: int, db: AsyncSession = Depends(get_db)):
+batch_routes(router, User, UserOut, "usuarios", alcance=batch_scope("sucursal", scope_clause(User.__table__.c.Sucursal)), response_model_exclude_unset=True)
+
+@router.get("/{user_id}", response_model=UserOut, response_model_exclude_unset=True)
+async def get_user(user_id: int, expand: str | None = None, db: ReadSession = Depends(get_read_db), principal: Principal = Depends(get_principal)):
+    expand = parse_list_param(expand, EXPAND_USER, "expand")
 
     try:
-        query = select(User).where(User.id == user_id)
-        result = await db.execute(query)
-        user_result = result.scalar_one_or_none()
+        rows = await fetch_all(db, USER_GET, {"id": user_id})
 
-        if not user_result:
+        if not rows or not principal.can_access(rows[0]["Sucursal"]):
             raise HTTPException(
                 status_code = 404,
                 detail = "Usuario no encontrado o inexistente"
             )
         
-        return user_result
+        return (await expand_users(db, rows, expand))[0]
     
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error al obtener usuario: {e}")
         raise HTTPException(
@@ -176,27 +300,28 @@ async def get_user(user_id: int, db: AsyncSession = Depends(get_db)):
             detail="Error interno del servidor"
         )
     
-@router.post("/update/{user_id}", response_model=UserOut)
-async def update_user(user_id: int, user_update: UserUpdate, db: AsyncSession = Depends(get_db)):
+@router.post("/update/{user_id}", response_model=UserOut, response_model_exclude_unset=True)
+async def update_user(
+    user_id: int,
+    user_update: UserUpdate,
+    response: Response,
+    if_match: str | None = Header(default=None),
+    db: AsyncSession = Depends(get_db),
+    principal: Principal = Depends(get_principal)
+):
+    version = parse_if_match(if_match)
+    await check_assignment(principal, user_update)
 
     try:
-        query = select(User).where(User.id == user_id)
-        result = await db.execute(query)
-        user_result = result.scalar_one_or_none()
-
-        if not user_result:
-            raise HTTPException(
-                status_code = 404,
-                detail = "Usuario no encontrado o inexistente"
-            )
-        
-        update_data = user_update.dict(exclude_unset=True)
+        update_data = user_update.model_dump(exclude_unset=True)
 
         if not update_data:
             raise HTTPException(
                 status_code=400,
                 detail="No se proporcionaron datos para actualizar"
             )
+
+        reject_nulls(User, update_data)
         
         existing_user_query = select(User).where(User.usuario == update_data.get("usuario"), User.id != user_id)
         existing_user_result = await db.execute(existing_user_query)
@@ -218,16 +343,15 @@ async def update_user(user_id: int, user_update: UserUpdate, db: AsyncSession =
                 detail="Este correo electrónico ya está en uso"
             )
 
-        for key, value in update_data.items():
-            if key == "password":
-                setattr(user_result, "hashed_password", hash_password(value))
-            else:
-                setattr(user_result, key, value)
+        if "password" in update_data:
+            update_data["hashed_password"] = (await hash_many([update_data.pop("password")]))[0]
 
-        db.add(user_result)
-        await db.commit()
-        await db.refresh(user_result)
-        return user_result
+        user = await update_versioned(
+            db, User, UserOut, user_id, update_data, version, "Usuario no encontrado o inexistente",
+            scope_conditions(principal, User.__table__.c.Sucursal)
+        )
+        response.headers["ETag"] = f'"{user["version"]}"'
+        return user
     except HTTPException:
         raise
     except Exception as e:
@@ -239,10 +363,10 @@ async def update_user(user_id: int, user_update: UserUpdate, db: AsyncSession =
         )
     
 @router.delete("/delete/{user_id}")
-async def delete_user(user_id: int, db: AsyncSession = Depends(get_db)):
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_db), principal: Principal = Depends(get_principal)):
 
     try:
-        queey = select(User).where(User.id == user_id)
+        queey = select(User).where(User.id == user_id, *scope_conditions(principal, User.__table__.c.Sucursal))
         result = await db.execute(queey)
         user_result = result.scalar_one_or_none()
 
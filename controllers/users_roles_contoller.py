@@ -1,13 +1,21 @@
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from database.database import get_db
+from database.database import get_db, ReadSession, get_read_db
+from database.batching import batch_routes
+from database.bulk import bulk_route
+from database.catalog_cache import catalogs
+from database.concurrency import reject_nulls
+from database.read_queries import cached, select_out, by_id, fetch_all, fetch_one
 from models.user_roles_model import UserRole, UserRoleCreate, UserRoleOut
+from middleware.auth import Principal, get_principal, global_principal, require_global
 
 router = APIRouter(prefix="/users_roles", tags=["Users_Roles"])
 
 @router.post("/create", response_model=UserRoleOut)
-async def create_user_role(user_role: UserRoleCreate, db: AsyncSession = Depends(get_db)):
+async def create_user_role(user_role: UserRoleCreate, db: AsyncSession = Depends(get_db), principal: Principal = Depends(get_principal)):
+    # Los roles deciden el acceso global: solo los administra quien ya lo tiene
+    require_global(principal)
 
     try:
         query = select(UserRole).where(UserRole.rol == user_role.rol)
@@ -26,6 +34,7 @@ async def create_user_role(user_role: UserRoleCreate, db: AsyncSession = Depends
 
         db.add(new_role)
         await db.commit()
+        catalogs.invalidate("user_roles")
         await db.refresh(new_role)
         return new_role
     except HTTPException:
@@ -38,13 +47,14 @@ async def create_user_role(user_role: UserRoleCreate, db: AsyncSession = Depends
             detail="Error interno del servidor"
         )
     
+bulk_route(router, UserRole, UserRoleCreate, "rol", "roles de usuario", "user_roles", dependencies=[Depends(global_principal)])
+
 @router.get("/all", response_model=list[UserRoleOut])
-async def get_all_user_roles(db: AsyncSession = Depends(get_db)):
+async def get_all_user_roles(db: ReadSession = Depends(get_read_db)):
 
     try:
-        query = select(UserRole)
-        result = await db.execute(query)
-        roles = result.scalars().all()
+        query = cached("users_roles.all", lambda: select_out(UserRole, UserRoleOut))
+        roles = await fetch_all(db, query)
         return roles
     
     except Exception as e:
@@ -54,13 +64,14 @@ async def get_all_user_roles(db: AsyncSession = Depends(get_db)):
             detail="Error interno del servidor"
         )
     
+batch_routes(router, UserRole, UserRoleOut, "roles de usuario")
+
 @router.get("/{role_id}", response_model=UserRoleOut)
-async def get_user_role(role_id: int, db: AsyncSession = Depends(get_db)):
+async def get_user_role(role_id: int, db: ReadSession = Depends(get_read_db)):
 
     try:
-        query = select(UserRole).where(UserRole.id == role_id)
-        result = await db.execute(query)
-        role = result.scalar_one_or_none()
+        query = cached("users_roles.get", lambda: by_id(select_out(UserRole, UserRoleOut), UserRole))
+        role = await fetch_one(db, query, {"id": role_id})
         
         if not role:
             raise HTTPException(
@@ -70,6 +81,8 @@ async def get_user_role(role_id: int, db: AsyncSession = Depends(get_db)):
 
         return role
     
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error al obtener rol de usuario: {e}")
         raise HTTPException(
@@ -78,7 +91,8 @@ async def get_user_role(role_id: int, db: AsyncSession = Depends(get_db)):
         )
     
 @router.post("/update/{role_id}", response_model=UserRoleOut)
-async def update_user_role(role_id: int, role_update: UserRoleCreate, db: AsyncSession = Depends(get_db)):
+async def update_user_role(role_id: int, role_update: UserRoleCreate, db: AsyncSession = Depends(get_db), principal: Principal = Depends(get_principal)):
+    require_global(principal)
 
     try:
         query = select(UserRole).where(UserRole.id == role_id)
@@ -98,6 +112,8 @@ async def update_user_role(role_id: int, role_update: UserRoleCreate, db: AsyncS
                 status_code = 400,
                 detail = "No se han proporcionado datos por actualizar"
             )
+
+        reject_nulls(UserRole, update_data)
         
         if "rol" in update_data:
             rol_query = select(UserRole).where(
@@ -117,6 +133,7 @@ async def update_user_role(role_id: int, role_update: UserRoleCreate, db: AsyncS
             setattr(existing_role, key, value)
 
         await db.commit()
+        catalogs.invalidate("user_roles")
         await db.refresh(existing_role)
         return existing_role
     
@@ -131,7 +148,8 @@ async def update_user_role(role_id: int, role_update: UserRoleCreate, db: AsyncS
         )
     
 @router.delete("/delete/{role_id}")
-async def delete_user_role(role_id: int, db: AsyncSession = Depends(get_db)):
+async def delete_user_role(role_id: int, db: AsyncSession = Depends(get_db), principal: Principal = Depends(get_principal)):
+    require_global(principal)
 
     try:
         query = select(UserRole).where(UserRole.id == role_id)
@@ -146,6 +164,7 @@ async def delete_user_role(role_id: int, db: AsyncSession = Depends(get_db)):
         
         await db.delete(existing_role)
         await db.commit()
+        catalogs.invalidate("user_roles")
         return {"detail": "Rol de usuario eliminado correctamente"}
     
     except HTTPException:
@@ -0,0 +1,143 @@
+from typing import Generic, TypeVar
+from fastapi import Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import ARRAY, Integer, any_, bindparam
+from database.database import ReadSession, get_read_db
+from database.read_queries import cached, select_out, fetch_all
+
+# Límite de IDs por petición de /batch; más allá conviene paginar
+MAX_BATCH_IDS = 1000
+
+T = TypeVar("T")
+
+
+class BatchIds(BaseModel):
+    ids: list[int]
+
+
+class BatchResult(BaseModel, Generic[T]):
+    resultados: list[T]
+    faltantes: list[int]
+
+
+def parse_list_param(value: str | None, permitidos, nombre: str) -> set[str]:
+    # "a, b,c" -> {"a", "b", "c"}; rechaza valores que el recurso no soporta
+    if not value:
+        return set()
+
+    valores = {v.strip() for v in value.split(",") if v.strip()}
+    invalidos = valores - set(permitidos)
+
+    if invalidos:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Valores no válidos para '{nombre}': {', '.join(sorted(invalidos))}. "
+                   f"Permitidos: {', '.join(sorted(permitidos))}"
+        )
+
+    return valores
+
+
+def ids_param(ids, tipo=Integer):
+    # Un solo parámetro de tipo arreglo: "= ANY($1)" en lugar de un IN con N parámetros
+    return any_(bindparam(None, list(ids), type_=ARRAY(tipo)))
+
+
+async def load_by_ids(db, model, schema, ids) -> dict[int, dict]:
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return {}
+
+    query = select_out(model, schema).where(model.__table__.c.id == ids_param(ids))
+    result = await db.execute(query)
+    return {r["id"]: dict(r) for r in result.mappings().all()}
+
+
+async def load_grouped(db, model, schema, column, values) -> dict[int, list[dict]]:
+    values = {v for v in values if v is not None}
+    if not values:
+        return {}
+
+    tabla = model.__table__
+    query = select_out(model, schema, set(schema.model_fields) | {column.key})
+    result = await db.execute(query.where(tabla.c[column.key] == ids_param(values)).order_by(tabla.c.id))
+    grouped = {}
+    for r in result.mappings().all():
+        grouped.setdefault(r[column.key], []).append(dict(r))
+    return grouped
+
+
+def parse_ids(value: str | None) -> list[int]:
+    # "3,1,2" -> [3, 1, 2]; conserva el orden pedido
+    try:
+        return [int(v) for v in (value or "").split(",") if v.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="'ids' debe ser una lista de enteros separados por comas"
+        )
+
+
+async def batch_by_ids(db, model, schema, ids: list[int], alcance=None) -> dict:
+    # Un solo "WHERE id = ANY($1)"; la respuesta sigue el orden de la petición
+    # (sin repetidos) y lista aparte los IDs que no existen. alcance:
+    # (nombre, condición, parámetros) de middleware.auth.batch_scope; lo que
+    # queda fuera se reporta como faltante
+    ids = list(dict.fromkeys(ids))
+
+    if not ids:
+        raise HTTPException(status_code=400, detail="Debe proporcionar al menos un ID")
+
+    if len(ids) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Se permiten hasta {MAX_BATCH_IDS} IDs por petición"
+        )
+
+    tabla = model.__table__
+    nombre, condicion, params = alcance or (None, None, {})
+
+    def build():
+        query = select_out(model, schema).where(tabla.c.id == any_(bindparam("ids", type_=ARRAY(Integer))))
+        return query if condicion is None else query.where(condicion)
+
+    query = cached((tabla.name, "batch", nombre), build)
+    encontrados = {r["id"]: r for r in await fetch_all(db, query, {"ids": ids, **params})}
+
+    return {
+        "resultados": [encontrados[i] for i in ids if i in encontrados],
+        "faltantes": [i for i in ids if i not in encontrados],
+    }
+
+
+def _sin_alcance():
+    return None
+
+
+def batch_routes(router, model, schema, nombre: str, alcance=_sin_alcance, **opciones):
+    # GET /batch?ids=1,2,3 y POST /batch {"ids": [...]} (para listas que no
+    # caben en la URL), ambos de solo lectura. alcance: dependencia que da el
+    # alcance del usuario (middleware.auth.batch_scope). Deben registrarse
+    # antes de GET /{id}
+    async def get_batch(ids: str, db: ReadSession = Depends(get_read_db), filtro=Depends(alcance)):
+        return await _batch(db, parse_ids(ids), filtro)
+
+    async def post_batch(peticion: BatchIds, db: ReadSession = Depends(get_read_db), filtro=Depends(alcance)):
+        return await _batch(db, peticion.ids, filtro)
+
+    async def _batch(db, ids: list[int], filtro):
+        try:
+            return await batch_by_ids(db, model, schema, ids, filtro)
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            print(f"Error al obtener {nombre} por lote: {e}")
+            raise HTTPException(
+                status_code=500,
+                detail="Error interno del servidor"
+            )
+
+    tabla = model.__tablename__
+    router.add_api_route("/batch", get_batch, methods=["GET"], response_model=BatchResult[schema], name=f"get_{tabla}_batch", **opciones)
+    router.add_api_route("/batch", post_batch, methods=["POST"], response_model=BatchResult[schema], name=f"post_{tabla}_batch", **opciones)
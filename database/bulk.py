@@ -0,0 +1,164 @@
+from typing import Any, Literal
+from fastapi import Depends, HTTPException
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import Boolean, func, literal_column, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.batching import ids_param
+from database.catalog_cache import catalogs
+from database.database import get_bulk_db
+
+OnConflict = Literal["skip", "update"]
+
+# asyncpg admite hasta 32767 parámetros por sentencia
+MAX_PARAMS = 30000
+
+CREADO = literal_column("xmax = 0", Boolean).label("creado")
+
+
+def insert_values(model, items) -> list[dict]:
+    # Los INSERT multi-fila necesitan las mismas llaves en todas las filas: los
+    # None de columnas NOT NULL toman el default escalar del modelo
+    tabla = model.__table__
+    filas = []
+    for item in items:
+        fila = item.model_dump()
+        for nombre, valor in fila.items():
+            columna = tabla.c[nombre]
+            if valor is None and not columna.nullable and columna.default is not None:
+                fila[nombre] = columna.default.arg
+        filas.append(fila)
+    return filas
+
+
+async def bulk_upsert(db, model, key: str, items, on_conflict: OnConflict = "skip") -> dict:
+    # Un INSERT ... ON CONFLICT por bloque sobre la llave natural (índice único).
+    #   skip:   las filas existentes no se tocan
+    #   update: las filas existentes reciben los valores enviados
+    tabla = model.__table__
+    columna = tabla.c[key]
+
+    # Si la llave se repite en el arreglo cuenta una vez (DO UPDATE no puede
+    # tocar la misma fila dos veces en una sentencia); en update gana la última
+    unicas: dict = {}
+    for fila in insert_values(model, items):
+        if on_conflict == "update" or fila[key] not in unicas:
+            unicas[fila[key]] = fila
+    filas = list(unicas.values())
+
+    ids: dict = {}
+    creados: set = set()
+    por_bloque = max(1, MAX_PARAMS // max(1, len(tabla.c)))
+
+    for inicio in range(0, len(filas), por_bloque):
+        bloque = filas[inicio:inicio + por_bloque]
+        query = insert(tabla).values(bloque)
+
+        if on_conflict == "update":
+            excluded = query.excluded
+            cambios = {c: excluded[c] for c in bloque[0] if c != key} or {key: excluded[key]}
+            query = query.on_conflict_do_update(index_elements=[columna], set_=cambios)
+        else:
+            query = query.on_conflict_do_nothing(index_elements=[columna])
+
+        # xmax = 0 solo en filas recién insertadas; las actualizadas traen el xid
+        query = query.returning(tabla.c.id, columna, CREADO)
+
+        result = await db.execute(query)
+        for id_, valor, creado in result.all():
+            ids[valor] = id_
+            if creado:
+                creados.add(valor)
+
+        # skip no devuelve las filas que ya existían: solo entonces se consultan
+        faltantes = [f[key] for f in bloque if f[key] not in ids]
+        if faltantes:
+            result = await db.execute(select(tabla.c.id, columna).where(columna == ids_param(faltantes, columna.type)))
+            for id_, valor in result.all():
+                ids[valor] = id_
+
+    await db.commit()
+
+    return {
+        "creados": [ids[v] for v in unicas if v in creados],
+        "existentes": [ids[v] for v in unicas if v not in creados and v in ids],
+    }
+
+
+def bulk_route(router, model, schema, key: str, nombre: str, catalogo: str | None = None, dependencies=None):
+    # POST /bulk de un catálogo: un INSERT ... ON CONFLICT (key) para todo el
+    # arreglo. catalogo: entrada de la cache de catálogos que se invalida
+    async def bulk(items: list[schema], on_conflict: OnConflict = "skip", db: AsyncSession = Depends(get_bulk_db)):
+        try:
+            resultado = await bulk_upsert(db, model, key, items, on_conflict)
+            if catalogo is not None:
+                catalogs.invalidate(catalogo)
+            return resultado
+
+        except Exception as e:
+            await db.rollback()
+            print(f"Error al cargar {nombre}: {e}")
+            raise HTTPException(
+                status_code=500,
+                detail="Error interno del servidor"
+            )
+
+    router.add_api_route("/bulk", bulk, methods=["POST"], dependencies=dependencies, name=f"bulk_{model.__tablename__}")
+
+
+class BulkFilter(BaseModel):
+    # Filas a modificar: lista de IDs y/o igualdad sobre campos del recurso
+    ids: list[int] | None = None
+    campos: dict[str, Any] = {}
+
+
+def filter_conditions(model, schema, filtro: BulkFilter) -> list:
+    # Los predicados se validan con el esquema Update del recurso para que
+    # lleguen a la base con el tipo de la columna
+    tabla = model.__table__
+    condiciones = []
+
+    if filtro.ids is not None:
+        condiciones.append(tabla.c.id == ids_param(filtro.ids))
+
+    invalidos = set(filtro.campos) - set(schema.model_fields)
+    if invalidos:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Campos no válidos en el filtro: {', '.join(sorted(invalidos))}"
+        )
+
+    try:
+        valores = schema.model_validate(filtro.campos).model_dump(include=set(filtro.campos))
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Filtro inválido: {e.errors()[0]['msg']}")
+
+    for nombre, valor in valores.items():
+        columna = tabla.c[nombre]
+        condiciones.append(columna.is_(None) if valor is None else columna == valor)
+
+    if not condiciones:
+        # Sin filtro el UPDATE tocaría toda la tabla
+        raise HTTPException(
+            status_code=400,
+            detail="Debe proporcionar un filtro (ids o campos)"
+        )
+
+    return condiciones
+
+
+async def bulk_update(db, model, condiciones: list, cambios: dict, dry_run: bool = False) -> dict:
+    # Un solo UPDATE ... WHERE; en dry_run solo se cuenta lo que se tocaría
+    tabla = model.__table__
+
+    if dry_run:
+        result = await db.execute(select(func.count()).select_from(tabla).where(*condiciones))
+        return {"afectados": result.scalar_one(), "dry_run": True}
+
+    if "version" in tabla.c:
+        # Las ediciones en curso sobre estas filas deben ver el cambio (If-Match)
+        cambios = {**cambios, "version": tabla.c.version + 1}
+
+    result = await db.execute(update(tabla).where(*condiciones).values(**cambios))
+    await db.commit()
+    return {"afectados": result.rowcount, "dry_run": False}
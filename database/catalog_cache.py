@@ -0,0 +1,90 @@
+import asyncio
+import time
+from database.database import settings
+from database.read_queries import cached, select_out, fetch_all
+from database.singleflight import reads
+from models.tipo_cliente_model import Tipo_Cliente, TipoClienteOut
+from models.tipo_sucursal_model import tipoSucursal, TipoSucursalOut
+from models.estado_sucursal_model import Estado_Sucursal, EstadoSucursalOut
+from models.user_roles_model import UserRole, UserRoleOut
+
+
+class CatalogCache:
+    # Catálogos pequeños y de lectura frecuente, en memoria por proceso.
+    # Se invalidan al escribir localmente y expiran por TTL para ver los
+    # cambios hechos por otros workers.
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._catalogos: dict[str, tuple] = {}
+        self._datos: dict[str, dict[int, dict]] = {}
+        self._cargado: dict[str, float] = {}
+        self._recargas: dict[str, asyncio.Task] = {}
+
+    def register(self, nombre: str, model, schema):
+        self._catalogos[nombre] = (model, schema)
+
+    def _fresh(self, nombre: str) -> bool:
+        cargado = self._cargado.get(nombre)
+        return cargado is not None and time.monotonic() - cargado < self.ttl
+
+    async def get(self, nombre: str) -> dict[int, dict]:
+        if self._fresh(nombre):
+            return self._datos[nombre]
+
+        model, schema = self._catalogos[nombre]
+
+        async def loader(session):
+            query = cached(("catalogo", nombre), lambda: select_out(model, schema))
+            return {r["id"]: r for r in await fetch_all(session, query)}
+
+        datos = await reads.do(("catalogo", nombre), loader)
+        self._datos[nombre] = datos
+        self._cargado[nombre] = time.monotonic()
+        return datos
+
+    async def get_stale(self, nombre: str) -> dict[int, dict]:
+        # Para rutas calientes: responde con lo que haya en memoria y, si
+        # expiró, lo recarga en segundo plano sin hacer esperar a la petición.
+        # Tras invalidate() lo que hay en memoria ya se sabe viejo: se espera
+        if nombre not in self._cargado:
+            return await self.get(nombre)
+
+        if not self._fresh(nombre) and nombre not in self._recargas:
+            tarea = asyncio.ensure_future(self.get(nombre))
+            self._recargas[nombre] = tarea
+            tarea.add_done_callback(lambda t, n=nombre: self._reloaded(n, t))
+
+        return self._datos[nombre]
+
+    def _reloaded(self, nombre: str, tarea: asyncio.Task):
+        self._recargas.pop(nombre, None)
+        if not tarea.cancelled() and tarea.exception() is not None:
+            print(f"Error al recargar el catálogo {nombre}: {tarea.exception()}")
+
+    async def load_all(self):
+        for nombre in self._catalogos:
+            await self.get(nombre)
+
+    def invalidate(self, nombre: str):
+        self._cargado.pop(nombre, None)
+
+    def is_warm(self) -> bool:
+        # Cargado al menos una vez; al expirar se recarga en la siguiente lectura
+        return all(nombre in self._datos for nombre in self._catalogos)
+
+    def stats(self) -> dict:
+        return {
+            nombre: {
+                "registros": len(self._datos.get(nombre, {})),
+                "vigente": self._fresh(nombre),
+            }
+            for nombre in self._catalogos
+        }
+
+
+catalogs = CatalogCache(ttl=settings.catalog_cache_ttl)
+catalogs.register("tipo_cliente", Tipo_Cliente, TipoClienteOut)
+catalogs.register("tipo_sucursal", tipoSucursal, TipoSucursalOut)
+catalogs.register("estado_sucursal", Estado_Sucursal, EstadoSucursalOut)
+catalogs.register("user_roles", UserRole, UserRoleOut)
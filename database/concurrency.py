@@ -0,0 +1,58 @@
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from database.read_queries import out_columns
+
+
+def parse_if_match(valor: str | None) -> int | None:
+    # Acepta 3, "3" y W/"3"; sin encabezado la actualización no se condiciona
+    if valor is None:
+        return None
+
+    try:
+        return int(valor.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="If-Match debe contener la versión del registro"
+        )
+
+
+def reject_nulls(model, cambios: dict):
+    # Los esquemas Update son opcionales campo por campo; un null explícito
+    # solo es válido si la columna lo admite (si no, la BD lo rechaza con 500)
+    nulos = [k for k, v in cambios.items() if v is None and k in model.__table__.c and not model.__table__.c[k].nullable]
+
+    if nulos:
+        raise HTTPException(
+            status_code=422,
+            detail=f"No admiten valores nulos: {', '.join(nulos)}"
+        )
+
+
+async def update_versioned(db, model, schema, id_: int, cambios: dict, version: int | None, no_encontrado: str, condiciones=()) -> dict:
+    # Lectura-verificación-escritura en un solo UPDATE condicional: sin
+    # SELECT ... FOR UPDATE y sin cargar la entidad antes. condiciones (p. ej.
+    # el alcance por sucursal) hacen que un registro ajeno cuente como inexistente
+    tabla = model.__table__
+    query = update(tabla).where(tabla.c.id == id_, *condiciones)
+    if version is not None:
+        query = query.where(tabla.c.version == version)
+    query = query.values(**cambios, version=tabla.c.version + 1).returning(*out_columns(model, schema))
+
+    row = (await db.execute(query)).mappings().first()
+
+    if row is None:
+        # Solo en el camino de error se distingue "no existe" de "cambió"
+        actual = (await db.execute(select(tabla.c.version).where(tabla.c.id == id_, *condiciones))).scalar()
+        await db.rollback()
+
+        if actual is None:
+            raise HTTPException(status_code=404, detail=no_encontrado)
+
+        raise HTTPException(
+            status_code=409,
+            detail=f"El registro fue modificado por otro usuario (versión actual {actual}, enviada {version})"
+        )
+
+    await db.commit()
+    return dict(row)
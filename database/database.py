@@ -1,28 +1,183 @@
+from functools import partial
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from pydantic_settings import BaseSettings
+from database.pools import MeteredPool
 
 class Settings (BaseSettings):
     postgres_url: str
+    # Prepared statements que asyncpg conserva por conexión
+    prepared_statement_cache_size: int = 500
+    # Pools separados por clase de tráfico (bulkheads):
+    #   interactive: peticiones de mostrador; espera corta y falla rápido
+    #   bulk:        importaciones, altas masivas y listados completos
+    #   background:  jobs y tareas periódicas (tamaño en jobs_pool_size)
+    # Los statement_timeout van en ms (0 = sin límite)
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 5
+    statement_timeout_ms: int = 30000
+    bulk_pool_size: int = 2
+    bulk_max_overflow: int = 1
+    bulk_pool_timeout: float = 60
+    bulk_statement_timeout_ms: int = 600000
+    jobs_pool_timeout: float = 120
+    jobs_statement_timeout_ms: int = 0
+    # Conexiones que se abren y preparan antes de reportar listo
+    pool_prefill: int = 5
+    catalog_cache_ttl: float = 60
+    # Procesos para hashear contraseñas en altas masivas (0 = uno por núcleo)
+    password_hash_workers: int = 0
+    # /batch: sub-peticiones por llamada y cuántas corren a la vez (cada una usa
+    # su propia conexión, así que debe quedar por debajo de pool_size)
+    batch_max_requests: int = 25
+    batch_concurrency: int = 4
+    # Idempotency-Key: cuánto se conserva una respuesta y cuándo se da por
+    # abandonada una ejecución sin latido (worker caído). Los cuerpos JSON de
+    # hasta idempotency_max_body bytes se retienen para la huella; los demás
+    # (archivos) pasan sin copiarse a memoria
+    idempotency_ttl_hours: float = 24
+    idempotency_lock_timeout: float = 60
+    idempotency_max_body: int = 1024 * 1024
+    # Jobs en segundo plano: workers por proceso (0 = este proceso no ejecuta
+    # jobs, p. ej. si corre python cli.py run-jobs aparte), con su propio pool.
+    # Un job sin latido en jobs_lease_seconds se da por abandonado y se reintenta
+    jobs_concurrency: int = 2
+    jobs_pool_size: int = 4
+    jobs_poll_seconds: float = 1
+    jobs_lease_seconds: float = 60
+    jobs_max_intentos: int = 3
+    # Autorización: auth_required=False deja pasar todo (desarrollo y
+    # benchmarks). Los roles con estos nombres ven todas las sucursales
+    auth_required: bool = True
+    auth_roles_globales: list[str] = ["admin", "administrador"]
+    # Tokens ya verificados que se conservan por proceso
+    auth_token_cache_size: int = 10000
+    # Monitor del event loop: muestrea el retraso cada intervalo y guarda la
+    # pila de lo que lo bloquee más del umbral. loop_strict (pruebas) hace
+    # fallar la petición que bloqueó. sql_echo escribe cada sentencia a
+    # stdout desde el loop: solo para desarrollo
+    loop_monitor_enabled: bool = True
+    loop_monitor_interval_ms: float = 50
+    loop_block_threshold_ms: float = 100
+    loop_strict: bool = False
+    sql_echo: bool = True
+    # Consultas lentas: las que pasan de slow_query_ms se agrupan en
+    # /metrics/slow-queries. A esa fracción de ellas (solo lecturas) se le
+    # saca EXPLAIN ANALYZE, como mucho una vez por consulta cada plan_ttl s
+    slow_query_ms: float = 200
+    slow_query_explain_rate: float = 0.2
+    slow_query_plan_ttl: float = 600
+    slow_query_explain_timeout_ms: int = 10000
 
     class Config:
         env_file = ".env"
 
 settings = Settings()
 
-engine = create_async_engine(
-    settings.postgres_url,
-    echo=True
+def make_engine(nombre: str, pool_size: int, max_overflow: int, pool_timeout: float, statement_timeout_ms: int, **kwargs):
+    return create_async_engine(
+        settings.postgres_url,
+        poolclass=MeteredPool,
+        pool_logging_name=nombre,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        connect_args={
+            "prepared_statement_cache_size": settings.prepared_statement_cache_size,
+            "server_settings": {"statement_timeout": str(statement_timeout_ms)},
+        },
+        **kwargs
+    )
+
+engine = make_engine(
+    "interactive", settings.pool_size, settings.max_overflow,
+    settings.pool_timeout, settings.statement_timeout_ms, echo=settings.sql_echo
+)
+
+bulk_engine = make_engine(
+    "bulk", settings.bulk_pool_size, settings.bulk_max_overflow,
+    settings.bulk_pool_timeout, settings.bulk_statement_timeout_ms
 )
 
+# Un recorrido de minutos no ocupa conexiones de las peticiones HTTP
+jobs_engine = make_engine(
+    "background", settings.jobs_pool_size, 0,
+    settings.jobs_pool_timeout, settings.jobs_statement_timeout_ms
+)
+
+engines = {
+    "interactive": (engine, settings.pool_size + settings.max_overflow),
+    "bulk": (bulk_engine, settings.bulk_pool_size + settings.bulk_max_overflow),
+    "background": (jobs_engine, settings.jobs_pool_size),
+}
+
 SessionLocal = sessionmaker (
     bind = engine,
     class_=AsyncSession,
     expire_on_commit = False
 )
 
+BulkSessionLocal = sessionmaker (
+    bind = bulk_engine,
+    class_=AsyncSession,
+    expire_on_commit = False
+)
+
+JobsSessionLocal = sessionmaker (
+    bind = jobs_engine,
+    class_=AsyncSession,
+    expire_on_commit = False
+)
+
+# Lecturas sin transacción sobre los mismos pools: en AUTOCOMMIT asyncpg no
+# envía BEGIN ni ROLLBACK
+read_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+bulk_read_engine = bulk_engine.execution_options(isolation_level="AUTOCOMMIT")
+
+class ReadSession:
+    # Sesión de solo lectura para las rutas GET. Cada execute() toma una
+    # conexión, trae todas las filas y la devuelve al pool en ese momento, así
+    # que la petición no retiene la conexión mientras arma o serializa la
+    # respuesta. Cada sentencia ve su propio snapshot: si una lectura necesita
+    # varias consultas consistentes entre sí, debe usar get_db.
+
+    def __init__(self, bind):
+        self.bind = bind
+
+    async def execute(self, statement, params=None):
+        if getattr(statement, "is_dml", False):
+            raise TypeError("ReadSession solo ejecuta lecturas")
+
+        async with self.bind.connect() as conn:
+            result = await conn.execute(statement, params)
+            return result.freeze()()
+
+    async def rollback(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+ReadSessionLocal = partial(ReadSession, read_engine)
+BulkReadSessionLocal = partial(ReadSession, bulk_read_engine)
+
 Base = declarative_base()
 
 async def get_db ():
     async with SessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+async def get_bulk_db ():
+    # Rutas de volumen (importaciones, /bulk, listados completos)
+    async with BulkSessionLocal() as session:
+        yield session
+async def get_read_db ():
+    # Rutas GET: sin transacción, conexión solo durante cada sentencia
+    yield ReadSessionLocal()
+
+async def get_bulk_read_db ():
+    yield BulkReadSessionLocal()
@@ -0,0 +1,117 @@
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.schema import CreateColumn
+from database.database import Base
+
+# create_all solo crea tablas nuevas; lo que se agregue después a tablas
+# existentes (índices, columnas) se aplica aquí de forma idempotente.
+
+
+# Funciones usadas por columnas generadas: deben existir antes de create_all.
+# Cambiar su cuerpo no recalcula los valores ya guardados en las columnas
+SQL_FUNCTIONS = (
+    # Tokens en minúsculas, sin acentos ni signos, ordenados: "Pérez-López, Ana"
+    # y "ana lopez perez" dan lo mismo
+    """
+    CREATE OR REPLACE FUNCTION dedup_norm(texto text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT array_to_string(ARRAY(
+            SELECT t FROM regexp_split_to_table(
+                translate(lower(coalesce(texto, '')), 'áàäâãéèëêíìïîóòöôõúùüûñç', 'aaaaaeeeeiiiiooooouuuunc'),
+                '[^a-z0-9]+'
+            ) t
+            WHERE t <> ''
+            ORDER BY t
+        ), ' ')
+    $$
+    """,
+    # Clave fonética para el español: b/v, c/s/z, h muda, ll/y, g/j, letras
+    # dobles. Los tokens se ordenan después de transformarlos
+    r"""
+    CREATE OR REPLACE FUNCTION dedup_fonetica(texto text) RETURNS text
+    LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE AS $$
+    DECLARE
+        x text := dedup_norm(texto);
+    BEGIN
+        x := regexp_replace(x, 'qu', 'k', 'g');
+        x := regexp_replace(x, 'gu([ei])', 'G\1', 'g');
+        x := regexp_replace(x, 'g([ei])', 'j\1', 'g');
+        x := replace(x, 'G', 'g');
+        x := regexp_replace(x, 'c([ei])', 's\1', 'g');
+        x := replace(x, 'ch', 'X');
+        x := replace(x, 'h', '');
+        x := translate(x, 'czvw', 'ksbb');
+        x := replace(x, 'X', 'ch');
+        x := replace(x, 'll', 'y');
+        x := regexp_replace(x, '([aeiou])y\M', '\1i', 'g');
+        x := regexp_replace(x, '([a-z])\1+', '\1', 'g');
+        RETURN dedup_norm(x);
+    END
+    $$
+    """,
+)
+
+
+async def ensure_functions(conn):
+    for sql in SQL_FUNCTIONS:
+        await conn.execute(text(sql))
+
+
+def _ensure_columns(sync_conn):
+    # Solo columnas que se pueden agregar sin reescribir datos: nullable o con
+    # server_default (p. ej. version)
+    inspector = inspect(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        existentes = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existentes:
+                continue
+            if not column.nullable and column.server_default is None:
+                print(f"No se puede agregar {table.name}.{column.name}: NOT NULL sin server_default")
+                continue
+            definicion = CreateColumn(column).compile(dialect=sync_conn.dialect)
+            sync_conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN IF NOT EXISTS {definicion}"))
+
+
+def _check_unique(sync_conn, index):
+    # Un índice único sobre datos repetidos no se puede crear, y sin él los
+    # ON CONFLICT de /bulk fallan en cada petición: mejor no arrancar
+    columnas = list(index.columns)
+    query = select(*columnas, func.count().label("veces"))
+    # Índice parcial: solo cuentan las filas que cubre
+    where = index.dialect_options["postgresql"]["where"]
+    if where is not None:
+        query = query.where(text(where) if isinstance(where, str) else where)
+    query = (
+        query.group_by(*columnas)
+        .having(func.count() > 1)
+        .order_by(func.count().desc())
+        .limit(10)
+    )
+    repetidos = sync_conn.execute(query).all()
+    if repetidos:
+        detalle = "; ".join(f"{tuple(r[:-1])} x{r[-1]}" for r in repetidos)
+        raise RuntimeError(
+            f"No se puede crear el índice único {index.name}: {index.table.name} tiene valores repetidos "
+            f"en ({', '.join(c.name for c in columnas)}): {detalle}. Depure los duplicados y vuelva a arrancar"
+        )
+
+
+def _ensure_indexes(sync_conn):
+    inspector = inspect(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        existentes = {i["name"]: i for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            actual = existentes.get(index.name)
+            if actual is not None and (actual["unique"] or not index.unique):
+                continue
+            if index.unique:
+                _check_unique(sync_conn, index)
+                if actual is not None:
+                    # Versiones anteriores del modelo lo crearon sin unique
+                    sync_conn.execute(text(f'DROP INDEX "{index.name}"'))
+            index.create(sync_conn)
+
+
+async def run_migrations(conn):
+    await conn.run_sync(_ensure_columns)
+    await conn.run_sync(_ensure_indexes)
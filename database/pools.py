@@ -0,0 +1,96 @@
+import time
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Límites superiores (ms) del histograma de espera por conexión
+BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+class PoolMetrics:
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.en_uso_max = 0
+        self.devoluciones = 0
+        self.retencion_total = 0.0
+        self.retencion_max = 0.0
+        self.histograma = [0] * (len(BUCKETS_MS) + 1)
+
+    def observe(self, segundos: float, en_uso: int):
+        self.checkouts += 1
+        self.espera_total += segundos
+        self.espera_max = max(self.espera_max, segundos)
+        self.en_uso_max = max(self.en_uso_max, en_uso)
+        ms = segundos * 1000
+        for i, limite in enumerate(BUCKETS_MS):
+            if ms <= limite:
+                self.histograma[i] += 1
+                break
+        else:
+            self.histograma[-1] += 1
+
+    def observe_return(self, segundos: float):
+        self.devoluciones += 1
+        self.retencion_total += segundos
+        self.retencion_max = max(self.retencion_max, segundos)
+
+
+# Por nombre de pool: dispose() crea una instancia nueva del pool y las
+# métricas deben sobrevivirle
+metrics: dict[str, PoolMetrics] = {}
+
+
+class MeteredPool(AsyncAdaptedQueuePool):
+    # Mide cuánto espera cada checkout (pool lleno o conexión nueva); es la
+    # latencia que una petición paga antes de su primera consulta. También
+    # mide cuánto se retiene cada conexión hasta que vuelve al pool
+
+    def _metricas(self) -> PoolMetrics:
+        return metrics.setdefault(self.logging_name or "default", PoolMetrics())
+
+    def _do_get(self):
+        metricas = self._metricas()
+        inicio = time.perf_counter()
+        try:
+            conexion = super()._do_get()
+        except exc.TimeoutError:
+            metricas.timeouts += 1
+            raise
+        ahora = time.perf_counter()
+        metricas.observe(ahora - inicio, self.checkedout())
+        conexion.info["checkout_at"] = ahora
+        return conexion
+
+    def _do_return_conn(self, record):
+        inicio = record.info.pop("checkout_at", None)
+        if inicio is not None:
+            self._metricas().observe_return(time.perf_counter() - inicio)
+        super()._do_return_conn(record)
+
+
+def pool_stats(nombre: str, engine, capacidad: int) -> dict:
+    pool = engine.pool
+    metricas = metrics.get(nombre, PoolMetrics())
+    en_uso = pool.checkedout()
+    return {
+        "tamano": pool.size(),
+        "capacidad": capacidad,
+        "en_uso": en_uso,
+        "disponibles": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "saturacion": round(en_uso / capacidad, 3) if capacidad else None,
+        "en_uso_max": metricas.en_uso_max,
+        "checkouts": metricas.checkouts,
+        "timeouts": metricas.timeouts,
+        "espera_promedio_ms": round(metricas.espera_total / metricas.checkouts * 1000, 3) if metricas.checkouts else 0,
+        "espera_max_ms": round(metricas.espera_max * 1000, 3),
+        "retencion_promedio_ms": round(metricas.retencion_total / metricas.devoluciones * 1000, 3) if metricas.devoluciones else 0,
+        "retencion_max_ms": round(metricas.retencion_max * 1000, 3),
+        "espera_ms": {
+            **{f"<={limite}": n for limite, n in zip(BUCKETS_MS, metricas.histograma)},
+            f">{BUCKETS_MS[-1]}": metricas.histograma[-1],
+        },
+    }
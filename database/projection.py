@@ -0,0 +1,41 @@
+from functools import lru_cache
+from fastapi import HTTPException, Response
+from pydantic import TypeAdapter, create_model
+
+
+def parse_fields(value: str | None, model, schema) -> frozenset[str] | None:
+    # Solo se pueden pedir columnas reales que también expone el esquema Out
+    if not value:
+        return None
+
+    permitidos = set(schema.model_fields) & set(model.__table__.columns.keys())
+    campos = {f.strip() for f in value.split(",") if f.strip()}
+    invalidos = campos - permitidos
+
+    if invalidos or not campos:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Campos no válidos para 'fields': {', '.join(sorted(invalidos)) or '(vacío)'}. "
+                   f"Permitidos: {', '.join(sorted(permitidos))}"
+        )
+
+    return frozenset(campos)
+
+
+@lru_cache(maxsize=256)
+def _partial_adapter(schema, campos: frozenset[str], many: bool) -> TypeAdapter:
+    definiciones = {
+        name: (info.annotation, info)
+        for name, info in schema.model_fields.items()
+        if name in campos
+    }
+    parcial = create_model(f"{schema.__name__}Parcial", **definiciones)
+    return TypeAdapter(list[parcial] if many else parcial)
+
+
+def render(schema, campos: frozenset[str], data, many: bool = True) -> Response:
+    # Valida contra un esquema recortado (solo los campos pedidos) y serializa
+    # directo a JSON; las columnas auxiliares que no se pidieron se descartan
+    adapter = _partial_adapter(schema, frozenset(campos), many)
+    body = adapter.dump_json(adapter.validate_python(data), exclude_unset=True)
+    return Response(content=body, media_type="application/json")
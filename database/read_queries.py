@@ -0,0 +1,50 @@
+from sqlalchemy import bindparam, select
+
+# Sentencias Core construidas una sola vez por forma de consulta. SQLAlchemy
+# reutiliza el SQL compilado (misma cache key) y asyncpg el prepared statement
+# de cada conexión, así que una lectura repetida solo paga la ejecución.
+_statements: dict = {}
+# Sentencias calientes que el arranque prepara en cada conexión precargada
+_hot: list[tuple] = []
+
+
+def cached(key, factory):
+    stmt = _statements.get(key)
+    if stmt is None:
+        stmt = _statements[key] = factory()
+    return stmt
+
+
+def hot(stmt, params: dict | None = None):
+    _hot.append((stmt, params or {}))
+    return stmt
+
+
+def hot_statements() -> list[tuple]:
+    return list(_hot)
+
+
+def out_columns(model, schema, campos=None) -> list:
+    nombres = schema.model_fields if campos is None else campos
+    return [c for c in model.__table__.columns if c.key in nombres]
+
+
+def select_out(model, schema, campos=None):
+    # Columnas de la tabla, no atributos ORM: el resultado son filas planas
+    # sin identity map ni instrumentación
+    return select(*out_columns(model, schema, campos))
+
+
+def by_id(stmt, model):
+    return stmt.where(model.__table__.c.id == bindparam("id"))
+
+
+async def fetch_all(db, stmt, params: dict | None = None) -> list[dict]:
+    result = await db.execute(stmt, params or {})
+    return [dict(r) for r in result.mappings().all()]
+
+
+async def fetch_one(db, stmt, params: dict | None = None) -> dict | None:
+    result = await db.execute(stmt, params or {})
+    row = result.mappings().first()
+    return dict(row) if row else None
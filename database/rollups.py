@@ -0,0 +1,142 @@
+import asyncio
+from sqlalchemy import text, tuple_
+from database.database import jobs_engine
+from models.stats_model import StatsConteo, StatsDelta
+
+# Conteos que mantienen los triggers, por tabla de origen: (dimensión, valor).
+# Si se cambia esta lista hay que reconstruir: python cli.py rebuild-stats
+DIMENSIONES = {
+    "clientes": (
+        ("clientes.dia", "to_char(created_at, 'YYYY-MM-DD')"),
+        ("clientes.tipocliente", "coalesce(tipocliente::text, '')"),
+        ("clientes.estado", "estado"),
+    ),
+    "pacientes": (
+        ("pacientes.cliente", "coalesce(cliente_id::text, '')"),
+    ),
+    "users": (
+        ("users.sucursal", '"Sucursal"::text'),
+    ),
+}
+
+conteos = StatsConteo.__table__
+deltas = StatsDelta.__table__
+
+
+def _valores(tabla: str) -> str:
+    return ", ".join(f"('{dimension}', {expr})" for dimension, expr in DIMENSIONES[tabla])
+
+
+def _insert_deltas(tabla: str, fuente: str) -> str:
+    # Un INSERT por sentencia (no por fila): una importación de 5000 clientes
+    # deja un delta por día/tipo/estado, no 5000
+    return f"""
+        INSERT INTO {deltas.name} (dimension, valor, delta)
+        SELECT d.dimension, d.valor, sum(f.signo)
+        FROM ({fuente}) f, LATERAL (VALUES {_valores(tabla)}) AS d(dimension, valor)
+        GROUP BY 1, 2
+        HAVING sum(f.signo) <> 0;
+    """
+
+
+def _function_sql(tabla: str) -> str:
+    nuevas = "SELECT 1 AS signo, * FROM nuevas"
+    viejas = "SELECT -1 AS signo, * FROM viejas"
+    return f"""
+        CREATE OR REPLACE FUNCTION stats_{tabla}() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                {_insert_deltas(tabla, nuevas)}
+            ELSIF TG_OP = 'DELETE' THEN
+                {_insert_deltas(tabla, viejas)}
+            ELSE
+                {_insert_deltas(tabla, f"{nuevas} UNION ALL {viejas}")}
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """
+
+
+def _trigger_sql(tabla: str) -> list[str]:
+    eventos = (
+        ("ins", "INSERT", "NEW TABLE AS nuevas"),
+        ("upd", "UPDATE", "OLD TABLE AS viejas NEW TABLE AS nuevas"),
+        ("del", "DELETE", "OLD TABLE AS viejas"),
+    )
+    return [
+        f"CREATE OR REPLACE TRIGGER stats_{tabla}_{sufijo} AFTER {evento} ON {tabla} "
+        f"REFERENCING {transicion} FOR EACH STATEMENT EXECUTE FUNCTION stats_{tabla}()"
+        for sufijo, evento, transicion in eventos
+    ]
+
+
+async def _rebuild(conn, tabla: str):
+    # SHARE bloquea escrituras (no lecturas) mientras se recuenta: ningún
+    # delta queda contado dos veces ni se pierde
+    dimensiones = [d for d, _ in DIMENSIONES[tabla]]
+    await conn.execute(text(f"LOCK TABLE {tabla} IN SHARE MODE"))
+    await conn.execute(deltas.delete().where(deltas.c.dimension.in_(dimensiones)))
+    await conn.execute(conteos.delete().where(conteos.c.dimension.in_(dimensiones)))
+    await conn.execute(text(f"""
+        INSERT INTO {conteos.name} (dimension, valor, total)
+        SELECT d.dimension, d.valor, count(*)
+        FROM {tabla} f, LATERAL (VALUES {_valores(tabla)}) AS d(dimension, valor)
+        GROUP BY 1, 2
+    """))
+
+
+async def install_rollups(conn):
+    # Se llama al arrancar, después de create_all. La primera vez que se crea
+    # el trigger de una tabla se recuentan sus dimensiones desde cero
+    await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('stats_rollups'))"))
+    for tabla in DIMENSIONES:
+        existe = (await conn.execute(
+            text("SELECT 1 FROM pg_trigger WHERE tgname = :nombre"),
+            {"nombre": f"stats_{tabla}_ins"}
+        )).first() is not None
+
+        await conn.execute(text(_function_sql(tabla)))
+        for sql in _trigger_sql(tabla):
+            await conn.execute(text(sql))
+
+        if not existe:
+            await _rebuild(conn, tabla)
+
+
+async def rebuild_stats(on_progress=None):
+    for i, tabla in enumerate(DIMENSIONES, start=1):
+        async with jobs_engine.begin() as conn:
+            await _rebuild(conn, tabla)
+        if on_progress is not None:
+            await on_progress(i, len(DIMENSIONES), f"{tabla} recontada")
+
+
+async def compact() -> int:
+    # Suma los deltas pendientes en stats_conteos y los borra, en una sentencia
+    async with jobs_engine.begin() as conn:
+        result = await conn.execute(text(f"""
+            WITH movidos AS (
+                DELETE FROM {deltas.name} RETURNING dimension, valor, delta
+            )
+            INSERT INTO {conteos.name} AS c (dimension, valor, total)
+            SELECT dimension, valor, sum(delta) FROM movidos GROUP BY 1, 2
+            ON CONFLICT (dimension, valor) DO UPDATE SET total = c.total + excluded.total
+            RETURNING c.dimension, c.valor, c.total
+        """))
+        filas = result.all()
+
+        # Valores que quedaron en cero (p. ej. un estado sin clientes)
+        vacios = [(f.dimension, f.valor) for f in filas if f.total == 0]
+        if vacios:
+            await conn.execute(conteos.delete().where(tuple_(conteos.c.dimension, conteos.c.valor).in_(vacios)))
+    return len(filas)
+
+
+async def compact_loop(intervalo: float = 30):
+    while True:
+        try:
+            await compact()
+        except Exception as e:
+            print(f"Error al compactar estadísticas: {e}")
+        await asyncio.sleep(intervalo)
@@ -0,0 +1,96 @@
+import asyncio
+import copy
+from starlette.responses import Response
+from database.database import ReadSessionLocal
+
+
+def _copy(resultado):
+    # Las respuestas ya serializadas se reconstruyen sobre los mismos bytes:
+    # FastAPI les asigna tareas en segundo plano y los middlewares agregan
+    # encabezados, así que no pueden compartirse entre peticiones
+    if isinstance(resultado, Response):
+        return Response(
+            content=resultado.body,
+            status_code=resultado.status_code,
+            headers=dict(resultado.headers),
+        )
+    return copy.deepcopy(resultado)
+
+
+class SingleFlight:
+    # Agrupa lecturas concurrentes con la misma llave en una sola ejecución.
+    # Los loaders devuelven dicts, listas o Response: cada petición agrupada
+    # recibe su propia copia y solo la última en reanudarse se queda con el
+    # original, así ninguna ve lo que otra modificó. Sin agrupación no se copia.
+
+    def __init__(self):
+        self._inflight: dict[tuple, tuple[asyncio.Task, list[int]]] = {}
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.cancelled = 0
+
+    async def do(self, key: tuple, loader, sessions=ReadSessionLocal):
+        entry = self._inflight.get(key)
+
+        if entry is None:
+            task = asyncio.ensure_future(self._run(loader, sessions))
+            entry = (task, [0])
+            self._inflight[key] = entry
+            task.add_done_callback(lambda t, k=key: self._finish(k, t))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+
+        task, waiters = entry
+        waiters[0] += 1
+
+        try:
+            # shield: si un cliente cancela, la consulta sigue para los demás
+            resultado = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done():
+                waiters[0] -= 1
+                if waiters[0] == 0:
+                    # Nadie más espera el resultado: se cancela la consulta y se
+                    # libera la llave para que nuevas peticiones no la hereden
+                    self._inflight.pop(key, None)
+                    task.cancel()
+            raise
+
+        # El original se entrega al último, cuando los demás ya copiaron; se
+        # libera la llave para que nadie más llegue a compartirlo
+        waiters[0] -= 1
+        if waiters[0] > 0:
+            return _copy(resultado)
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+        return resultado
+
+    async def _run(self, loader, sessions):
+        # Sesión propia: no depende del ciclo de vida de la petición que la
+        # inició; sessions elige el pool (ReadSessionLocal o BulkReadSessionLocal)
+        async with sessions() as session:
+            return await loader(session)
+
+    def _finish(self, key: tuple, task: asyncio.Task):
+        entry = self._inflight.get(key)
+        if entry is not None and entry[0] is task:
+            del self._inflight[key]
+
+        if task.cancelled():
+            self.cancelled += 1
+        elif task.exception() is not None:
+            self.errors += 1
+
+    def stats(self) -> dict:
+        return {
+            "ejecuciones": self.executions,
+            "agrupadas": self.coalesced,
+            "errores": self.errors,
+            "canceladas": self.cancelled,
+            "en_curso": len(self._inflight),
+        }
+
+
+reads = SingleFlight()
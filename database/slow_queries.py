@@ -0,0 +1,184 @@
+import asyncio
+import random
+import re
+import time
+from collections import Counter
+from sqlalchemy import event
+from database.database import engines, jobs_engine, settings
+from middleware.loop_monitor import current_route
+
+# Tiempo de cada sentencia en los tres pools. Las que pasan de
+# slow_query_ms se agrupan por SQL normalizado con la ruta que las lanzó y la
+# forma de sus parámetros (tipos y tamaños, nunca los valores). A una muestra
+# de las lecturas lentas se le saca EXPLAIN (ANALYZE, BUFFERS) en una conexión
+# del pool de jobs, para no quitarle conexiones a las peticiones.
+
+# Consultas distintas que se conservan; las nuevas se cuentan pero no se guardan
+CONSULTAS_MAX = 500
+RUTAS_MAX = 10
+FORMAS_MAX = 10
+
+_ESPACIOS = re.compile(r"\s+")
+# IN (...) expandido: cada tamaño de lista sería una consulta distinta
+_LISTA = re.compile(r"\$\d+(?:::\w+)?(?:, \$\d+(?:::\w+)?)+")
+# EXPLAIN ANALYZE ejecuta la sentencia: solo lecturas que no toman candados
+_ESCRITURA = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|FOR (NO KEY )?UPDATE|FOR (KEY )?SHARE)\b")
+
+
+def normalize(sql: str) -> str:
+    return _LISTA.sub("$n, ...", _ESPACIOS.sub(" ", sql).strip())
+
+
+def param_shape(valor) -> str:
+    if isinstance(valor, (list, tuple)):
+        return f"{type(valor).__name__}[{len(valor)}]"
+    if isinstance(valor, (str, bytes)):
+        return f"{type(valor).__name__}({len(valor)})"
+    return type(valor).__name__
+
+
+def params_shape(parametros, executemany: bool) -> str:
+    if executemany:
+        filas = list(parametros or [])
+        return f"{len(filas)} x ({params_shape(filas[0], False) if filas else ''})"
+    if isinstance(parametros, dict):
+        return ", ".join(f"{k}: {param_shape(v)}" for k, v in parametros.items())
+    return ", ".join(param_shape(v) for v in parametros or ())
+
+
+def explainable(sql: str) -> bool:
+    inicio = sql.lstrip()[:6].upper()
+    return inicio in ("SELECT", "WITH") and not _ESCRITURA.search(sql.upper())
+
+
+class SlowQueries:
+
+    def __init__(self):
+        self.sentencias = 0
+        self.lentas = 0
+        self.descartadas = 0
+        self.consultas: dict[str, dict] = {}
+        self._instalado = False
+        self._explicando: set[str] = set()
+
+    def install(self):
+        if self._instalado:
+            return
+        for nombre, (pool_engine, _) in engines.items():
+            sync_engine = pool_engine.sync_engine
+            event.listen(sync_engine, "before_cursor_execute", self._before)
+            event.listen(sync_engine, "after_cursor_execute", self._after(nombre))
+            event.listen(sync_engine, "handle_error", self._error)
+        self._instalado = True
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("consulta_inicio", []).append(time.perf_counter())
+
+    def _error(self, contexto):
+        # Una sentencia que falla no llega a after_cursor_execute: su inicio
+        # quedaría en la pila y el siguiente after mediría contra él
+        conn = contexto.connection
+        if conn is not None and contexto.execution_context is not None and conn.info.get("consulta_inicio"):
+            conn.info["consulta_inicio"].pop()
+
+    def _after(self, pool: str):
+        def after(conn, cursor, statement, parameters, context, executemany):
+            duracion = time.perf_counter() - conn.info["consulta_inicio"].pop()
+            self.sentencias += 1
+            if duracion * 1000 >= settings.slow_query_ms and not context.execution_options.get("explain"):
+                self._record(pool, statement, parameters, executemany, duracion)
+        return after
+
+    def _record(self, pool: str, statement: str, parametros, executemany: bool, duracion: float):
+        self.lentas += 1
+        sql = normalize(statement)
+        consulta = self.consultas.get(sql)
+        if consulta is None:
+            if len(self.consultas) >= CONSULTAS_MAX:
+                self.descartadas += 1
+                return
+            consulta = self.consultas[sql] = {
+                "sql": sql,
+                "pool": pool,
+                "veces": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "rutas": Counter(),
+                "formas": Counter(),
+                "plan": None,
+                "plan_ms": None,
+                "plan_at": None,
+            }
+
+        ms = duracion * 1000
+        consulta["veces"] += 1
+        consulta["total_ms"] += ms
+        consulta["max_ms"] = max(consulta["max_ms"], ms)
+        ruta = current_route() or "(sin petición)"
+        if ruta in consulta["rutas"] or len(consulta["rutas"]) < RUTAS_MAX:
+            consulta["rutas"][ruta] += 1
+        forma = params_shape(parametros, executemany)
+        if forma in consulta["formas"] or len(consulta["formas"]) < FORMAS_MAX:
+            consulta["formas"][forma] += 1
+
+        if self._wants_plan(consulta, statement, executemany):
+            self._explicando.add(sql)
+            # after_cursor_execute corre dentro del event loop (greenlet de
+            # SQLAlchemy): el plan se saca en una tarea aparte sin esperarla
+            tarea = asyncio.get_running_loop().create_task(self._explain(sql, statement, parametros))
+            tarea.add_done_callback(lambda t, s=sql: self._explicando.discard(s))
+
+    def _wants_plan(self, consulta: dict, statement: str, executemany: bool) -> bool:
+        if executemany or not explainable(statement):
+            return False
+        if consulta["plan_at"] is not None and time.time() - consulta["plan_at"] < settings.slow_query_plan_ttl:
+            return False
+        # Un solo EXPLAIN a la vez: repite la consulta lenta
+        return not self._explicando and random.random() < settings.slow_query_explain_rate
+
+    async def _explain(self, sql: str, statement: str, parametros):
+        try:
+            async with jobs_engine.connect() as conn:
+                # Transacción que se descarta al cerrar; el límite acota cuánto
+                # puede costar repetir la consulta
+                conn = await conn.execution_options(explain=True)
+                await conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(settings.slow_query_explain_timeout_ms)}")
+                inicio = time.perf_counter()
+                result = await conn.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", tuple(parametros or ()))
+                plan = [fila[0] for fila in result.all()]
+                duracion = time.perf_counter() - inicio
+        except Exception as e:
+            plan, duracion = [f"No se pudo obtener el plan: {e}"], None
+
+        consulta = self.consultas.get(sql)
+        if consulta is not None:
+            consulta["plan"] = plan
+            consulta["plan_ms"] = round(duracion * 1000, 3) if duracion is not None else None
+            consulta["plan_at"] = time.time()
+
+    def stats(self, top: int = 20, orden: str = "total_ms") -> dict:
+        consultas = sorted(self.consultas.values(), key=lambda c: -c[orden])[:top]
+        return {
+            "umbral_ms": settings.slow_query_ms,
+            "sentencias": self.sentencias,
+            "lentas": self.lentas,
+            "descartadas": self.descartadas,
+            "top": [
+                {
+                    **c,
+                    "total_ms": round(c["total_ms"], 3),
+                    "max_ms": round(c["max_ms"], 3),
+                    "promedio_ms": round(c["total_ms"] / c["veces"], 3),
+                    "rutas": dict(c["rutas"].most_common()),
+                    "formas": dict(c["formas"].most_common()),
+                }
+                for c in consultas
+            ],
+        }
+
+    def reset(self):
+        self.sentencias = self.lentas = self.descartadas = 0
+        self.consultas = {}
+
+
+slow_queries = SlowQueries()
@@ -0,0 +1,48 @@
+import asyncio
+import time
+from sqlalchemy import text
+from database.database import engine, settings
+from database.read_queries import hot_statements
+from database.catalog_cache import catalogs
+
+estado = {
+    "listo": False,
+    "error": None,
+    "conexiones_precargadas": 0,
+    "sentencias_preparadas": 0,
+    "duracion_ms": None,
+}
+
+
+async def _prepare(conn):
+    await conn.execute(text("SELECT 1"))
+    # Los prepared statements de asyncpg son por conexión: se preparan en cada una
+    for stmt, params in hot_statements():
+        await conn.execute(stmt, params)
+
+
+async def warm_up():
+    inicio = time.perf_counter()
+    estado["listo"] = False
+    estado["error"] = None
+
+    try:
+        # Se abren todas a la vez para que sean conexiones distintas del pool
+        n = min(settings.pool_prefill, settings.pool_size)
+        conexiones = await asyncio.gather(*[engine.connect() for _ in range(n)])
+        try:
+            await asyncio.gather(*[_prepare(conn) for conn in conexiones])
+        finally:
+            for conn in conexiones:
+                await conn.close()
+
+        await catalogs.load_all()
+
+        estado["conexiones_precargadas"] = n
+        estado["sentencias_preparadas"] = len(hot_statements())
+        estado["listo"] = True
+    except Exception as e:
+        print(f"Error al precalentar el worker: {e}")
+        estado["error"] = str(e)
+    finally:
+        estado["duracion_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
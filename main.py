@@ -1,18 +1,50 @@
-from fastapi import FastAPI, Request
+import asyncio
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from database.database import engine, Base
+from database.database import engine, engines, settings, Base
+from database.warmup import warm_up
+from database.migrations import ensure_functions, run_migrations
+from database.rollups import install_rollups, compact_loop
+from database.slow_queries import slow_queries
+from services import passwords
+from services.jobs import runner
+from middleware.idempotency import IdempotencyMiddleware, cleanup_loop
+from middleware.auth import get_principal
+from middleware.loop_monitor import LoopMonitorMiddleware, monitor
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from routes import opticaroutes
-from controllers import users_controller, estado_sucursal_controller, tipo_sucursal_controller, sucursales_controller, users_roles_contoller, tipo_cliente_controller, clientes_controller, pacientes_controller, armazon_controler, servicio_controller, material_controller
+from controllers import users_controller, estado_sucursal_controller, tipo_sucursal_controller, sucursales_controller, users_roles_contoller, tipo_cliente_controller, clientes_controller, pacientes_controller, armazon_controler, servicio_controller, material_controller, metrics_controller, health_controller, batch_controller, stats_controller, jobs_controller
 
 app = FastAPI()
 
 # Crear tablas al iniciar
 @app.on_event("startup")
 async def startup():
+    if settings.loop_monitor_enabled:
+        monitor.start()
+    slow_queries.install()
     async with engine.begin() as conn:
+        await ensure_functions(conn)
         await conn.run_sync(Base.metadata.create_all)
+        await run_migrations(conn)
+        await install_rollups(conn)
+    # El worker no se reporta listo hasta tener pool, sentencias y catálogos calientes
+    await warm_up()
+    app.state.idempotency_cleanup = asyncio.create_task(cleanup_loop())
+    app.state.stats_compaction = asyncio.create_task(compact_loop())
+    runner.start(settings.jobs_concurrency)
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.idempotency_cleanup.cancel()
+    app.state.stats_compaction.cancel()
+    # Los jobs en curso vuelven a pendiente antes de cerrar los pools
+    await runner.stop()
+    for pool_engine, _ in engines.values():
+        await pool_engine.dispose()
+    passwords.shutdown()
+    await monitor.stop()
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -38,6 +70,9 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         }
     )
 
+# Reintentos con Idempotency-Key devuelven la respuesta guardada
+app.add_middleware(IdempotencyMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -46,18 +81,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Afuera de todo: los bloqueos de cualquier middleware también se atribuyen
+app.add_middleware(LoopMonitorMiddleware)
+
+# Todo requiere token salvo login, health y la raíz
+protegido = [Depends(get_principal)]
+
 app.include_router(opticaroutes.router, prefix = "/visualoptics")
-app.include_router(users_controller.router)
-app.include_router(estado_sucursal_controller.router)
-app.include_router(tipo_sucursal_controller.router)
-app.include_router(sucursales_controller.router)
-app.include_router(users_roles_contoller.router)
-app.include_router(tipo_cliente_controller.router)
-app.include_router(clientes_controller.router)
-app.include_router(pacientes_controller.router)
-app.include_router(armazon_controler.router)
-app.include_router(servicio_controller.router)
-app.include_router(material_controller.router)
+app.include_router(users_controller.auth_router)
+app.include_router(users_controller.router, dependencies=protegido)
+app.include_router(estado_sucursal_controller.router, dependencies=protegido)
+app.include_router(tipo_sucursal_controller.router, dependencies=protegido)
+app.include_router(sucursales_controller.router, dependencies=protegido)
+app.include_router(users_roles_contoller.router, dependencies=protegido)
+app.include_router(tipo_cliente_controller.router, dependencies=protegido)
+app.include_router(clientes_controller.router, dependencies=protegido)
+app.include_router(pacientes_controller.router, dependencies=protegido)
+app.include_router(armazon_controler.router, dependencies=protegido)
+app.include_router(servicio_controller.router, dependencies=protegido)
+app.include_router(material_controller.router, dependencies=protegido)
+app.include_router(metrics_controller.router, dependencies=protegido)
+app.include_router(health_controller.router)
+app.include_router(batch_controller.router, dependencies=protegido)
+app.include_router(stats_controller.router, dependencies=protegido)
+app.include_router(jobs_controller.router, dependencies=protegido)
 @app.get("/")
 async def root():
     return {"message": "FastAPI + PostgresSQL funcionan!"}
\ No newline at end of file
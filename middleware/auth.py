@@ -1,5 +1,15 @@
-from jose import jwt
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt
+from sqlalchemy import ARRAY, Integer, any_, bindparam, exists, or_
+from database.database import settings
+from database.batching import ids_param
+from database.catalog_cache import catalogs
+from models.clientes_model import Cliente
+from models.pacientes_model import Paciente
 
 SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
@@ -9,4 +19,191 @@ def acces_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
\ No newline at end of file
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def token_claims(user) -> dict:
+    # Lo que la autorización necesita viaja en el token: una petición
+    # autenticada no vuelve a leer users. Un cambio de roles o sucursales
+    # aplica al siguiente login; desactivar un rol aplica en cuanto se
+    # recarga el catálogo de roles
+    return {
+        "sub": str(user.id),
+        "usuario": user.usuario,
+        "suc": user.Sucursal,
+        "acc": sorted(set(user.sucursal_acces or []) | {user.Sucursal}),
+        "roles": sorted(set(user.roles or [])),
+    }
+
+
+def grants_global(catalogo: dict[int, dict], roles) -> bool:
+    # Roles (activos) cuyo nombre está en auth_roles_globales
+    globales = {r.lower() for r in settings.auth_roles_globales}
+    return any(r in catalogo and catalogo[r]["rol"].lower() in globales for r in roles)
+
+
+class Principal:
+    # Usuario de la petición. Se comparte entre las peticiones con el mismo
+    # token, así que solo cambia lo que depende del catálogo de roles
+
+    __slots__ = ("user_id", "usuario", "sucursal", "sucursales", "roles", "expira",
+                 "roles_activos", "global_", "_catalogo", "_lista")
+
+    def __init__(self, user_id: int, usuario: str, sucursal: int, sucursales: frozenset[int], roles: frozenset[int], expira: float):
+        self.user_id = user_id
+        self.usuario = usuario
+        self.sucursal = sucursal
+        self.sucursales = sucursales
+        self.roles = roles
+        self.expira = expira
+        self.roles_activos: frozenset[int] = frozenset()
+        self.global_ = False
+        self._catalogo = None
+        self._lista = sorted(sucursales)
+
+    def resolve(self, catalogo: dict[int, dict]):
+        # El catálogo se reemplaza completo al recargarse: mientras sea el
+        # mismo objeto, los roles activos ya calculados siguen valiendo
+        if catalogo is self._catalogo:
+            return
+
+        self.roles_activos = frozenset(r for r in self.roles if r in catalogo and catalogo[r]["is_active"])
+        self.global_ = grants_global(catalogo, self.roles_activos)
+        self._catalogo = catalogo
+
+    @property
+    def scope(self) -> frozenset[int] | None:
+        # None: todas las sucursales. Va en las llaves de singleflight para
+        # que solo se agrupen lecturas con el mismo alcance
+        return None if self.global_ else self.sucursales
+
+    def can_access(self, sucursal_id: int | None) -> bool:
+        return self.global_ or sucursal_id in self.sucursales
+
+    def scope_params(self) -> dict:
+        return {"sucursales": self._lista}
+
+
+# Con auth_required=False todas las peticiones actúan como este usuario
+SISTEMA = Principal(0, "sistema", 0, frozenset(), frozenset(), float("inf"))
+SISTEMA.global_ = True
+
+bearer = HTTPBearer(auto_error=False)
+
+# token -> Principal, en orden de uso: la firma y los claims se verifican una
+# vez por token y proceso
+_tokens: OrderedDict[str, Principal] = OrderedDict()
+
+
+def decode_token(token: str) -> Principal:
+    principal = _tokens.get(token)
+
+    if principal is None:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        principal = Principal(
+            user_id=int(claims["sub"]),
+            usuario=claims["usuario"],
+            sucursal=int(claims["suc"]),
+            sucursales=frozenset(int(s) for s in claims["acc"]),
+            roles=frozenset(int(r) for r in claims["roles"]),
+            expira=float(claims["exp"]),
+        )
+        _tokens[token] = principal
+        if len(_tokens) > settings.auth_token_cache_size:
+            _tokens.popitem(last=False)
+    else:
+        _tokens.move_to_end(token)
+
+    if principal.expira <= time.time():
+        _tokens.pop(token, None)
+        raise JWTError("Token expirado")
+
+    return principal
+
+
+def _unauthorized(detalle: str):
+    return HTTPException(status_code=401, detail=detalle, headers={"WWW-Authenticate": "Bearer"})
+
+
+async def get_principal(credenciales: HTTPAuthorizationCredentials | None = Depends(bearer)) -> Principal:
+    # Dependencia de todos los routers protegidos. Con el token en cache y el
+    # catálogo de roles en memoria no hace ninguna consulta
+    if not settings.auth_required:
+        return SISTEMA
+
+    if credenciales is None:
+        raise _unauthorized("No autenticado")
+
+    try:
+        principal = decode_token(credenciales.credentials)
+    except (JWTError, KeyError, TypeError, ValueError):
+        raise _unauthorized("Token inválido o expirado")
+
+    principal.resolve(await catalogs.get_stale("user_roles"))
+
+    if not principal.roles_activos:
+        raise HTTPException(
+            status_code=403,
+            detail="El usuario no tiene roles activos"
+        )
+
+    return principal
+
+
+def require_global(principal: Principal):
+    if not principal.global_:
+        raise HTTPException(
+            status_code=403,
+            detail="Se requiere acceso a todas las sucursales"
+        )
+
+
+async def global_principal(principal: Principal = Depends(get_principal)) -> Principal:
+    # Dependencia para rutas de administración (catálogos, jobs, estadísticas, métricas)
+    require_global(principal)
+    return principal
+
+
+def require_sucursal(principal: Principal, sucursal_id: int | None):
+    # Asignar un registro a una sucursal fuera del alcance del usuario
+    if sucursal_id is not None and not principal.can_access(sucursal_id):
+        raise HTTPException(
+            status_code=403,
+            detail=f"Sin acceso a la sucursal {sucursal_id}"
+        )
+
+
+def scope_clause(column, nulos: bool = False):
+    # Un solo parámetro de arreglo: la sentencia cacheada es la misma para
+    # cualquier conjunto de sucursales (valores en Principal.scope_params)
+    condicion = column == any_(bindparam("sucursales", type_=ARRAY(Integer)))
+    return or_(column.is_(None), condicion) if nulos else condicion
+
+
+def scope_conditions(principal: Principal, column, nulos: bool = False) -> list:
+    # Para escrituras, que no usan sentencias cacheadas: el alcance va como valor
+    if principal.global_:
+        return []
+    condicion = column == ids_param(principal.sucursales)
+    return [or_(column.is_(None), condicion) if nulos else condicion]
+
+
+def paciente_scope(condicion):
+    # Los pacientes no tienen sucursal: heredan la de su cliente. condicion es
+    # la de scope_clause o scope_conditions sobre clientes.sucursal_id; los
+    # pacientes sin cliente quedan visibles para todos
+    pacientes, clientes = Paciente.__table__, Cliente.__table__
+    return or_(
+        pacientes.c.cliente_id.is_(None),
+        exists().where(clientes.c.id == pacientes.c.cliente_id, condicion),
+    )
+
+
+def batch_scope(nombre: str, condicion):
+    # Dependencia de alcance para batching.batch_routes: condicion usa el
+    # parámetro de scope_clause; None con acceso global (sin condición)
+    def alcance(principal: Principal = Depends(get_principal)):
+        if principal.global_:
+            return None
+        return (nombre, condicion, principal.scope_params())
+    return alcance
@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from database.database import engine, jobs_engine, settings
+from models.idempotency_model import IdempotencyKey
+
+HEADER = b"idempotency-key"
+METODOS = {"POST", "PUT", "PATCH", "DELETE"}
+# Respuestas que se guardan: éxitos y rechazos que se repetirían igual. Las
+# demás (401/403/429, 5xx) dependen del momento y liberan la llave
+GUARDAR_4XX = {400, 404, 409, 422}
+# Espera entre consultas cuando la primera ejecución corre en otro worker
+POLL_SEGUNDOS = 0.05
+# Encabezados que no se guardan: se recalculan al repetir la respuesta
+NO_GUARDAR = {b"content-type", b"content-length", b"date", b"server"}
+
+tabla = IdempotencyKey.__table__
+
+
+def _json(status: int, contenido: dict, extra: list | None = None) -> tuple:
+    body = json.dumps(contenido, ensure_ascii=False).encode()
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    return status, headers + (extra or []), body
+
+
+class IdempotencyMiddleware:
+    # Las peticiones de escritura con Idempotency-Key se ejecutan una sola vez:
+    # los reintentos reciben la respuesta guardada y los duplicados concurrentes
+    # esperan a que termine la primera ejecución en lugar de competir con ella.
+
+    def __init__(self, app):
+        self.app = app
+        # Ejecuciones en curso en este proceso: los duplicados locales esperan
+        # el futuro sin consultar la base
+        self._en_curso: dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in METODOS:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        clave = headers.get(HEADER)
+        if not clave:
+            return await self.app(scope, receive, send)
+
+        # La llave es por usuario: el mismo valor enviado con otro token no
+        # recibe la respuesta guardada de alguien más
+        llave = hashlib.sha256(b"%s %s %s %s" % (
+            scope["method"].encode(), scope["path"].encode(), headers.get(b"authorization", b""), clave
+        )).hexdigest()
+
+        tipo = headers.get(b"content-type", b"")
+        largo = headers.get(b"content-length", b"")
+        if tipo.startswith(b"application/json") and largo.isdigit() and int(largo) <= settings.idempotency_max_body:
+            # El cuerpo se lee completo para calcular la huella y se reenvía tal cual
+            partes = []
+            while True:
+                mensaje = await receive()
+                if mensaje["type"] == "http.disconnect":
+                    return
+                partes.append(mensaje.get("body", b""))
+                if not mensaje.get("more_body"):
+                    break
+            cuerpo = b"".join(partes)
+            huella = hashlib.sha256(cuerpo).hexdigest()
+        else:
+            # Archivos (multipart) o cuerpos grandes: no se copian a memoria y
+            # la huella solo compara tipo y tamaño declarados (sin el boundary,
+            # que cambia en cada envío)
+            cuerpo = None
+            huella = hashlib.sha256(b"%s %s" % (tipo.split(b";")[0].strip(), largo)).hexdigest()
+
+        if await self._claim(llave, huella):
+            return await self._execute(llave, scope, cuerpo, receive, send)
+
+        respuesta = await self._wait(llave, huella)
+        await self._send(send, *respuesta)
+
+    async def _claim(self, llave: str, huella: str) -> bool:
+        # Un solo INSERT decide quién ejecuta: gana el primero, o quien llega
+        # después de que la fila venció o quedó abandonada a medias
+        ahora = datetime.utcnow()
+        query = insert(tabla).values(llave=llave, huella=huella, created_at=ahora)
+        query = query.on_conflict_do_update(
+            index_elements=[tabla.c.llave],
+            set_={"huella": huella, "status": None, "content_type": None, "headers": None, "body": None, "created_at": ahora},
+            where=(tabla.c.created_at < ahora - timedelta(hours=settings.idempotency_ttl_hours)) | (
+                tabla.c.status.is_(None)
+                & (tabla.c.created_at < ahora - timedelta(seconds=settings.idempotency_lock_timeout))
+            ),
+        ).returning(tabla.c.llave)
+
+        async with engine.begin() as conn:
+            ganador = (await conn.execute(query)).first() is not None
+
+        if ganador:
+            self._en_curso[llave] = asyncio.get_running_loop().create_future()
+        return ganador
+
+    async def _execute(self, llave: str, scope, cuerpo: bytes | None, receive_original, send):
+        enviado = False
+        respuesta = {"status": 500, "content_type": None, "headers": [], "body": []}
+
+        async def receive():
+            nonlocal enviado
+            if cuerpo is None:
+                return await receive_original()
+            if not enviado:
+                enviado = True
+                return {"type": "http.request", "body": cuerpo, "more_body": False}
+            return {"type": "http.disconnect"}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                respuesta["status"] = message["status"]
+                for nombre, valor in message.get("headers", []):
+                    if nombre.lower() == b"content-type":
+                        respuesta["content_type"] = valor.decode()
+                    elif nombre.lower() not in NO_GUARDAR:
+                        respuesta["headers"].append([nombre.decode("latin-1"), valor.decode("latin-1")])
+            elif message["type"] == "http.response.body":
+                respuesta["body"].append(message.get("body", b""))
+            await send(message)
+
+        latido = asyncio.ensure_future(self._heartbeat(llave))
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            latido.cancel()
+            await self._store(
+                llave, respuesta["status"], respuesta["content_type"], respuesta["headers"], b"".join(respuesta["body"])
+            )
+
+    async def _heartbeat(self, llave: str):
+        # Mientras la primera ejecución sigue viva renueva created_at: _claim
+        # solo toma una llave en curso cuyo latido venció (proceso caído), no
+        # una petición lenta como una importación grande
+        intervalo = settings.idempotency_lock_timeout / 3
+        query = tabla.update().where(tabla.c.llave == llave, tabla.c.status.is_(None))
+        while True:
+            await asyncio.sleep(intervalo)
+            try:
+                async with engine.begin() as conn:
+                    await conn.execute(query.values(created_at=datetime.utcnow()))
+            except Exception as e:
+                print(f"Error al renovar llave idempotente: {e}")
+
+    async def _store(self, llave: str, status: int, content_type: str | None, headers: list, body: bytes):
+        futuro = self._en_curso.pop(llave, None)
+        try:
+            async with engine.begin() as conn:
+                if not (200 <= status < 300 or status in GUARDAR_4XX):
+                    # No se guarda: el reintento vuelve a ejecutar
+                    await conn.execute(delete(tabla).where(tabla.c.llave == llave))
+                else:
+                    await conn.execute(
+                        tabla.update().where(tabla.c.llave == llave)
+                        .values(status=status, content_type=content_type, headers=headers, body=body)
+                    )
+        except Exception as e:
+            print(f"Error al guardar respuesta idempotente: {e}")
+        finally:
+            if futuro is not None and not futuro.done():
+                futuro.set_result(None)
+
+    async def _wait(self, llave: str, huella: str) -> tuple:
+        limite = asyncio.get_running_loop().time() + settings.idempotency_lock_timeout
+        query = select(
+            tabla.c.huella, tabla.c.status, tabla.c.content_type, tabla.c.headers, tabla.c.body
+        ).where(tabla.c.llave == llave)
+
+        while True:
+            futuro = self._en_curso.get(llave)
+            if futuro is not None:
+                await asyncio.shield(futuro)
+
+            async with engine.connect() as conn:
+                fila = (await conn.execute(query)).first()
+
+            if fila is None:
+                # La primera ejecución no se guardó (5xx, 401/403/429) y liberó la llave
+                return _json(409, {"detail": "La petición original falló; reintente con la misma llave"})
+
+            if fila.huella != huella:
+                return _json(422, {"detail": "La Idempotency-Key ya se usó con un cuerpo distinto"})
+
+            if fila.status is not None:
+                headers = [(n.encode("latin-1"), v.encode("latin-1")) for n, v in fila.headers or []]
+                headers += [(b"content-length", str(len(fila.body or b"")).encode()), (b"idempotent-replayed", b"true")]
+                if fila.content_type:
+                    headers.append((b"content-type", fila.content_type.encode()))
+                return fila.status, headers, fila.body or b""
+
+            if asyncio.get_running_loop().time() > limite:
+                return _json(409, {"detail": "La petición original sigue en curso"})
+
+            # En curso en otro worker
+            await asyncio.sleep(POLL_SEGUNDOS)
+
+    async def _send(self, send, status: int, headers: list, body: bytes):
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+async def purge_expired() -> int:
+    vencidas = datetime.utcnow() - timedelta(hours=settings.idempotency_ttl_hours)
+    async with jobs_engine.begin() as conn:
+        result = await conn.execute(delete(tabla).where(tabla.c.created_at < vencidas))
+    return result.rowcount
+
+
+async def cleanup_loop(intervalo: float = 600):
+    # Limpieza periódica por TTL; el índice en created_at la mantiene barata
+    while True:
+        try:
+            borradas = await purge_expired()
+            if borradas:
+                print(f"Llaves de idempotencia vencidas eliminadas: {borradas}")
+        except Exception as e:
+            print(f"Error al limpiar llaves de idempotencia: {e}")
+        await asyncio.sleep(intervalo)
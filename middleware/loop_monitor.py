@@ -0,0 +1,290 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from database.database import settings
+from database.pools import BUCKETS_MS
+
+# Mide el retraso del event loop: una tarea pide despertar cada intervalo y
+# anota cuánto tarde lo hace. Un hilo vigila el último latido; si el loop
+# lleva más del umbral sin avanzar, copia la pila del hilo del loop (lo que
+# está bloqueando en ese momento) y la atribuye a la ruta de la tarea en curso.
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+# Marcos de la pila que se guardan por bloqueo (los más internos)
+MARCOS = 25
+RECIENTES = 50
+
+
+class BlockingCallError(RuntimeError):
+    pass
+
+
+class _EnVuelo:
+    # Petición en curso; el scope se lee al reportar porque el router le
+    # agrega la ruta (plantilla, no el path con ids) después de este middleware
+
+    __slots__ = ("scope", "bloqueos")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.bloqueos: list[dict] = []
+
+    @property
+    def ruta(self) -> str:
+        ruta = self.scope.get("route")
+        return f"{self.scope['method']} {getattr(ruta, 'path', self.scope['path'])}"
+
+
+_peticion: ContextVar[_EnVuelo | None] = ContextVar("peticion_en_vuelo", default=None)
+
+
+def _sitio(pila: traceback.StackSummary) -> str:
+    # El marco más interno que es código de este repositorio: la llamada a
+    # bcrypt o a print, no el interior de la librería
+    for marco in reversed(pila):
+        if marco.filename.startswith(RAIZ) and os.sep + "venv" + os.sep not in marco.filename:
+            return f"{marco.filename[len(RAIZ):]}:{marco.lineno} {marco.name}"
+    marco = pila[-1]
+    return f"{marco.filename}:{marco.lineno} {marco.name}"
+
+
+class LoopMonitor:
+
+    def __init__(self):
+        self.muestras = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self.histograma = [0] * (len(BUCKETS_MS) + 1)
+        self.bloqueos = 0
+        # (ruta, sitio) -> acumulado, para el top por tiempo total
+        self.sitios: dict[tuple[str, str], dict] = {}
+        self.recientes: deque[dict] = deque(maxlen=RECIENTES)
+
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._hilo_loop: int | None = None
+        self._tarea: asyncio.Task | None = None
+        self._vigia: threading.Thread | None = None
+        self._detener = threading.Event()
+        self._latido = 0.0
+        # Bloqueo capturado en el latido actual, pendiente de su duración
+        self._pendiente: dict | None = None
+        # Tarea -> petición que la originó (incluye las tareas hijas)
+        self._tareas: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._fabrica_previa = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._hilo_loop = threading.get_ident()
+        self._fabrica_previa = self._loop.get_task_factory()
+        self._loop.set_task_factory(self._task_factory)
+        self._latido = time.perf_counter()
+        self._detener.clear()
+        self._tarea = asyncio.create_task(self._tick_loop())
+        self._vigia = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._vigia.start()
+
+    async def stop(self):
+        self._detener.set()
+        if self._tarea is not None:
+            self._tarea.cancel()
+            await asyncio.gather(self._tarea, return_exceptions=True)
+        if self._loop is not None:
+            self._loop.set_task_factory(self._fabrica_previa)
+        if self._vigia is not None:
+            self._vigia.join(timeout=1)
+        self._tarea = self._vigia = self._loop = None
+
+    def _task_factory(self, loop, coro, **kwargs):
+        if self._fabrica_previa is not None:
+            tarea = self._fabrica_previa(loop, coro, **kwargs)
+        else:
+            tarea = asyncio.Task(coro, loop=loop, **kwargs)
+        # Corre en el contexto de quien crea la tarea, que es el que hereda
+        peticion = _peticion.get()
+        if peticion is not None:
+            self._tareas[tarea] = peticion
+        return tarea
+
+    def track(self, tarea, peticion: _EnVuelo | None):
+        if peticion is None:
+            self._tareas.pop(tarea, None)
+        else:
+            self._tareas[tarea] = peticion
+
+    async def _tick_loop(self):
+        intervalo = settings.loop_monitor_interval_ms / 1000
+        while True:
+            inicio = time.perf_counter()
+            await asyncio.sleep(intervalo)
+            ahora = time.perf_counter()
+            self._latido = ahora
+            self._observe(max(ahora - inicio - intervalo, 0.0))
+
+    def _observe(self, lag: float):
+        self.muestras += 1
+        self.lag_total += lag
+        self.lag_max = max(self.lag_max, lag)
+        ms = lag * 1000
+        for i, limite in enumerate(BUCKETS_MS):
+            if ms <= limite:
+                self.histograma[i] += 1
+                break
+        else:
+            self.histograma[-1] += 1
+
+        bloqueo, self._pendiente = self._pendiente, None
+        if bloqueo is not None:
+            # La duración real se conoce cuando el loop vuelve a despertar
+            bloqueo["duracion_ms"] = round(ms, 3)
+            acumulado = self.sitios.setdefault(
+                (bloqueo["ruta"], bloqueo["sitio"]),
+                {"ruta": bloqueo["ruta"], "sitio": bloqueo["sitio"], "veces": 0, "total_ms": 0.0, "max_ms": 0.0},
+            )
+            acumulado["veces"] += 1
+            acumulado["total_ms"] += ms
+            acumulado["max_ms"] = max(acumulado["max_ms"], ms)
+            acumulado["pila"] = bloqueo["pila"]
+
+    def _watch(self):
+        # Hilo aparte: mientras el loop está bloqueado, este sigue corriendo
+        # (el código que bloquea suelta el GIL cada pocos ms)
+        umbral = settings.loop_block_threshold_ms / 1000
+        # Entre latidos el loop duerme un intervalo a propósito
+        limite = umbral + settings.loop_monitor_interval_ms / 1000
+        capturado = None
+        while not self._detener.wait(umbral / 4):
+            latido = self._latido
+            if latido == capturado or time.perf_counter() - latido < limite:
+                continue
+            capturado = latido
+            try:
+                self._capture(latido)
+            except Exception as e:
+                print(f"Error al capturar bloqueo del event loop: {e}")
+
+    def _capture(self, latido: float):
+        marco = sys._current_frames().get(self._hilo_loop)
+        if marco is None:
+            return
+        pila = traceback.extract_stack(marco)[-MARCOS:]
+        tarea = asyncio.current_task(self._loop)
+        if self._latido != latido:
+            # El loop avanzó mientras se copiaba la pila: ya no es el bloqueo
+            return
+
+        peticion = self._tareas.get(tarea) if tarea is not None else None
+        bloqueo = {
+            "ruta": peticion.ruta if peticion is not None else "(sin petición)",
+            "sitio": _sitio(pila),
+            "duracion_ms": None,
+            "detectado": time.time(),
+            "pila": traceback.format_list(pila),
+        }
+        self.bloqueos += 1
+        self.recientes.append(bloqueo)
+        self._pendiente = bloqueo
+        if peticion is not None:
+            peticion.bloqueos.append(bloqueo)
+
+    def stats(self, top: int = 20) -> dict:
+        sitios = sorted(self.sitios.values(), key=lambda s: -s["total_ms"])[:top]
+        return {
+            "activo": self._tarea is not None,
+            "intervalo_ms": settings.loop_monitor_interval_ms,
+            "umbral_ms": settings.loop_block_threshold_ms,
+            "muestras": self.muestras,
+            "lag_promedio_ms": round(self.lag_total / self.muestras * 1000, 3) if self.muestras else 0,
+            "lag_max_ms": round(self.lag_max * 1000, 3),
+            "lag_ms": {
+                **{f"<={limite}": n for limite, n in zip(BUCKETS_MS, self.histograma)},
+                f">{BUCKETS_MS[-1]}": self.histograma[-1],
+            },
+            "bloqueos": self.bloqueos,
+            "top": [{**s, "total_ms": round(s["total_ms"], 3), "max_ms": round(s["max_ms"], 3)} for s in sitios],
+            "recientes": [{k: v for k, v in b.items() if k != "pila"} for b in reversed(self.recientes)],
+        }
+
+
+monitor = LoopMonitor()
+
+
+def current_route() -> str | None:
+    # Ruta de la petición que ejecuta el código actual (también la usan las
+    # métricas de consultas lentas)
+    peticion = _peticion.get()
+    return peticion.ruta if peticion is not None else None
+
+
+@contextmanager
+def strict_mode():
+    # Para pruebas: toda petición que bloquee el loop responde 500. Sirve
+    # tal cual como cuerpo de un fixture de pytest:
+    #     @pytest.fixture(autouse=True)
+    #     def loop_estricto():
+    #         with strict_mode():
+    #             yield
+    previo = settings.loop_strict
+    settings.loop_strict = True
+    try:
+        yield
+    finally:
+        settings.loop_strict = previo
+
+
+class LoopMonitorMiddleware:
+    # Marca la petición en curso para atribuirle bloqueos y consultas lentas.
+    # Con loop_strict (pruebas) una petición que bloqueó el loop responde 500
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        peticion = _EnVuelo(scope)
+        estricto = settings.loop_strict
+        # En modo estricto la respuesta se retiene hasta saber si hubo bloqueo:
+        # ya enviada, el cliente vería el 200 aunque después se lance el error
+        mensajes = []
+
+        async def retener(mensaje):
+            mensajes.append(mensaje)
+
+        # La tarea de la conexión atiende varias peticiones (keep-alive)
+        tarea = asyncio.current_task()
+        token = _peticion.set(peticion)
+        monitor.track(tarea, peticion)
+        try:
+            await self.app(scope, receive, retener if estricto else send)
+        finally:
+            monitor.track(tarea, None)
+            _peticion.reset(token)
+
+        if not estricto:
+            return
+
+        if not peticion.bloqueos:
+            for mensaje in mensajes:
+                await send(mensaje)
+            return
+
+        bloqueo = peticion.bloqueos[0]
+        error = f"{peticion.ruta} bloqueó el event loop en {bloqueo['sitio']}"
+        body = json.dumps({"detail": error}, ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 500,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+        # Además se lanza: TestClient lo propaga y el servidor lo registra con la pila
+        raise BlockingCallError(f"{error}:\n" + "".join(bloqueo["pila"]))
@@ -7,7 +7,7 @@ class Armazon(Base):
     __tablename__ = "armazones"
 
     id = Column(Integer, primary_key=True, index=True)
-    marca = Column(String(100), nullable=False)
+    marca = Column(String(100), unique=True, index=True, nullable=False)
 
 class ArmazonCreate(BaseModel):
     marca: str
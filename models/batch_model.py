@@ -0,0 +1,22 @@
+from typing import Any
+from pydantic import BaseModel
+
+class SubRequest(BaseModel):
+    id: str | None = None
+    method: str = "GET"
+    url: str
+    headers: dict[str, str] = {}
+    body: Any = None
+    # IDs de sub-peticiones que deben terminar antes (p. ej. crear y luego leer)
+    depende_de: list[str] = []
+
+class BatchRequest(BaseModel):
+    peticiones: list[SubRequest]
+
+class SubResponse(BaseModel):
+    id: str
+    status: int
+    body: Any = None
+
+class BatchResponse(BaseModel):
+    respuestas: list[SubResponse]
@@ -1,17 +1,40 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Computed, Index, text
 from sqlalchemy.orm import relationship
 from database.database import Base
+from database.bulk import BulkFilter
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
 from models.tipo_cliente_model import TipoClienteOut
+from models.pacientes_model import PacienteCreate, PacienteOut
 
 class Cliente(Base):
     __tablename__ = "clientes"
+    # Filtros y facetas de /cliente/all y /cliente/facets: la geografía es
+    # jerárquica (estado > ciudad > cp), así que un índice cubre sus prefijos
+    __table_args__ = (
+        Index("ix_clientes_estado_ciudad_cp", "estado", "ciudad", "codigopostal"),
+        Index("ix_clientes_tipo_estado_ciudad", "tipocliente", "estado", "ciudad"),
+        Index("ix_clientes_ciudad", "ciudad"),
+        Index("ix_clientes_codigopostal", "codigopostal"),
+        # created_at crece con el id: BRIN cubre rangos de fechas con unas
+        # cuantas páginas de índice
+        Index("ix_clientes_created_at_brin", "created_at", postgresql_using="brin"),
+        # Llaves de deduplicación: búsqueda al insertar y recorrido ordenado
+        # del reporte (services/dedup.py)
+        Index("ix_clientes_clave_nombre", "clave_nombre", "id"),
+        Index("ix_clientes_email_norm", "email_norm", "id"),
+        Index("ix_clientes_rfc_norm", "rfc_norm", "id"),
+        # Un RFC por cliente aunque dos altas validen a la vez (ON CONFLICT
+        # de la importación); los RFC vacíos de datos antiguos no cuentan
+        Index("ix_clientes_rfc_unico", "rfc_norm", unique=True, postgresql_where=text("rfc_norm <> ''")),
+        Index("ix_clientes_telefono_norm", "telefono_norm", "id"),
+        Index("ix_clientes_sucursal", "sucursal_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     nombres = Column(String(100), nullable=False)
     apellidos = Column(String(100), nullable=False)
-    rfc = Column(String(16), nullable=False)
+    rfc = Column(String(16), index=True, nullable=False)
     calle = Column(String(200), nullable=False)
     numero = Column(String(50), nullable=False)
     colonia = Column(String(100), nullable=False)
@@ -22,9 +45,20 @@ class Cliente(Base):
     email = Column(String(255), unique=True, index=True, nullable=False)
     contacto = Column(String(100), nullable=False)
     tipocliente = Column(Integer, nullable=True)
+    # Sucursal que atiende al cliente; los clientes sin sucursal (anteriores
+    # al alcance por sucursal) son visibles para todas
+    sucursal_id = Column(Integer, nullable=True)
     is_active = Column(Boolean, default=True, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    
+    # Control de concurrencia optimista: sube en cada UPDATE
+    version = Column(Integer, default=1, server_default="1", nullable=False)
+    # Normalizadas por Postgres (funciones en database/migrations.py): cubren
+    # también las escrituras masivas (COPY, UPDATE por filtro)
+    nombre_norm = Column(String(255), Computed("dedup_norm(nombres || ' ' || apellidos)", persisted=True))
+    clave_nombre = Column(String(255), Computed("dedup_fonetica(nombres || ' ' || apellidos)", persisted=True))
+    email_norm = Column(String(255), Computed("lower(trim(email))", persisted=True))
+    rfc_norm = Column(String(16), Computed("upper(regexp_replace(rfc, '[^A-Za-z0-9]', '', 'g'))", persisted=True))
+    telefono_norm = Column(String(30), Computed("right(regexp_replace(telefono, '[^0-9]', '', 'g'), 10)", persisted=True))
 
 class CreateCliente(BaseModel):
     nombres: str
@@ -40,6 +74,13 @@ class CreateCliente(BaseModel):
     email: EmailStr
     contacto: str
     tipocliente: int
+    # Sin valor se asigna la sucursal principal de quien da el alta
+    sucursal_id: int | None = None
+
+
+class CreateClienteConPacientes(CreateCliente):
+    # cliente_id de cada paciente se ignora: se asigna el del cliente creado
+    pacientes: list[PacienteCreate] = []
 
 
 class ClienteUpdate(BaseModel):
@@ -56,9 +97,15 @@ class ClienteUpdate(BaseModel):
     email: EmailStr | None = None
     contacto: str | None = None
     tipocliente: int | None = None
+    sucursal_id: int | None = None
+
+class ClienteBulkUpdate(BaseModel):
+    filtro: BulkFilter
+    cambios: ClienteUpdate
 
 class ClienteOut(BaseModel):
     id: int
+    version: int
     nombres: str
     apellidos: str
     rfc: str
@@ -69,9 +116,13 @@ class ClienteOut(BaseModel):
     estado: str
     codigopostal: str
     telefono: str
-    email: EmailStr
+    email: str  # validado en la entrada; EmailStr aquí cuesta ~130µs por fila
     contacto: str
     tipocliente: int | None = None
+    sucursal_id: int | None = None
+    # Solo presentes con ?expand=
+    tipocliente_detalle: TipoClienteOut | None = None
+    pacientes: list[PacienteOut] | None = None
 
     class Config:
         from_attributes = True
\ No newline at end of file
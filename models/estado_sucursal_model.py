@@ -8,7 +8,7 @@ class Estado_Sucursal(Base):
     __tablename__ = "estado_sucursal"
 
     id = Column(Integer, primary_key=True, index=True)
-    estado = Column(String(100), nullable=False)
+    estado = Column(String(100), unique=True, index=True, nullable=False)
 
 class EstadoSucursalCreate(BaseModel):
     estado: str
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, String, LargeBinary, DateTime
+from sqlalchemy.dialects.postgresql import JSONB
+from database.database import Base
+from datetime import datetime
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # sha256 de método + ruta + Idempotency-Key
+    llave = Column(String(64), primary_key=True)
+    # sha256 del cuerpo: la misma llave con otro cuerpo es un error del cliente
+    huella = Column(String(64), nullable=False)
+    # NULL mientras la primera ejecución sigue en curso
+    status = Column(Integer, nullable=True)
+    content_type = Column(String(100), nullable=True)
+    # Demás encabezados de la respuesta ([nombre, valor]): ETag, X-Posibles-Duplicados...
+    headers = Column(JSONB, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    # La ejecución en curso lo renueva (latido); al terminar, inicio del TTL
+    created_at = Column(DateTime, default=datetime.utcnow, index=True, nullable=False)
@@ -0,0 +1,57 @@
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
+from database.database import Base
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Any
+
+class Job(Base):
+    __tablename__ = "jobs"
+    # Los workers buscan el pendiente más antiguo: índice parcial, siempre pequeño
+    __table_args__ = (
+        Index("ix_jobs_pendientes", "id", postgresql_where=text("estado = 'pendiente'")),
+        Index("ix_jobs_estado_latido", "estado", "heartbeat_at"),
+        Index("ix_jobs_usuario", "usuario_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    tipo = Column(String(50), nullable=False)
+    # pendiente | en_curso | terminado | fallido | cancelado
+    estado = Column(String(20), default="pendiente", nullable=False)
+    parametros = Column(JSONB, default=dict, nullable=False)
+    progreso = Column(Float, default=0, nullable=False)
+    mensaje = Column(String(255), nullable=True)
+    resultado = Column(JSONB, nullable=True)
+    error = Column(Text, nullable=True)
+    # Solicitud de cancelación de un job en curso; el worker la ve en el latido
+    cancelar = Column(Boolean, default=False, nullable=False)
+    intentos = Column(Integer, default=0, nullable=False)
+    worker = Column(String(100), nullable=True)
+    # Quien lo encoló: sin acceso global solo se ven los jobs propios
+    usuario_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+
+class JobCreate(BaseModel):
+    tipo: str
+    parametros: dict[str, Any] = {}
+
+class JobOut(BaseModel):
+    id: int
+    tipo: str
+    estado: str
+    parametros: dict[str, Any]
+    progreso: float
+    mensaje: str | None = None
+    resultado: Any = None
+    error: str | None = None
+    cancelar: bool
+    intentos: int
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+    class Config:
+        from_attributes = True
@@ -7,7 +7,7 @@ class Material(Base):
     __tablename__ = "materiales"
 
     id = Column(Integer, primary_key=True, index=True)
-    material = Column(String(100), nullable=False)
+    material = Column(String(100), unique=True, index=True, nullable=False)
 
 class MaterialCreate(BaseModel):
     material: str
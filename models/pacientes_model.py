@@ -1,12 +1,34 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, SmallInteger, String, Boolean, DateTime, Computed, Index
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from database.database import Base
+from database.bulk import BulkFilter
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
 
+# Notas clínicas indexadas para /pacientes/search, con su peso en el ranking
+NOTAS_CLINICAS = (
+    ("problema_ocular", "A"),
+    ("princip_defi_visual", "B"),
+    ("medicamento_actual", "C"),
+    ("otros", "D"),
+)
+
+# Banderas clínicas empacadas en pacientes.banderas: bit i = COHORT_FLAGS[i]
+COHORT_FLAGS = ("lentes", "antecedentes_familiares_lentes", "hipertension", "diabetico", "util_lentes", "cefaleas")
+
 class Paciente(Base):
 
     __tablename__ = "pacientes"
+    # Cohortes: banderas = ANY(combinaciones válidas) + rango de edad, resuelto
+    # con un index-only scan (id va al final para paginar y contar sin heap)
+    __table_args__ = (
+        Index("ix_pacientes_banderas_edad", "banderas", "edad", "id"),
+        Index("ix_pacientes_notas_tsv", "notas_tsv", postgresql_using="gin"),
+        # Duplicados: dentro del cliente al insertar, y recorridos del reporte
+        Index("ix_pacientes_cliente_clave", "cliente_id", "clave_nombre", "id"),
+        Index("ix_pacientes_clave_nombre", "clave_nombre", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     nombres = Column(String(100), nullable=False)
@@ -24,6 +46,20 @@ class Paciente(Base):
     princip_defi_visual = Column(String(255), nullable=True)
     otros = Column(String(255), nullable=True)
     cliente_id = Column(Integer, nullable=True)
+    version = Column(Integer, default=1, server_default="1", nullable=False)
+    # NULL cuenta como falso
+    banderas = Column(SmallInteger, Computed(
+        " + ".join(f"coalesce({f}, false)::int * {1 << i}" for i, f in enumerate(COHORT_FLAGS)),
+        persisted=True
+    ))
+    # Mantenido por Postgres; diferido para que las cargas ORM no lo traigan
+    notas_tsv = deferred(Column(TSVECTOR, Computed(
+        " || ".join(f"setweight(to_tsvector('spanish', coalesce({f}, '')), '{w}')" for f, w in NOTAS_CLINICAS),
+        persisted=True
+    )))
+    # Llaves de deduplicación (funciones en database/migrations.py)
+    nombre_norm = Column(String(255), Computed("dedup_norm(nombres || ' ' || apellidos)", persisted=True))
+    clave_nombre = Column(String(255), Computed("dedup_fonetica(nombres || ' ' || apellidos)", persisted=True))
 
 class PacienteCreate(BaseModel):
     nombres: str
@@ -59,8 +95,13 @@ class PacienteUpdate(BaseModel):
     otros: str | None = None
     cliente_id: int | None = None
 
+class PacienteBulkUpdate(BaseModel):
+    filtro: BulkFilter
+    cambios: PacienteUpdate
+
 class PacienteOut(BaseModel):
     id: int
+    version: int
     nombres: str
     apellidos: str
     edad: int
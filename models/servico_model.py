@@ -7,7 +7,7 @@ class Servicio(Base):
     __tablename__ = "servicios"
 
     id = Column(Integer, primary_key=True, index=True)
-    servicio = Column(String(100), nullable=False)
+    servicio = Column(String(100), unique=True, index=True, nullable=False)
 
 class ServicioCreate(BaseModel):
     servicio: str
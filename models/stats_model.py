@@ -0,0 +1,24 @@
+from sqlalchemy import BigInteger, Column, Integer, String, Identity, Index
+from database.database import Base
+
+class StatsConteo(Base):
+    __tablename__ = "stats_conteos"
+    # Rankings (p. ej. clientes con más pacientes) sin ordenar la dimensión completa
+    __table_args__ = (
+        Index("ix_stats_conteos_dimension_total", "dimension", "total"),
+    )
+
+    # p. ej. ("clientes.estado", "Jalisco"); el valor va como texto ('' = NULL)
+    dimension = Column(String(40), primary_key=True)
+    valor = Column(String(255), primary_key=True)
+    total = Column(BigInteger, nullable=False)
+
+class StatsDelta(Base):
+    __tablename__ = "stats_deltas"
+
+    # Solo INSERT desde los triggers: las escrituras no compiten por la misma
+    # fila de conteo; la compactación los suma en stats_conteos
+    id = Column(BigInteger, Identity(), primary_key=True)
+    dimension = Column(String(40), nullable=False)
+    valor = Column(String(255), nullable=False)
+    delta = Column(Integer, nullable=False)
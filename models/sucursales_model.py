@@ -3,6 +3,8 @@ from sqlalchemy.orm import relationship
 from database.database import Base
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
+from models.tipo_sucursal_model import TipoSucursalOut
+from models.estado_sucursal_model import EstadoSucursalOut
 
 class Sucursal(Base):
 
@@ -15,6 +17,7 @@ class Sucursal(Base):
     mondeda = Column(String(10), nullable=False)
     razon_social = Column(String(200), nullable=False)
     estado_sucursal_id = Column(Integer, nullable=False)
+    version = Column(Integer, default=1, server_default="1", nullable=False)
 
 class SucursalCreate(BaseModel):
     sucursal: str
@@ -34,12 +37,16 @@ class SucursalUpdate(BaseModel):
 
 class SucursalOut(BaseModel):
     id: int
+    version: int
     sucursal: str
     tipo_sucursal_id: int
     dependencia: str
     mondeda: str
     razon_social: str
     estado_sucursal_id: int
+    # Solo presentes con ?expand=
+    tipo_sucursal: TipoSucursalOut | None = None
+    estado_sucursal: EstadoSucursalOut | None = None
 
     class Config:
         from_attributes = True
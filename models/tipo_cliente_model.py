@@ -9,7 +9,7 @@ class Tipo_Cliente(Base):
     __tablename__ = "tipo_cliente"
 
     id = Column(Integer, primary_key=True, index=True)
-    cliente = Column(String(100), nullable=False)
+    cliente = Column(String(100), unique=True, index=True, nullable=False)
 
 class TipoClienteCreate(BaseModel):
     cliente: str
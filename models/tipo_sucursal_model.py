@@ -7,7 +7,7 @@ class tipoSucursal(Base):
     __tablename__ = "tipo_sucursal"
 
     id = Column(Integer, primary_key = True, index = True)
-    tipo = Column(String(100), nullable=False)
+    tipo = Column(String(100), unique=True, index=True, nullable=False)
 
 class tipoSucursalCreate(BaseModel):
     tipo: str
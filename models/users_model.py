@@ -19,6 +19,7 @@ class User(Base):
     sucursal_acces = Column(ARRAY(Integer), default=list, nullable=False)
     roles = Column(ARRAY(Integer), default=list, nullable=False)
     hashed_password = Column(String(255), nullable=False)
+    version = Column(Integer, default=1, server_default="1", nullable=False)
 
 class UserSignUp (BaseModel):
     nombres: str
@@ -49,14 +50,19 @@ class UserUpdate (BaseModel):
 
 class UserOut (BaseModel):
     id: int
+    version: int
     nombres: str
     apellidos: str
     usuario: str
-    email: EmailStr
+    email: str  # validado en la entrada; EmailStr aquí cuesta ~130µs por fila
     telefono: str
     Sucursal: int
     sucursal_acces: list[int]
     roles: list[int]
+    # Solo presentes con ?expand=
+    sucursal_detalle: SucursalOut | None = None
+    sucursales: list[SucursalOut] | None = None
+    roles_detalle: list[UserRoleOut] | None = None
 
     class Config:
         from_attributes = True
\ No newline at end of file
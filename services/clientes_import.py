@@ -0,0 +1,217 @@
+import codecs
+import csv
+from itertools import islice
+from pydantic import ValidationError
+from sqlalchemy import String, select, text, or_
+from starlette.concurrency import run_in_threadpool
+from database.batching import ids_param
+from models.clientes_model import Cliente, CreateCliente
+from models.tipo_cliente_model import Tipo_Cliente
+from services.dedup import email_key, rfc_key
+
+CHUNK_ROWS = 5000
+COLUMNAS = list(CreateCliente.model_fields)
+STAGING = "clientes_import"
+
+
+def read_csv(archivo):
+    # archivo: binario; se decodifica de forma incremental (utf-8 con o sin BOM)
+    lector = csv.DictReader(codecs.getreader("utf-8-sig")(archivo))
+    lector.fieldnames = [(c or "").strip().lower() for c in lector.fieldnames or []]
+    for fila, registro in enumerate(lector, start=2):
+        yield fila, registro
+
+
+def read_excel(archivo):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("Para importar archivos Excel se requiere el paquete openpyxl")
+
+    hoja = load_workbook(archivo, read_only=True, data_only=True).active
+    filas = hoja.iter_rows(values_only=True)
+    encabezado = [str(c or "").strip().lower() for c in next(filas, ())]
+    for fila, valores in enumerate(filas, start=2):
+        yield fila, dict(zip(encabezado, valores))
+
+
+def reader_for(nombre: str, archivo):
+    if nombre.lower().endswith((".xlsx", ".xlsm")):
+        return read_excel(archivo)
+    return read_csv(archivo)
+
+
+def _limpiar(registro: dict) -> dict:
+    # Celdas vacías cuentan como ausentes para que Pydantic reporte "Field required"
+    datos = {}
+    for campo in COLUMNAS:
+        valor = registro.get(campo)
+        if isinstance(valor, str):
+            valor = valor.strip()
+        if valor not in (None, ""):
+            datos[campo] = valor
+    return datos
+
+
+def _mensajes(error: ValidationError) -> list[str]:
+    return [f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in error.errors()]
+
+
+class ImportReport:
+
+    def __init__(self):
+        self.total = 0
+        self.importados = 0
+        self.errores: dict[int, list[str]] = {}
+        self.emails: dict[str, int] = {}
+        self.rfcs: dict[str, int] = {}
+
+    def error(self, fila: int, mensaje: str):
+        self.errores.setdefault(fila, []).append(mensaje)
+
+    def as_dict(self) -> dict:
+        return {
+            "total": self.total,
+            "importados": self.importados,
+            "con_errores": len(self.errores),
+            "errores": [{"fila": f, "errores": e} for f, e in sorted(self.errores.items())],
+        }
+
+
+def _validate_chunk(bloque, reporte: ImportReport, principal=None) -> list[tuple[int, CreateCliente]]:
+    validos = []
+    for fila, registro in bloque:
+        reporte.total += 1
+        try:
+            cliente = CreateCliente.model_validate(_limpiar(registro))
+        except ValidationError as e:
+            for mensaje in _mensajes(e):
+                reporte.error(fila, mensaje)
+            continue
+
+        if not cliente.rfc:
+            reporte.error(fila, "rfc: es obligatorio")
+            continue
+
+        # Misma regla que /cliente/create: sin sucursal se asigna la de quien
+        # importa y no se aceptan sucursales fuera de su alcance
+        if principal is not None:
+            if cliente.sucursal_id is None and not principal.global_:
+                cliente.sucursal_id = principal.sucursal
+            elif cliente.sucursal_id is not None and not principal.can_access(cliente.sucursal_id):
+                reporte.error(fila, f"sucursal_id: sin acceso a la sucursal {cliente.sucursal_id}")
+                continue
+
+        # Duplicados dentro del mismo archivo: gana la primera aparición
+        email, rfc = email_key(cliente.email), rfc_key(cliente.rfc)
+        previa = reporte.emails.get(email)
+        if previa is not None:
+            reporte.error(fila, f"email: duplicado en el archivo (fila {previa})")
+            continue
+        previa = reporte.rfcs.get(rfc)
+        if previa is not None:
+            reporte.error(fila, f"rfc: duplicado en el archivo (fila {previa})")
+            continue
+
+        reporte.emails[email] = fila
+        reporte.rfcs[rfc] = fila
+        validos.append((fila, cliente))
+    return validos
+
+
+async def _check_existing(conn, validos, reporte: ImportReport):
+    # Una consulta para correos/RFC ya registrados y otra para los tipos de cliente
+    emails = [email_key(c.email) for _, c in validos]
+    rfcs = [rfc_key(c.rfc) for _, c in validos]
+    tabla = Cliente.__table__
+    result = await conn.execute(
+        select(tabla.c.email_norm, tabla.c.rfc_norm).where(or_(
+            tabla.c.email_norm == ids_param(emails, String),
+            tabla.c.rfc_norm == ids_param(rfcs, String),
+        ))
+    )
+    emails_db, rfcs_db = set(), set()
+    for email, rfc in result.all():
+        emails_db.add(email)
+        rfcs_db.add(rfc)
+
+    tipos = {c.tipocliente for _, c in validos}
+    result = await conn.execute(
+        select(Tipo_Cliente.__table__.c.id).where(Tipo_Cliente.__table__.c.id == ids_param(tipos))
+    )
+    tipos_db = set(result.scalars().all())
+
+    aceptados = []
+    for fila, cliente in validos:
+        if email_key(cliente.email) in emails_db:
+            reporte.error(fila, "email: el cliente con este correo ya se encuentra registrado")
+        elif rfc_key(cliente.rfc) in rfcs_db:
+            reporte.error(fila, "rfc: el cliente con este RFC ya se encuentra registrado")
+        elif cliente.tipocliente not in tipos_db:
+            reporte.error(fila, f"tipocliente: el tipo de cliente con ID {cliente.tipocliente} no existe")
+        else:
+            aceptados.append((fila, cliente))
+    return aceptados
+
+
+async def _copy_and_merge(conn, aceptados, reporte: ImportReport):
+    raw = (await conn.get_raw_connection()).driver_connection
+    await raw.copy_records_to_table(
+        STAGING,
+        records=[(fila, *(getattr(c, col) for col in COLUMNAS)) for fila, c in aceptados],
+        columns=["fila", *COLUMNAS],
+    )
+
+    columnas = ", ".join(COLUMNAS)
+    # ON CONFLICT sin columnas cubre los dos índices únicos (email y
+    # ix_clientes_rfc_unico) ante altas concurrentes posteriores a la validación
+    result = await conn.execute(text(f"""
+        INSERT INTO clientes ({columnas}, is_active, created_at)
+        SELECT {columnas}, true, timezone('utc', now()) FROM {STAGING}
+        ON CONFLICT DO NOTHING
+        RETURNING email
+    """))
+    insertados = set(result.scalars().all())
+    reporte.importados += len(insertados)
+
+    omitidos = [(fila, cliente) for fila, cliente in aceptados if cliente.email not in insertados]
+    if omitidos:
+        # Camino raro: se vuelve a consultar para decir cuál llave chocó
+        tabla = Cliente.__table__
+        result = await conn.execute(select(tabla.c.email).where(tabla.c.email == ids_param([c.email for _, c in omitidos], String)))
+        emails_db = set(result.scalars().all())
+        for fila, cliente in omitidos:
+            if cliente.email in emails_db:
+                reporte.error(fila, "email: el cliente con este correo ya se encuentra registrado")
+            else:
+                reporte.error(fila, "rfc: el cliente con este RFC ya se encuentra registrado")
+
+    await conn.execute(text(f"TRUNCATE {STAGING}"))
+
+
+async def import_clientes(db, filas, principal=None) -> dict:
+    # Todo el archivo en una transacción: las filas inválidas se reportan y el
+    # resto se carga con COPY a una tabla temporal y se fusiona por bloques
+    reporte = ImportReport()
+    conn = await db.connection()
+    columnas = ", ".join(COLUMNAS)
+    await conn.execute(text(
+        f"CREATE TEMP TABLE {STAGING} ON COMMIT DROP AS "
+        f"SELECT 0::integer AS fila, {columnas} FROM clientes WITH NO DATA"
+    ))
+
+    while True:
+        # Leer y parsear el bloque es síncrono: se hace fuera del event loop
+        bloque = await run_in_threadpool(lambda: list(islice(filas, CHUNK_ROWS)))
+        if not bloque:
+            break
+
+        # Pydantic (EmailStr) sobre miles de filas también bloquearía el loop
+        validos = await run_in_threadpool(_validate_chunk, bloque, reporte, principal)
+        if validos:
+            aceptados = await _check_existing(conn, validos, reporte)
+            if aceptados:
+                await _copy_and_merge(conn, aceptados, reporte)
+
+    await db.commit()
+    return reporte.as_dict()
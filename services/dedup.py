@@ -0,0 +1,190 @@
+import re
+from collections import deque
+from difflib import SequenceMatcher
+from sqlalchemy import func, select, tuple_
+from starlette.concurrency import run_in_threadpool
+from models.clientes_model import Cliente
+from models.pacientes_model import Paciente
+
+# Las llaves (nombre_norm, clave_nombre, email_norm, ...) son columnas generadas;
+# aquí solo se consultan. El reporte recorre la tabla ordenada por cada llave
+# (sorted neighborhood): cada fila se compara con las VENTANA anteriores, así
+# que el costo es lineal y los casi-duplicados quedan juntos en el orden.
+BLOQUE = 5000
+VENTANA = 5
+UMBRAL = 0.85
+CANDIDATOS = 10
+
+clientes = Cliente.__table__
+pacientes = Paciente.__table__
+
+
+def email_key(email: str) -> str:
+    # Igual que clientes.email_norm
+    return email.strip().lower()
+
+
+def rfc_key(rfc: str) -> str:
+    # Igual que clientes.rfc_norm
+    return re.sub(r"[^A-Za-z0-9]", "", rfc).upper()
+
+
+def nombre_key(nombres, apellidos):
+    # Expresión SQL: la clave se calcula con la misma función que la columna
+    return func.dedup_fonetica(nombres + " " + apellidos)
+
+
+async def cliente_candidates(db, nombres: str, apellidos: str, telefono: str) -> list[int]:
+    # Posibles duplicados de un cliente nuevo: mismo nombre fonético o mismo
+    # teléfono. Dos búsquedas por índice con LIMIT: costo acotado
+    telefono = re.sub(r"[^0-9]", "", telefono)[-10:]
+    por_nombre = select(clientes.c.id).where(clientes.c.clave_nombre == nombre_key(nombres, apellidos)).limit(CANDIDATOS)
+    consultas = [por_nombre]
+    if telefono:
+        consultas.append(select(clientes.c.id).where(clientes.c.telefono_norm == telefono).limit(CANDIDATOS))
+
+    ids = []
+    for query in consultas:
+        for id_ in (await db.execute(query)).scalars().all():
+            if id_ not in ids:
+                ids.append(id_)
+    return ids[:CANDIDATOS]
+
+
+async def paciente_candidates(db, nombres: str, apellidos: str, cliente_id: int | None) -> list[int]:
+    # Pacientes del mismo cliente con el mismo nombre fonético
+    # (ix_pacientes_cliente_clave)
+    query = select(pacientes.c.id).where(
+        pacientes.c.cliente_id == cliente_id,
+        pacientes.c.clave_nombre == nombre_key(nombres, apellidos),
+    ).limit(CANDIDATOS)
+    return list((await db.execute(query)).scalars().all())
+
+
+async def sibling_candidates(db, cliente_id: int) -> list[int]:
+    # Pacientes de un mismo cliente que comparten nombre fonético entre sí:
+    # la versión de paciente_candidates para un alta con varios pacientes
+    mismos = func.count().over(partition_by=pacientes.c.clave_nombre)
+    sub = select(pacientes.c.id, mismos.label("mismos")).where(pacientes.c.cliente_id == cliente_id).subquery()
+    query = select(sub.c.id).where(sub.c.mismos > 1).order_by(sub.c.id).limit(CANDIDATOS)
+    return list((await db.execute(query)).scalars().all())
+
+
+# El nombre pesa más que cualquier coincidencia exacta: en una familia es
+# normal compartir teléfono o cliente sin ser la misma persona
+PESO_NOMBRE = 0.75
+
+
+def _score_clientes(a, b, similitud: float) -> tuple[float, list[str]]:
+    razones = []
+    if a.clave_nombre == b.clave_nombre:
+        similitud = 1.0
+        razones.append("nombre")
+    score = similitud * PESO_NOMBRE
+    for campo in ("email_norm", "rfc_norm", "telefono_norm"):
+        if getattr(a, campo) and getattr(a, campo) == getattr(b, campo):
+            score += 0.15
+            razones.append(campo.removesuffix("_norm"))
+    return min(score, 1.0), razones
+
+
+def _score_pacientes(a, b, similitud: float) -> tuple[float, list[str]]:
+    razones = []
+    if a.clave_nombre == b.clave_nombre:
+        similitud = 1.0
+        razones.append("nombre")
+    score = similitud * 0.9
+    if a.cliente_id is not None and a.cliente_id == b.cliente_id:
+        score += 0.05
+        razones.append("cliente_id")
+    if abs(a.edad - b.edad) <= 1:
+        score += 0.05
+        razones.append("edad")
+    return min(score, 1.0), razones
+
+
+ENTIDADES = {
+    "clientes": {
+        "tabla": clientes,
+        "columnas": ("id", "nombres", "apellidos", "nombre_norm", "clave_nombre", "email_norm", "rfc_norm", "telefono_norm"),
+        "recorridos": (("clave_nombre",), ("telefono_norm",), ("email_norm",), ("rfc_norm",)),
+        "score": _score_clientes,
+        "bono_maximo": 0.45,
+    },
+    "pacientes": {
+        "tabla": pacientes,
+        "columnas": ("id", "nombres", "apellidos", "nombre_norm", "clave_nombre", "cliente_id", "edad"),
+        # El segundo recorrido junta a los pacientes de cada cliente aunque
+        # el error de captura esté en la primera letra
+        "recorridos": (("clave_nombre",), ("cliente_id", "clave_nombre")),
+        "score": _score_pacientes,
+        "bono_maximo": 0.1,
+    },
+}
+
+
+def _compare(bloque, ventana: deque, config: dict, umbral: float, pares: dict):
+    score, bono = config["score"], config["bono_maximo"]
+    matcher = SequenceMatcher(autojunk=False)
+    for fila in bloque:
+        # seq2 se indexa una vez por fila y se reutiliza contra toda la ventana
+        matcher.set_seq2(fila.nombre_norm)
+        for previa in ventana:
+            matcher.set_seq1(previa.nombre_norm)
+            # Cota superior barata antes de ratio(): si ni con todos los bonos
+            # se llega al umbral, el par se descarta
+            if previa.clave_nombre != fila.clave_nombre and matcher.quick_ratio() + bono < umbral:
+                continue
+            valor, razones = score(previa, fila, matcher.ratio())
+            if valor >= umbral:
+                llave = (previa.id, fila.id) if previa.id < fila.id else (fila.id, previa.id)
+                actual = pares.get(llave)
+                if actual is None or actual[0] < valor:
+                    pares[llave] = (valor, razones, previa, fila)
+        ventana.append(fila)
+
+
+async def duplicate_report(db, entidad: str, umbral: float = UMBRAL, limite: int = 100, on_progress=None) -> dict:
+    config = ENTIDADES[entidad]
+    tabla = config["tabla"]
+    columnas = [tabla.c[c] for c in config["columnas"]]
+    pares: dict = {}
+    revisadas = 0
+
+    if on_progress is not None:
+        total = (await db.execute(select(func.count()).select_from(tabla))).scalar_one() * len(config["recorridos"])
+
+    for orden in config["recorridos"]:
+        llave = [tabla.c[c] for c in orden] + [tabla.c.id]
+        base = select(*columnas).where(*(c.is_not(None) for c in llave)).order_by(*llave).limit(BLOQUE)
+        ventana = deque(maxlen=VENTANA)
+        ultimo = None
+
+        # Paginación por llave sobre el índice del recorrido: cada bloque es
+        # una lectura acotada y la comparación corre fuera del event loop
+        while True:
+            query = base if ultimo is None else base.where(tuple_(*llave) > tuple_(*ultimo))
+            bloque = (await db.execute(query)).all()
+            if not bloque:
+                break
+            await run_in_threadpool(_compare, bloque, ventana, config, umbral, pares)
+            revisadas += len(bloque)
+            ultimo = [getattr(bloque[-1], c.name) for c in llave]
+            if on_progress is not None:
+                await on_progress(revisadas, total, f"{revisadas} filas revisadas")
+
+    ranking = sorted(pares.values(), key=lambda p: (-p[0], p[2].id, p[3].id))[:limite]
+    return {
+        "entidad": entidad,
+        "filas_revisadas": revisadas,
+        "pares": len(pares),
+        "duplicados": [
+            {
+                "ids": [a.id, b.id],
+                "score": round(valor, 3),
+                "razones": razones,
+                "nombres": [f"{a.nombres} {a.apellidos}", f"{b.nombres} {b.apellidos}"],
+            }
+            for valor, razones, a, b in ranking
+        ],
+    }
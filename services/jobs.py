@@ -0,0 +1,304 @@
+import asyncio
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Any, Literal
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy import and_, delete, insert, or_, select, update
+from database.batching import ids_param
+from database.bulk import BulkFilter
+from database.database import JobsSessionLocal, jobs_engine, settings
+from database.read_queries import out_columns
+from models.jobs_model import Job, JobOut
+
+# Cola de trabajos en Postgres: los workers (tareas asyncio de este proceso o
+# de python cli.py run-jobs) toman el pendiente más antiguo con SKIP LOCKED,
+# así varios procesos comparten la cola sin broker externo ni bloquearse.
+
+tabla = Job.__table__
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+TERMINALES = ("terminado", "fallido", "cancelado")
+# Escrituras de progreso como máximo cada tantos segundos por job
+PROGRESO_SEGUNDOS = 0.5
+# Retención de jobs terminados
+RETENCION = timedelta(days=7)
+
+HANDLERS: dict[str, tuple] = {}
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def job(tipo: str, parametros: type[BaseModel] | None = None):
+    # Registra un tipo de job: async def handler(ctx, parametros) -> resultado JSON
+    def registrar(func):
+        HANDLERS[tipo] = (func, parametros)
+        return func
+    return registrar
+
+
+def validate_params(tipo: str, parametros: dict) -> dict:
+    if tipo not in HANDLERS:
+        raise ValueError(f"Tipo de job desconocido: {tipo}")
+
+    modelo = HANDLERS[tipo][1]
+    if modelo is None:
+        return parametros
+
+    try:
+        return modelo.model_validate(parametros).model_dump(mode="json")
+    except ValidationError as e:
+        error = e.errors()[0]
+        raise ValueError(f"Parámetros inválidos ({'.'.join(str(p) for p in error['loc'])}): {error['msg']}")
+
+
+async def enqueue(db, tipo: str, parametros: dict, usuario_id: int | None = None) -> dict:
+    parametros = validate_params(tipo, parametros)
+    result = await db.execute(
+        insert(tabla).values(tipo=tipo, parametros=parametros, usuario_id=usuario_id).returning(*out_columns(Job, JobOut))
+    )
+    await db.commit()
+    runner.wake()
+    return dict(result.mappings().one())
+
+
+class JobContext:
+
+    def __init__(self, job_id: int, db):
+        self.id = job_id
+        # Sesión del pool de jobs para el trabajo en sí
+        self.db = db
+        self._ultimo = 0.0
+
+    async def progress(self, hechos: int, total: int, mensaje: str | None = None):
+        # El progreso va en su propia transacción para que se vea en
+        # GET /jobs/{id} aunque el trabajo no haya hecho commit
+        ahora = time.monotonic()
+        if hechos < total and ahora - self._ultimo < PROGRESO_SEGUNDOS:
+            return
+        self._ultimo = ahora
+
+        query = update(tabla).where(tabla.c.id == self.id).values(
+            progreso=min(hechos / total, 1.0) if total else 0.0,
+            mensaje=mensaje,
+            heartbeat_at=datetime.utcnow(),
+        ).returning(tabla.c.cancelar)
+
+        async with jobs_engine.begin() as conn:
+            cancelar = (await conn.execute(query)).scalar()
+        if cancelar:
+            raise JobCancelled()
+
+
+class JobRunner:
+
+    def __init__(self):
+        self._tareas: list[asyncio.Task] = []
+        self._despertar = asyncio.Event()
+        # Jobs ejecutándose en este proceso y los que se cancelaron a pedido
+        self._en_curso: dict[int, asyncio.Task] = {}
+        self._canceladas: set[int] = set()
+
+    def start(self, concurrencia: int):
+        self._tareas = [asyncio.create_task(self._worker()) for _ in range(concurrencia)]
+        self._tareas.append(asyncio.create_task(self._heartbeat_loop()))
+
+    async def stop(self):
+        # Los jobs interrumpidos vuelven a pendiente para otro worker
+        for tarea in self._tareas:
+            tarea.cancel()
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+        self._tareas = []
+
+    def wake(self):
+        self._despertar.set()
+
+    def cancel_local(self, job_id: int) -> bool:
+        tarea = self._en_curso.get(job_id)
+        if tarea is None:
+            return False
+        self._canceladas.add(job_id)
+        tarea.cancel()
+        return True
+
+    async def _claim(self):
+        ahora = datetime.utcnow()
+        vencido = ahora - timedelta(seconds=settings.jobs_lease_seconds)
+        # Pendientes, o en curso sin latido (el worker que los tenía murió)
+        candidato = (
+            select(tabla.c.id)
+            .where(or_(
+                tabla.c.estado == "pendiente",
+                and_(tabla.c.estado == "en_curso", tabla.c.heartbeat_at < vencido),
+            ))
+            .order_by(tabla.c.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        query = update(tabla).where(tabla.c.id == candidato).values(
+            estado="en_curso",
+            worker=WORKER_ID,
+            started_at=ahora,
+            heartbeat_at=ahora,
+            intentos=tabla.c.intentos + 1,
+        ).returning(tabla.c.id, tabla.c.tipo, tabla.c.parametros, tabla.c.intentos)
+
+        async with jobs_engine.begin() as conn:
+            return (await conn.execute(query)).first()
+
+    async def _worker(self):
+        while True:
+            try:
+                trabajo = await self._claim()
+            except Exception as e:
+                print(f"Error al tomar job: {e}")
+                trabajo = None
+
+            if trabajo is None:
+                self._despertar.clear()
+                try:
+                    await asyncio.wait_for(self._despertar.wait(), settings.jobs_poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run(trabajo)
+
+    async def _run(self, trabajo):
+        func, _ = HANDLERS.get(trabajo.tipo, (None, None))
+        interrumpido = False
+
+        try:
+            if func is None:
+                raise LookupError(f"Tipo de job desconocido: {trabajo.tipo}")
+            if trabajo.intentos > settings.jobs_max_intentos:
+                raise RuntimeError("Se agotaron los reintentos")
+
+            async with JobsSessionLocal() as db:
+                # Tarea propia: cancel_local detiene el job sin tocar al worker
+                tarea = asyncio.ensure_future(func(JobContext(trabajo.id, db), trabajo.parametros))
+                self._en_curso[trabajo.id] = tarea
+                resultado = await tarea
+            cambios = {"estado": "terminado", "progreso": 1.0, "resultado": resultado}
+
+        except JobCancelled:
+            cambios = {"estado": "cancelado"}
+        except asyncio.CancelledError:
+            if trabajo.id in self._canceladas:
+                cambios = {"estado": "cancelado"}
+            else:
+                # Apagado del proceso: el job queda para otro worker
+                interrumpido = True
+                cambios = {"estado": "pendiente", "worker": None, "heartbeat_at": None}
+        except Exception as e:
+            print(f"Error en job {trabajo.id} ({trabajo.tipo}): {e}")
+            cambios = {"estado": "fallido", "error": str(e)}
+        finally:
+            self._en_curso.pop(trabajo.id, None)
+            self._canceladas.discard(trabajo.id)
+
+        if cambios["estado"] in TERMINALES:
+            cambios["finished_at"] = datetime.utcnow()
+
+        try:
+            # Solo si el job sigue siendo de este worker (no se venció el latido)
+            async with jobs_engine.begin() as conn:
+                await conn.execute(
+                    update(tabla).where(tabla.c.id == trabajo.id, tabla.c.worker == WORKER_ID).values(**cambios)
+                )
+        except Exception as e:
+            print(f"Error al guardar el estado del job {trabajo.id}: {e}")
+
+        if interrumpido:
+            raise asyncio.CancelledError()
+
+    async def _heartbeat_loop(self):
+        # Un UPDATE por intervalo para todos los jobs de este proceso; de paso
+        # recoge las cancelaciones pedidas desde otro proceso
+        intervalo = settings.jobs_lease_seconds / 3
+        ultima_purga = 0.0
+        while True:
+            await asyncio.sleep(intervalo)
+            try:
+                if self._en_curso:
+                    query = update(tabla).where(
+                        tabla.c.id == ids_param(list(self._en_curso)),
+                        tabla.c.worker == WORKER_ID,
+                    ).values(heartbeat_at=datetime.utcnow()).returning(tabla.c.id, tabla.c.cancelar)
+                    async with jobs_engine.begin() as conn:
+                        filas = (await conn.execute(query)).all()
+                    for job_id, cancelar in filas:
+                        if cancelar:
+                            self.cancel_local(job_id)
+
+                if time.monotonic() - ultima_purga > 3600:
+                    ultima_purga = time.monotonic()
+                    await purge_finished()
+            except Exception as e:
+                print(f"Error en el latido de jobs: {e}")
+
+
+async def purge_finished() -> int:
+    limite = datetime.utcnow() - RETENCION
+    async with jobs_engine.begin() as conn:
+        result = await conn.execute(
+            delete(tabla).where(tabla.c.estado.in_(TERMINALES), tabla.c.finished_at < limite)
+        )
+    return result.rowcount
+
+
+runner = JobRunner()
+
+
+# Tipos de job
+
+class DedupParams(BaseModel):
+    entidad: Literal["clientes", "pacientes"]
+    umbral: float = Field(default=0.85, ge=0, le=1)
+    limite: int = Field(default=100, ge=1, le=10000)
+
+
+@job("dedup_report", DedupParams)
+async def dedup_report_job(ctx: JobContext, parametros: dict):
+    from services.dedup import duplicate_report
+
+    return await duplicate_report(ctx.db, on_progress=ctx.progress, **parametros)
+
+
+@job("rebuild_stats")
+async def rebuild_stats_job(ctx: JobContext, parametros: dict):
+    from database.rollups import DIMENSIONES, rebuild_stats
+
+    await rebuild_stats(on_progress=ctx.progress)
+    return {"tablas": list(DIMENSIONES)}
+
+
+class BulkUpdateParams(BaseModel):
+    recurso: Literal["clientes", "pacientes"]
+    filtro: BulkFilter
+    cambios: dict[str, Any]
+    # Alcance por sucursal de quien lo encoló (None: todas)
+    sucursales: list[int] | None = None
+
+
+@job("bulk_update", BulkUpdateParams)
+async def bulk_update_job(ctx: JobContext, parametros: dict):
+    # Lo encolan /cliente/bulk/update y /pacientes/bulk/update con
+    # ?en_segundo_plano=true, después de validar filtro y cambios
+    from database.bulk import bulk_update, filter_conditions
+    from models.clientes_model import Cliente, ClienteUpdate
+    from models.pacientes_model import Paciente, PacienteUpdate
+    from middleware.auth import paciente_scope
+
+    modelo, esquema = {"clientes": (Cliente, ClienteUpdate), "pacientes": (Paciente, PacienteUpdate)}[parametros["recurso"]]
+    condiciones = filter_conditions(modelo, esquema, BulkFilter.model_validate(parametros["filtro"]))
+    if parametros.get("sucursales") is not None:
+        # Alcance de quien lo encoló; los pacientes, por la sucursal de su cliente
+        columna = Cliente.__table__.c.sucursal_id
+        condicion = or_(columna.is_(None), columna == ids_param(parametros["sucursales"]))
+        condiciones.append(condicion if modelo is Cliente else paciente_scope(condicion))
+    cambios = esquema.model_validate(parametros["cambios"]).model_dump(exclude_unset=True)
+    return await bulk_update(ctx.db, modelo, condiciones, cambios)
@@ -0,0 +1,58 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from passlib.context import CryptContext
+from database.database import settings
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def hash_password(password: str) -> str:
+    password = password[:72]  # bcrypt tiene límite de 72 bytes
+    return pwd_context.hash(password)
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    return pwd_context.verify(password[:72], hashed)
+
+
+def workers() -> int:
+    return settings.password_hash_workers or os.cpu_count() or 1
+
+
+def get_pool() -> ProcessPoolExecutor:
+    # bcrypt es CPU puro y retiene el GIL: solo escala con procesos. Se crea al
+    # primer uso y con forkserver para no clonar el event loop ni el pool de conexiones
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=workers(),
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+    return _pool
+
+
+async def _submit(func, *args):
+    # submit() arranca procesos del pool cuando hacen falta, y arrancar uno
+    # con forkserver tarda más de 100 ms: se hace desde un hilo y no en el loop
+    futuro = await asyncio.to_thread(get_pool().submit, func, *args)
+    return await asyncio.wrap_future(futuro)
+
+
+async def hash_many(passwords: list[str]) -> list[str]:
+    return await asyncio.gather(*(_submit(hash_password, p) for p in passwords))
+
+
+async def verify(password: str, hashed: str) -> bool:
+    # Login: la verificación cuesta lo mismo que un hash, fuera del event loop
+    return await _submit(verify_password, password, hashed)
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
@@ -0,0 +1,152 @@
+from sqlalchemy import String, insert, select, or_
+from database.batching import ids_param
+from database.read_queries import out_columns
+from models.users_model import User, UserSignUp, UserOut
+from models.sucursales_model import Sucursal
+from models.user_roles_model import UserRole
+from models.tipo_sucursal_model import tipoSucursal
+from models.estado_sucursal_model import Estado_Sucursal
+from database.database import settings
+from services.passwords import hash_many
+
+# asyncpg admite hasta 32767 parámetros por sentencia (10 columnas por usuario)
+INSERT_ROWS = 2000
+
+
+class ProvisioningError(Exception):
+
+    def __init__(self, errores: list[dict]):
+        super().__init__(f"{len(errores)} usuarios con errores")
+        self.errores = errores
+
+
+def _duplicados(users: list[UserSignUp], errores: dict[int, list[str]]):
+    vistos_usuario, vistos_email = {}, {}
+    for i, user in enumerate(users):
+        if user.usuario in vistos_usuario:
+            errores.setdefault(i, []).append(f"usuario: duplicado en la lista (índice {vistos_usuario[user.usuario]})")
+        else:
+            vistos_usuario[user.usuario] = i
+
+        if user.email in vistos_email:
+            errores.setdefault(i, []).append(f"email: duplicado en la lista (índice {vistos_email[user.email]})")
+        else:
+            vistos_email[user.email] = i
+
+
+async def validate_users(db, users: list[UserSignUp]) -> dict[int, list[str]]:
+    # Las mismas reglas que /users/signup, pero con una consulta por tabla
+    # para toda la lista en lugar de una por referencia
+    errores: dict[int, list[str]] = {}
+    _duplicados(users, errores)
+
+    tabla = User.__table__
+    result = await db.execute(
+        select(tabla.c.usuario, tabla.c.email).where(or_(
+            tabla.c.usuario == ids_param({u.usuario for u in users}, String),
+            tabla.c.email == ids_param({u.email for u in users}, String),
+        ))
+    )
+    usuarios_db, emails_db = set(), set()
+    for usuario, email in result.all():
+        usuarios_db.add(usuario)
+        emails_db.add(email)
+
+    roles = {r for u in users for r in u.roles}
+    result = await db.execute(select(UserRole.__table__.c.id).where(UserRole.__table__.c.id == ids_param(roles)))
+    roles_db = set(result.scalars().all())
+
+    sucursales = {s for u in users for s in [u.Sucursal, *u.sucursal_acces]}
+    result = await db.execute(select(Sucursal.__table__.c.id).where(Sucursal.__table__.c.id == ids_param(sucursales)))
+    sucursales_db = set(result.scalars().all())
+
+    for i, user in enumerate(users):
+        mensajes = []
+        if user.usuario in usuarios_db:
+            mensajes.append("usuario: el usuario ya está en uso")
+        if user.email in emails_db:
+            mensajes.append("email: el correo electrónico ya está en uso")
+        if not user.roles:
+            mensajes.append("roles: debe proporcionar al menos un rol de usuario")
+        for role_id in user.roles:
+            if role_id not in roles_db:
+                mensajes.append(f"roles: el rol con ID {role_id} no existe")
+        if user.Sucursal not in sucursales_db:
+            mensajes.append("Sucursal: la sucursal seleccionada no existe")
+        if not user.sucursal_acces:
+            mensajes.append("sucursal_acces: debe proporcionar al menos una sucursal de acceso")
+        for suc in user.sucursal_acces:
+            if suc not in sucursales_db:
+                mensajes.append(f"sucursal_acces: la sucursal con ID {suc} no existe")
+        if mensajes:
+            errores.setdefault(i, []).extend(mensajes)
+
+    return errores
+
+
+async def provision_users(db, users: list[UserSignUp]) -> list[dict]:
+    # Todo o nada: el alta de una cadena no debe quedar a medias. Se valida
+    # antes de hashear para no gastar CPU en listas que se van a rechazar
+    if not users:
+        return []
+
+    errores = await validate_users(db, users)
+    if errores:
+        raise ProvisioningError([{"indice": i, "errores": e} for i, e in sorted(errores.items())])
+
+    hashes = await hash_many([u.password for u in users])
+
+    valores = [
+        {**u.model_dump(exclude={"password"}), "hashed_password": h}
+        for u, h in zip(users, hashes)
+    ]
+
+    creados = []
+    query = insert(User.__table__).returning(*out_columns(User, UserOut))
+    for inicio in range(0, len(valores), INSERT_ROWS):
+        result = await db.execute(query.values(valores[inicio:inicio + INSERT_ROWS]))
+        creados.extend(dict(r) for r in result.mappings().all())
+
+    await db.commit()
+    return creados
+
+
+async def _get_or_create(db, model, columna: str, valor: str) -> int:
+    tabla = model.__table__
+    id_ = (await db.execute(select(tabla.c.id).where(tabla.c[columna] == valor))).scalar()
+    if id_ is None:
+        id_ = (await db.execute(insert(tabla).values({columna: valor}).returning(tabla.c.id))).scalar_one()
+    return id_
+
+
+async def bootstrap_admin(db, nombres: str, usuario: str, email: str, password: str, sucursal: str = "Matriz") -> dict:
+    # Primer administrador de una instalación nueva: con auth_required, dar
+    # de alta roles, sucursales y usuarios ya exige acceso global, así que
+    # esto solo corre desde python cli.py. Reutiliza el rol global y la
+    # primera sucursal si existen; si no, los crea
+    rol = (await db.execute(
+        select(UserRole.__table__.c.id)
+        .where(UserRole.__table__.c.rol == ids_param(settings.auth_roles_globales, String))
+        .order_by(UserRole.__table__.c.id).limit(1)
+    )).scalar()
+    if rol is None:
+        rol = await _get_or_create(db, UserRole, "rol", settings.auth_roles_globales[0])
+
+    tabla = Sucursal.__table__
+    sucursal_id = (await db.execute(select(tabla.c.id).order_by(tabla.c.id).limit(1))).scalar()
+    if sucursal_id is None:
+        sucursal_id = (await db.execute(insert(tabla).values(
+            sucursal=sucursal,
+            tipo_sucursal_id=await _get_or_create(db, tipoSucursal, "tipo", "Matriz"),
+            dependencia=sucursal,
+            mondeda="MXN",
+            razon_social=sucursal,
+            estado_sucursal_id=await _get_or_create(db, Estado_Sucursal, "estado", "Activa"),
+        ).returning(tabla.c.id))).scalar_one()
+
+    # provision_users valida y hace commit de todo junto
+    admin = UserSignUp(
+        nombres=nombres, apellidos="", usuario=usuario, email=email, telefono="",
+        Sucursal=sucursal_id, sucursal_acces=[sucursal_id], roles=[rol], password=password,
+    )
+    return (await provision_users(db, [admin]))[0]